@@ -0,0 +1,192 @@
+"""
+the performance benchmarks of the HRV/HRA analyses - the time and the peak memory of each stage is measured on the
+synthetic recordings (see synthetic.py) of increasing sizes and on the projects of increasing numbers of files, and the
+results are written to a JSON file, which can be compared with the results of an earlier run
+
+usage (from the main directory of the repository):
+python -m benchmarks.run_benchmarks --output results.json
+python -m benchmarks.run_benchmarks --quick --compare results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import numpy
+import scipy
+from benchmarks.synthetic import synthetic_rr, write_rea, write_project
+from signal_properties.RRclasses import Signal
+from signal_properties.Poincare import Poincare
+from signal_properties.runs import Runs
+from signal_properties.spectral import LombScargleSpectrum, FFTSpectrum
+from project.project_class import Project
+
+SIZES = [10**3, 10**4, 10**5, 10**6]
+FILES = [10, 100, 1000]
+QUICK_SIZES = [10**3, 10**4]
+QUICK_FILES = [10]
+# the reference Lomb-Scargle engine is O(n^2) - it is measured only for the recordings up to this length
+MAX_QUADRATIC_SIZE = 10**4
+PROJECT_FILE_SIZE = 1000 # the number of beats in each file of the benchmark projects
+ANNOTATION_FILTER = (1, 2, 3)
+
+
+def measure(run, setup=None, repeat=3):
+    """
+    measures the time and the peak memory of a function - the time is the best of repeat runs, the memory is measured in
+    a separate run (tracemalloc slows the code down), the output of the function is suppressed
+    :param run: the measured function, it gets the result of setup as its argument
+    :param setup: the function preparing the data for each run, it is not measured; None means no argument
+    :return: dictionary with seconds and peak_bytes
+    """
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            argument = setup() if setup is not None else None
+            start = time.perf_counter()
+            run(argument)
+            times.append(time.perf_counter() - start)
+        argument = setup() if setup is not None else None
+        tracemalloc.start()
+        try:
+            run(argument)
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {"seconds": min(times), "peak_bytes": peak_bytes}
+
+
+def unfiltered_signal(rr, annotation):
+    """
+    a Signal holding the data as it is before filter_data
+    """
+    signal = Signal.from_arrays(rr, annotation, annotation_filter=ANNOTATION_FILTER)
+    signal.signal, signal.annotation, signal.timetrack = rr, annotation.copy(), numpy.cumsum(rr)
+    return signal
+
+
+def signal_benchmarks(n_beats, work_dir, repeat):
+    """
+    the benchmarks of the analyses of a single recording
+    :return: list of the results
+    """
+    rr, annotation = synthetic_rr(n_beats)
+    path_to_file = work_dir + "/recording_%d.rea" % n_beats
+    write_rea(path_to_file, rr, annotation)
+    signal = Signal.from_arrays(rr, annotation, annotation_filter=ANNOTATION_FILTER)
+    stages = [
+        ("read_data", lambda _: Signal.read_data(path_to_file, 1, 2, 1), None),
+        ("filter_data", lambda unfiltered: unfiltered.filter_data(), lambda: unfiltered_signal(rr, annotation)),
+        ("Poincare", lambda _: Poincare(signal, Poincare.descriptors), None),
+        ("Runs", lambda _: Runs(signal), None),
+        ("LombScargleSpectrum_fast", lambda _: LombScargleSpectrum(signal, engine="fast"), None),
+        ("FFTSpectrum", lambda _: FFTSpectrum(signal, 4), None),
+    ]
+    if n_beats <= MAX_QUADRATIC_SIZE:
+        stages.append(("LombScargleSpectrum", lambda _: LombScargleSpectrum(signal), None))
+    results = []
+    for name, run, setup in stages:
+        result = {"benchmark": name, "beats": n_beats, "files": 1}
+        result.update(measure(run, setup, repeat))
+        results.append(result)
+        print("%-28s %9d beats %10.4f s %10.1f MB" % (name, n_beats, result["seconds"], result["peak_bytes"] / 2**20))
+    return results
+
+
+def project_benchmark(n_files, work_dir, repeat):
+    """
+    the benchmark of Project.step_through_project_files - all the analyses of n_files recordings
+    :return: the result
+    """
+    path = work_dir + "/project_%d" % n_files
+    write_project(path, n_files, PROJECT_FILE_SIZE)
+
+    def new_project():
+        project = Project(path, ".rea", 1, 2, 1)
+        project.set_filters(annotation_filter=ANNOTATION_FILTER)
+        project.set_Poincare()
+        project.set_runs()
+        project.set_LS_spectrum(engine="fast")
+        return project
+
+    result = {"benchmark": "Project.step_through_project_files", "beats": PROJECT_FILE_SIZE, "files": n_files}
+    result.update(measure(lambda project: project.step_through_project_files(), new_project, repeat))
+    print("%-28s %9d files %10.4f s %10.1f MB" % ("Project", n_files, result["seconds"],
+                                                  result["peak_bytes"] / 2**20))
+    return result
+
+
+def run_benchmarks(sizes, files, repeat=3):
+    """
+    :return: the machine-readable results - the description of the environment and the list of the measurements
+    """
+    work_dir = tempfile.mkdtemp(prefix="hra_benchmarks_")
+    try:
+        results = []
+        for n_beats in sizes:
+            results.extend(signal_benchmarks(n_beats, work_dir, repeat))
+        for n_files in files:
+            results.append(project_benchmark(n_files, work_dir, repeat))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    environment = {"date": datetime.now().isoformat(), "python": platform.python_version(),
+                   "numpy": numpy.__version__, "scipy": scipy.__version__, "platform": platform.platform(),
+                   "repeat": repeat}
+    return {"environment": environment, "results": results}
+
+
+def compare(results, previous_results, tolerance=0.2, min_seconds=0.01):
+    """
+    compares the results with the results of an earlier run
+    :param tolerance: the relative slowdown (or growth of the memory) which is reported as a regression
+    :param min_seconds: the times below this are too noisy to be compared
+    :return: list of the descriptions of the regressions
+    """
+    previous = {(item["benchmark"], item["beats"], item["files"]): item for item in previous_results["results"]}
+    regressions = []
+    for item in results["results"]:
+        key = (item["benchmark"], item["beats"], item["files"])
+        if key not in previous:
+            continue
+        for measurement in ["seconds", "peak_bytes"]:
+            if measurement == "seconds" and max(item["seconds"], previous[key]["seconds"]) < min_seconds:
+                continue
+            ratio = item[measurement] / max(previous[key][measurement], 1e-12)
+            if ratio > 1 + tolerance:
+                regressions.append("%s, %d beats, %d files: %s %.3g -> %.3g (x%.2f)" % (
+                    key + (measurement, previous[key][measurement], item[measurement], ratio)))
+    return regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="HRV/HRA performance benchmarks")
+    parser.add_argument("--output", default="benchmark_results.json", help="the JSON file for the results")
+    parser.add_argument("--sizes", type=int, nargs="+", help="the lengths of the recordings (beats)")
+    parser.add_argument("--files", type=int, nargs="+", help="the numbers of the files in the projects")
+    parser.add_argument("--repeat", type=int, default=3, help="the number of the timed runs of each benchmark")
+    parser.add_argument("--quick", action="store_true", help="only the small sizes")
+    parser.add_argument("--compare", help="the JSON file with the results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="the relative change reported as a regression")
+    options = parser.parse_args(arguments)
+    sizes = options.sizes or (QUICK_SIZES if options.quick else SIZES)
+    files = options.files or (QUICK_FILES if options.quick else FILES)
+    results = run_benchmarks(sizes, files, options.repeat)
+    with open(options.output, 'w') as output_file:
+        json.dump(results, output_file, indent=1)
+    if options.compare:
+        with open(options.compare, 'r') as previous_file:
+            regressions = compare(results, json.load(previous_file), options.tolerance)
+        for regression in regressions:
+            print("REGRESSION: " + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
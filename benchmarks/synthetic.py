@@ -0,0 +1,61 @@
+import os
+from numpy import arange, sin, pi, zeros, cumsum, column_stack, savetxt, flatnonzero, concatenate, diff
+from numpy.random import default_rng
+
+# the annotations, as in the .rea files - 0 sinus, 1 ventricular, 2 supraventricular, 3 artifact
+SINUS, VENTRICULAR, SUPRAVENTRICULAR, ARTIFACT = 0, 1, 2, 3
+
+
+def synthetic_rr(n_beats, seed=0, ectopic_rate=0.01, artifact_rate=0.001):
+    """
+    a deterministic synthetic RR intervals time series - a slowly drifting mean heart rate with the LF and HF (respiratory)
+    oscillations and some noise, with ectopic beats (a premature beat followed by a compensatory pause) and artifacts
+    the ectopic beats and the artifacts are at least 3 beats apart, so that every clean segment can be split into runs
+    :param n_beats: the length of the time series
+    :param seed: the seed of the random generator - the same seed always gives the same recording
+    :param ectopic_rate: the fraction of the beats which are ectopic
+    :param artifact_rate: the fraction of the beats which are artifacts
+    :return: rr (in ms), annotation
+    """
+    generator = default_rng(seed)
+    beats = arange(n_beats)
+    rr = 800 + 60 * sin(2 * pi * beats / 20000) + 25 * sin(2 * pi * 0.1 * beats) + 15 * sin(2 * pi * 0.25 * beats)
+    rr += generator.normal(0, 10, n_beats)
+    annotation = zeros(n_beats, dtype=int)
+    # the positions of the special beats, thinned out so that they are far enough apart
+    events = flatnonzero(generator.random(n_beats) < ectopic_rate + artifact_rate)
+    events = events[(events > 0) & (events < n_beats - 2)]
+    if len(events) > 0:
+        events = events[concatenate(([True], diff(events) >= 3))]
+    kinds = generator.random(len(events)) < artifact_rate / max(ectopic_rate + artifact_rate, 1e-12)
+    artifacts, ectopic = events[kinds], events[~kinds]
+    rr[ectopic] *= 0.65
+    rr[ectopic + 1] *= 1.35
+    annotation[ectopic] = generator.choice([VENTRICULAR, SUPRAVENTRICULAR], len(ectopic))
+    rr[artifacts] = generator.choice([40.0, 9000.0], len(artifacts))
+    annotation[artifacts] = ARTIFACT
+    return rr, annotation
+
+
+def write_rea(path_to_file, rr, annotation):
+    """
+    writes the time series as a .rea file - the same columns as in the example recording: time[min], rri[ms], rr-flags[]
+    """
+    time = cumsum(rr) / 60000
+    with open(path_to_file, 'w') as rea_file:
+        rea_file.write("time[min]\trri[ms]\trr-flags[]\n")
+        savetxt(rea_file, column_stack((time, rr, annotation)), fmt=["%.6f", "%.6f", "%d"], delimiter="\t")
+
+
+def write_project(path, n_files, n_beats, seed=0):
+    """
+    writes a project - a directory with n_files synthetic recordings, each of them n_beats long
+    :return: the list of the paths to the files
+    """
+    os.makedirs(path, exist_ok=True)
+    paths = []
+    for file_number in range(n_files):
+        path_to_file = os.path.join(path, "synthetic_%05d.rea" % file_number)
+        write_rea(path_to_file, *synthetic_rr(n_beats, seed=seed + file_number))
+        paths.append(path_to_file)
+    return paths
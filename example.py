@@ -10,7 +10,7 @@ from numpy import sqrt
 # - annotation_filter = (1, 2, 3) means: filter out ventricular beats (1), supraventricular beats (2) and artifacts (3)
 # (this is the standard coding of non-sinus beats)
 rr = Signal("/Users/jaropis/Dropbox/AVA_Results/RR_intervals/AVA02_2017-01-18.txt", 0, 1, annotation_filter=(1, 2, 3))
-rr.set_poincare() # here the time domain HRV parameters are calculated
+rr.set_poincare(["SDNN", "SD1", "SD2"]) # here the time domain HRV parameters are calculated (only the ones used below)
 # and now let's see some of the results
 hrv = {"SDNN": rr.poincare.SDNN, "RMSSD": rr.poincare.SD1*sqrt(2), "SD1": rr.poincare.SD1, "SD2": rr.poincare.SD2}
 print('SDNN={SDNN}, RMSSD={RMSSD}, SD1={SD1}, SD2={SD2}'.format(**hrv))
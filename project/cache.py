@@ -0,0 +1,273 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from numpy import asarray, load, save
+
+
+class SignalCache:
+    """
+    This class keeps the parsed recordings (the signal, annotation and timetrack arrays, before filtering) on the drive,
+    next to the project, as .npy files, so that the text files do not have to be parsed again every time the project
+    is run. The arrays are reloaded memory-mapped, so reading a recording from the cache takes almost no time and
+    almost no memory.
+    Each recording is stored in its own directory, named after the path to the file, its size, its modification time
+    and the column configuration - if any of these changes, the old entry is not used any more. The total size of the
+    cache is limited - when it is exceeded, the least recently used entries are removed.
+    The entries, their sizes and last uses are kept in an index in memory, read from the drive once and then updated by
+    store, load and invalidate, so storing a file does not visit all the entries. The processes of a project (see
+    shared) each keep their own index - an entry stored by another process is counted when the index is read again.
+    """
+    array_names = ("signal", "annotation", "timetrack")
+    instances = {} # the caches shared by all the files analysed in this process, see shared
+
+    def __init__(self, cache_dir, max_size=1024**3):
+        """
+        :param cache_dir: the directory holding the cache, it is created if it does not exist
+        :param max_size: the maximum total size of the cache in bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.index = None # {path of the entry: [last use, size]}, read from the drive when it is first needed
+        self.index_size = 0 # the total size of the entries in the index
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def shared(cls, cache_dir, max_size=1024**3):
+        """
+        :return: the cache of the directory used by this process - the same object for all the files, so that the index
+        is read from the drive only once
+        """
+        cache = cls.instances.get(cache_dir)
+        if cache is None or not os.path.isdir(cache_dir):
+            cache = cls.instances[cache_dir] = cls(cache_dir, max_size)
+        cache.max_size = max_size
+        return cache
+
+    def file_key(self, path_to_file):
+        """
+        the part of the name of the entry which depends only on the path - all the entries of a file share it
+        """
+        return hashlib.sha1(os.path.abspath(path_to_file).encode()).hexdigest()[:20]
+
+    def entry_name(self, path_to_file, columns):
+        """
+        builds the name of the entry for the file in its current state and for the column configuration
+        :param path_to_file: path to the recording
+        :param columns: the column configuration, e.g. (column_signal, column_annot, column_sample_to_sample)
+        :return: the name of the directory holding the entry
+        """
+        file_stat = os.stat(path_to_file)
+        state = repr((file_stat.st_size, file_stat.st_mtime_ns, tuple(columns)))
+        return self.file_key(path_to_file) + "_" + hashlib.sha1(state.encode()).hexdigest()[:20]
+
+    def load(self, path_to_file, columns):
+        """
+        reads the arrays of a recording from the cache
+        :return: signal, annotation, timetrack as read-only memory-mapped arrays, or None if there is no valid entry
+        """
+        entry = os.path.join(self.cache_dir, self.entry_name(path_to_file, columns))
+        try:
+            arrays = tuple(load(os.path.join(entry, name + ".npy"), mmap_mode='r') for name in self.array_names)
+            os.utime(entry)  # the modification time of the entry is the time of its last use
+        except (OSError, ValueError):
+            return None
+        if self.index is not None and entry in self.index:
+            self.index[entry][0] = time.time()
+        return arrays
+
+    def store(self, path_to_file, columns, arrays):
+        """
+        writes the arrays of a recording to the cache, removes the older entries of the same file and, if the cache is
+        too large, the least recently used entries
+        :param arrays: signal, annotation, timetrack
+        """
+        name = self.entry_name(path_to_file, columns)
+        self.invalidate(path_to_file)
+        # the entry is written to a temporary directory first, so that an interrupted write never leaves a broken entry
+        temporary_entry = os.path.join(self.cache_dir, "tmp_" + name + "_" + str(os.getpid()))
+        os.makedirs(temporary_entry, exist_ok=True)
+        size = 0
+        for array_name, array_content in zip(self.array_names, arrays):
+            save(os.path.join(temporary_entry, array_name + ".npy"), array_content)
+            size += os.path.getsize(os.path.join(temporary_entry, array_name + ".npy"))
+        entry = os.path.join(self.cache_dir, name)
+        try:
+            os.rename(temporary_entry, entry)
+        except OSError:
+            # another process has just stored the same entry
+            shutil.rmtree(temporary_entry, ignore_errors=True)
+        self.add_to_index(entry, time.time(), size)
+        self.evict()
+
+    def entries(self):
+        """
+        reads all the entries from the drive and rebuilds the index
+        :return: list of [last use, size, path] of all the entries, from the least recently used one
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_dir() and not entry.name.startswith("tmp_"):
+                try:
+                    size = sum(item.stat().st_size for item in os.scandir(entry.path))
+                    entries.append([entry.stat().st_mtime, size, entry.path])
+                except OSError:
+                    pass
+        self.index = {path: [last_use, size] for last_use, size, path in entries}
+        self.index_size = sum(size for last_use, size, path in entries)
+        return sorted(entries)
+
+    def entries_index(self):
+        """
+        :return: the index of the entries, read from the drive if it has not been read yet
+        """
+        if self.index is None:
+            self.entries()
+        return self.index
+
+    def add_to_index(self, entry, last_use, size):
+        self.remove_from_index(entry)
+        self.entries_index()[entry] = [last_use, size]
+        self.index_size += size
+
+    def remove_from_index(self, entry):
+        if entry in self.entries_index():
+            self.index_size -= self.index.pop(entry)[1]
+
+    def size(self):
+        """
+        :return: the total size of the cache in bytes, as it is on the drive
+        """
+        return sum(entry[1] for entry in self.entries())
+
+    def evict(self):
+        """
+        removes the least recently used entries until the size of the cache (in the index) is within the limit - the
+        entries are sorted only when some of them have to be removed
+        """
+        if self.index_size <= self.max_size:
+            return
+        for last_use, size, path in sorted([last_use, size, path] for path, (last_use, size) in self.index.items()):
+            if self.index_size <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            self.remove_from_index(path)
+
+    def invalidate(self, path_to_file=None):
+        """
+        removes the entries of a file from the cache, or all the entries if no file is given
+        """
+        if path_to_file is None:
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_dir():
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            self.index, self.index_size = {}, 0
+            return
+        # the entries of a file are found in the index, not on the drive
+        prefix = os.path.join(self.cache_dir, self.file_key(path_to_file) + "_")
+        for path in [path for path in self.entries_index() if path.startswith(prefix)]:
+            shutil.rmtree(path, ignore_errors=True)
+            self.remove_from_index(path)
+
+class MemorySignalCache:
+    """
+    This class keeps the parsed recordings (the signal, annotation and timetrack arrays, before filtering) in memory, so
+    that when only the filters (or the analyses) of a project change, the files are not read or parsed again - the
+    arrays are taken from here and only filtered.
+    Each recording is kept under the path to the file, its size, its modification time and the column configuration -
+    if any of these changes, the old entry is not used any more. The total size of the arrays is limited - when it is
+    exceeded, the least recently used recordings are dropped.
+    The cached arrays are read-only: the Signal copies the annotation, in which the filters mark the bad beats, and
+    only slices the signal and the timetrack. The cache may be used by several threads at once (e.g. the readers of the
+    asyncio pipeline).
+    """
+    def __init__(self, max_size=256 * 1024**2):
+        """
+        :param max_size: the maximum total size of the arrays in bytes
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict() # {key: (signal, annotation, timetrack)}, from the least recently used one
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(path_to_file, columns):
+        """
+        :param columns: the column configuration, e.g. (column_signal, column_annot, column_sample_to_sample)
+        :return: the key of the file in its current state and of the column configuration
+        """
+        file_stat = os.stat(path_to_file)
+        return os.path.abspath(path_to_file), file_stat.st_size, file_stat.st_mtime_ns, tuple(columns)
+
+    @staticmethod
+    def arrays_size(arrays):
+        return sum(array_content.nbytes for array_content in arrays)
+
+    @staticmethod
+    def read_only_view(array_content):
+        view = asarray(array_content).view()
+        view.setflags(write=False)
+        return view
+
+    def load(self, path_to_file, columns):
+        """
+        :return: signal, annotation, timetrack (read-only arrays), or None if the file is not in the cache
+        """
+        try:
+            key = self.key(path_to_file, columns)
+        except OSError:
+            # the file is gone - reading it will report the error
+            key = None
+        with self.lock:
+            arrays = self.entries.get(key)
+            if arrays is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return arrays
+
+    def store(self, path_to_file, columns, arrays):
+        """
+        keeps the arrays of a recording, drops the older entries of the same file and, if the cache is too large, the
+        least recently used entries - a recording larger than the whole cache is not kept at all
+        :param arrays: signal, annotation, timetrack - read-only views of them are kept, the arrays themselves stay
+        writeable (they must not be changed afterwards, though)
+        """
+        key = self.key(path_to_file, columns)
+        arrays = tuple(self.read_only_view(array_content) for array_content in arrays)
+        size = self.arrays_size(arrays)
+        with self.lock:
+            self.drop(lambda entry_key: entry_key[0] == key[0])
+            if size > self.max_size:
+                return
+            self.entries[key] = arrays
+            self.size += size
+            while self.size > self.max_size:
+                self.size -= self.arrays_size(self.entries.popitem(last=False)[1])
+
+    def drop(self, condition):
+        for key in [key for key in self.entries if condition(key)]:
+            self.size -= self.arrays_size(self.entries.pop(key))
+
+    def invalidate(self, path_to_file=None):
+        """
+        drops the entries of a file, or all the entries if no file is given
+        """
+        with self.lock:
+            if path_to_file is None:
+                self.drop(lambda key: True)
+            else:
+                self.drop(lambda key: key[0] == os.path.abspath(path_to_file))
+
+    def statistics(self):
+        """
+        :return: dictionary {"hits": , "misses": , "files": , "size": , "max_size": }, the sizes in bytes
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "files": len(self.entries), "size": self.size,
+                    "max_size": self.max_size}
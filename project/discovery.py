@@ -0,0 +1,116 @@
+import json
+import os
+import time
+from fnmatch import fnmatch
+
+# a directory modified this recently may still be changing within the resolution of its modification time - it is not
+# trusted and is scanned again next time
+RACY_MTIME_NS = 2 * 10**9
+
+
+class FileIndex:
+    """
+    This class finds the files of a project - in its directory or, recursively, in the whole tree of directories below
+    it (e.g. site/subject/day/*.rea).
+    The contents of every directory visited are kept in an index (a JSON file, by default .HRAindex in the main directory
+    of the project): the modification time of the directory, its subdirectories and the size and modification time of
+    each of its files. Adding, removing or renaming a file changes the modification time of its directory, so when the
+    project is built again only the directories whose modification time has changed are read again - for the others
+    one os.stat is enough.
+    The paths are relative to the main directory, always with "/", and sorted - the order of the files does not depend
+    on the file system, so the results are reproducible.
+    """
+    def __init__(self, root, index_path=None):
+        """
+        :param root: the main directory of the project
+        :param index_path: the file holding the index, None means root/.HRAindex
+        """
+        self.root = root
+        self.index_path = os.path.join(root, ".HRAindex") if index_path is None else index_path
+        # {relative path of the directory: {"mtime": , "directories": [names], "files": {name: [size, mtime]}}}
+        self.directories = self.load()
+        self.rescanned = [] # the directories read again in the last scan
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r') as index_file:
+                return json.load(index_file)["directories"]
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def save(self):
+        """
+        writes the index - a project in a read-only directory simply works without it
+        """
+        try:
+            with open(self.index_path, 'w') as index_file:
+                json.dump({"directories": self.directories}, index_file)
+        except OSError:
+            pass
+
+    @staticmethod
+    def join(directory, name):
+        return name if directory == "" else directory + "/" + name
+
+    @staticmethod
+    def excluded(relative_path, exclude):
+        return any(fnmatch(relative_path, pattern) for pattern in exclude)
+
+    def read_directory(self, directory, scan_start):
+        """
+        reads the contents of a directory (with os.scandir) and puts them into the index
+        :param directory: the path relative to the root
+        :param scan_start: the time of the start of the scan, in ns
+        """
+        path = os.path.join(self.root, directory)
+        mtime = os.stat(path).st_mtime_ns
+        entry = {"mtime": mtime if mtime < scan_start - RACY_MTIME_NS else None, "directories": [], "files": {}}
+        with os.scandir(path) as items:
+            for item in items:
+                if item.is_dir(follow_symlinks=False):
+                    entry["directories"].append(item.name)
+                elif item.is_file():
+                    item_stat = item.stat()
+                    entry["files"][item.name] = [item_stat.st_size, item_stat.st_mtime_ns]
+        entry["directories"].sort()
+        self.directories[directory] = entry
+        self.rescanned.append(directory)
+        return entry
+
+    def scan(self, extension, recursive=False, include=(), exclude=()):
+        """
+        finds the files of the project and brings the index up to date
+        :param extension: the extension of the files, e.g. ".rea"
+        :param recursive: look in the subdirectories too
+        :param include: shell-style patterns of the relative paths (e.g. "site1/*"), a file is found if it matches any
+        of them; empty means all the files
+        :param exclude: shell-style patterns of the relative paths of the files and directories left out - a directory
+        matching any of them is not visited at all; the hidden directories (e.g. .HRAcache) are never visited
+        :return: sorted list of the paths of the files, relative to the root
+        """
+        scan_start = time.time_ns()
+        visited = {}
+        files = []
+        self.rescanned = []
+        directories = [""]
+        while len(directories) > 0:
+            directory = directories.pop()
+            entry = self.directories.get(directory)
+            if entry is None or entry["mtime"] is None or \
+                    os.stat(os.path.join(self.root, directory)).st_mtime_ns != entry["mtime"]:
+                entry = self.read_directory(directory, scan_start)
+            visited[directory] = entry
+            for name in entry["files"]:
+                relative_path = self.join(directory, name)
+                if name.endswith(extension) and not self.excluded(relative_path, exclude) and \
+                        (len(include) == 0 or any(fnmatch(relative_path, pattern) for pattern in include)):
+                    files.append(relative_path)
+            if recursive:
+                directories.extend(self.join(directory, name) for name in entry["directories"]
+                                   if not name.startswith(".") and not self.excluded(self.join(directory, name),
+                                                                                     exclude))
+        # the directories which are gone, or not visited any more, are forgotten
+        if len(self.rescanned) > 0 or len(visited) != len(self.directories):
+            self.directories = visited
+            self.save()
+        return sorted(files)
@@ -0,0 +1,148 @@
+"""
+the writers of the results of a project (a ResultsTable) - the tab separated text files, the compressed numpy archive
+(.npz) and the SQLite database; every writer works on whole columns, no Python object is built for a single file
+"""
+import sqlite3
+from itertools import islice, repeat
+from numpy import asarray, column_stack, arange, nonzero, savez_compressed, load
+from project.results_table import ResultsTable
+
+
+def table_text(filenames, values):
+    """
+    formats a table at once - the cells of each column and the separators are put into one list with slice assignments
+    and the list is joined once, so that there is no Python loop over the rows
+    :param filenames: array of the names of the files, the first column
+    :param values: 2-D array, one row per file (None if there are no files)
+    :return: the lines of the table, each ending with a new line
+    """
+    if len(filenames) == 0:
+        return ""
+    values = asarray(values)
+    rows, columns = len(filenames), values.shape[1]
+    # cell, separator, cell, separator... - each row takes 2 * (columns + 1) places
+    step = 2 * (columns + 1)
+    cells = [None] * (rows * step)
+    cells[0::step] = asarray(filenames).tolist()
+    for column in range(columns):
+        cells[2 * column + 2::step] = list(map(str, values[:, column].tolist()))
+    for column in range(columns + 1):
+        cells[2 * column + 1::step] = ["\t" if column < columns else "\n"] * rows
+    return "".join(cells)
+
+
+def write_tsv(path, first_line, filenames, values):
+    """
+    writes a tab separated table with the name of the file in the first column
+    :param first_line: the header, ending with a new line
+    """
+    with open(path, 'w') as output_file:
+        output_file.write(first_line)
+        output_file.write(table_text(filenames, values))
+
+
+def write_npz(path, table, LS_bands=None, spectrum_method="LS"):
+    """
+    writes the table to a compressed numpy archive - the Poincare descriptors are kept as one 2-D array, their names in
+    Poincare_descriptors
+    :param LS_bands: the cuts of the bands of the spectrum, kept in LS_bands
+    :param spectrum_method: "LS" (Lomb-Scargle) or "FFT" (the cuts in Hz) - the estimator of the band powers, kept in
+    spectrum_method
+    """
+    arrays = {"filenames": table.filenames}
+    if table.Poincare is not None:
+        arrays["Poincare_descriptors"] = asarray(list(table.Poincare), dtype=str)
+        arrays["Poincare"] = column_stack(list(table.Poincare.values())) if len(table.Poincare) > 0 else None
+    if table.runs is not None:
+        for name in ResultsTable.runs_names:
+            arrays[name] = table.runs[name]
+            arrays[name + "_lengths"] = table.runs_lengths[name]
+    if table.LS_spectrum is not None:
+        arrays["LS_spectrum"] = table.LS_spectrum
+        arrays["spectrum_method"] = asarray(spectrum_method)
+        if LS_bands is not None:
+            arrays["LS_bands"] = asarray(LS_bands, dtype=float)
+    savez_compressed(path, **{name: values for name, values in arrays.items() if values is not None})
+
+
+def read_npz(path):
+    """
+    reads the archive written by write_npz
+    :return: the ResultsTable
+    """
+    with load(path) as archive:
+        columns = {"filenames": archive["filenames"]}
+        if "Poincare_descriptors" in archive:
+            columns["Poincare"] = {name: archive["Poincare"][:, column]
+                                   for column, name in enumerate(archive["Poincare_descriptors"].tolist())}
+        if "dec_runs" in archive:
+            columns["runs"] = {name: archive[name] for name in ResultsTable.runs_names}
+            columns["runs_lengths"] = {name: archive[name + "_lengths"] for name in ResultsTable.runs_names}
+        if "LS_spectrum" in archive:
+            columns["LS_spectrum"] = archive["LS_spectrum"]
+    return ResultsTable(**columns)
+
+
+def insert_in_batches(connection, statement, rows, batch_size):
+    """
+    inserts the rows (an iterator of tuples) with executemany, batch_size rows at a time
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if len(batch) == 0:
+            break
+        connection.executemany(statement, batch)
+
+
+def write_sqlite(path, table, LS_band_names=None, batch_size=10000, LS_bands=None, spectrum_method="LS"):
+    """
+    writes the table to an SQLite database, in the tables:
+    Poincare (filename, one column per descriptor)
+    runs (filename, type, length, count) - type is dec, acc or neutral, one row per length of the histogram
+    LS_spectrum or FFT_spectrum, after spectrum_method (filename, band, low, high, power) - one row per band, low and
+    high are its cuts (in Hz for the FFT spectrum)
+    each of them indexed by filename; the tables which already are in the database are replaced
+    :param LS_band_names: the names of the bands, e.g. ["ULF", "VLF", "LF", "HF"], None means band1, band2...
+    :param LS_bands: the cuts of the bands, None means unknown (null)
+    :param spectrum_method: "LS" (Lomb-Scargle) or "FFT" - the estimator of the band powers
+    """
+    filenames = table.filenames
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            for name in ["Poincare", "runs", "LS_spectrum", "FFT_spectrum"]:
+                connection.execute("DROP TABLE IF EXISTS " + name)
+            if table.Poincare is not None:
+                names = list(table.Poincare)
+                connection.execute("CREATE TABLE Poincare (filename TEXT, " +
+                                   ", ".join('"%s" REAL' % name for name in names) + ")")
+                insert_in_batches(connection, "INSERT INTO Poincare VALUES (" + ", ".join(["?"] * (len(names) + 1)) +
+                                  ")", zip(filenames.tolist(), *[table.Poincare[name].tolist() for name in names]),
+                                  batch_size)
+                connection.execute("CREATE INDEX Poincare_filename ON Poincare (filename)")
+            if table.runs is not None:
+                connection.execute("CREATE TABLE runs (filename TEXT, type TEXT, length INTEGER, count INTEGER)")
+                for name in ResultsTable.runs_names:
+                    histograms = table.runs[name]
+                    # only the lengths up to the longest run of each file, not the padding
+                    rows, columns = nonzero(arange(histograms.shape[1]) < table.runs_lengths[name][:, None])
+                    insert_in_batches(connection, "INSERT INTO runs VALUES (?, ?, ?, ?)",
+                                      zip(filenames[rows].tolist(), repeat(name.split("_")[0]), (columns + 1).tolist(),
+                                          histograms[rows, columns].tolist()), batch_size)
+                connection.execute("CREATE INDEX runs_filename ON runs (filename)")
+            if table.LS_spectrum is not None:
+                bands = table.LS_spectrum.shape[1]
+                if LS_band_names is None:
+                    LS_band_names = ["band" + str(band + 1) for band in range(bands)]
+                cuts = [None] * (bands + 1) if LS_bands is None else list(LS_bands)
+                name = spectrum_method + "_spectrum"
+                connection.execute("CREATE TABLE " + name +
+                                   " (filename TEXT, band TEXT, low REAL, high REAL, power REAL)")
+                insert_in_batches(connection, "INSERT INTO " + name + " VALUES (?, ?, ?, ?, ?)",
+                                  zip(filenames.repeat(bands).tolist(), list(LS_band_names) * len(filenames),
+                                      cuts[:-1] * len(filenames), cuts[1:] * len(filenames),
+                                      table.LS_spectrum.ravel().tolist()), batch_size)
+                connection.execute("CREATE INDEX " + name + "_filename ON " + name + " (filename)")
+    finally:
+        connection.close()
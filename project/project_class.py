@@ -1,5 +1,166 @@
-from glob import glob
+import asyncio
+import hashlib
+import json
+import os
+from collections import deque
+from ast import literal_eval
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from types import SimpleNamespace
+from numpy import array, column_stack
 from signal_properties.RRclasses import  Signal
+from signal_properties.Poincare import Poincare
+from signal_properties.my_exceptions import WrongCuts, MissingResults
+from signal_properties.timing import StageTimer
+from project.cache import SignalCache, MemorySignalCache
+from project.discovery import FileIndex
+from project.results_table import ResultsTable
+from project.export import table_text, write_tsv, write_npz, write_sqlite
+
+# the Poincare plot descriptors kept for each file, in the order of the columns of the results file
+POINCARE_DESCRIPTORS = ["SDNN", "SD1", "SD2", "SD1d", "SD1a", "C1d", "C1a", "SD2d", "SD2a", "C2d", "C2a", "SDNNd",
+                        "SDNNa", "Cd", "Ca"]
+# the names of the standard bands of the LS spectrum
+STANDARD_BANDS = {(0, 0.003): "ULF", (0.003, 0.04): "VLF", (0.04, 0.15): "LF", (0.15, 0.4): "HF"}
+
+
+def new_timer(path_to_file, settings):
+    """
+    :return: the StageTimer for the file if the timing is switched on in the settings, None otherwise
+    """
+    if not settings["timing_state"]:
+        return None
+    timer = StageTimer(measure_memory=settings["measure_memory"])
+    timer.file = os.path.basename(path_to_file)
+    return timer
+
+
+def describe_error(error):
+    return type(error).__name__ + ": " + str(error)
+
+
+def read_file(path_to_file, settings, timer=None, memory_cache=None):
+    """
+    reads the raw data of a file (before filtering) - from the memory cache or from the cache, if they are switched on
+    and hold the file
+    :param memory_cache: the MemorySignalCache of the project, None means no memory cache
+    :return: signal, annotation, timetrack
+    """
+    columns = (settings["column_signal"], settings["column_annot"], settings["column_sample_to_sample"])
+    # with the caches, the parsing stage is the reading of the file or of the cache entry
+    with StageTimer.timed(timer, "parsing") as record:
+        raw_data = None if memory_cache is None else memory_cache.load(path_to_file, columns)
+        if raw_data is None:
+            if settings["cache_dir"] is None:
+                raw_data = Signal.read_data(path_to_file, *columns)
+            else:
+                cache = SignalCache.shared(settings["cache_dir"], settings["cache_max_size"])
+                raw_data = cache.load(path_to_file, columns)
+                if raw_data is None:
+                    raw_data = Signal.read_data(path_to_file, *columns)
+                    cache.store(path_to_file, columns, raw_data)
+            if memory_cache is not None:
+                memory_cache.store(path_to_file, columns, raw_data)
+        record["beats"] = len(raw_data[0])
+    return raw_data
+
+
+def build_signal(path_to_file, settings, timer=None, raw_data=None):
+    """
+    builds the Signal object for a file - from the cache, if it is switched on in the settings and holds the file
+    :param path_to_file: path to the file
+    :param settings: dictionary with the settings of the project, see Project.analysis_settings
+    :param timer: a StageTimer recording the time of each stage, None means no instrumentation
+    :param raw_data: the data of the file if it has already been read (see read_file), None means "read the file"
+    :return: Signal object, already filtered
+    """
+    if raw_data is None and settings["cache_dir"] is None:
+        return Signal(path_to_file=path_to_file, column_annot=settings["column_annot"],
+                      column_signal=settings["column_signal"],
+                      column_sample_to_sample=settings["column_sample_to_sample"],
+                      annotation_filter=settings["annotation_filter"], square_filter=settings["square_filter"],
+                      quotient_filter=settings["quotient_filter"], timer=timer)
+    if raw_data is None:
+        raw_data = read_file(path_to_file, settings, timer)
+    return Signal(path_to_file=list(raw_data), annotation_filter=settings["annotation_filter"],
+                  square_filter=settings["square_filter"], quotient_filter=settings["quotient_filter"], timer=timer)
+
+
+def analyse_file(path_to_file, settings, raw_data=None, timings=()):
+    """
+    builds the Signal for a file and calculates the HRV/HRA methods switched on in the settings
+    only the compact results are returned - the descriptors, not the Signal or the arrays it holds:
+    Poincare - the Poincare plot descriptors (attributes named as in the Poincare class)
+    runs - the histograms of the runs (dec_runs, acc_runs, neutral_runs, as in the Runs class)
+    LS_spectrum - array with the power in the bands of settings["LS_bands"]
+    if settings["timing_state"] is True, the time of each stage is measured and the records of the StageTimer are
+    returned as well, under "timings"
+    :param raw_data: the data of the file if it has already been read (see read_file), None means "read the file"
+    :param timings: the records of the stages which have already been timed, e.g. of reading the file
+    :return: dictionary {"Poincare": , "runs": , "LS_spectrum": }, None for the methods which are switched off
+    """
+    timer = new_timer(path_to_file, settings)
+    signal = build_signal(path_to_file, settings, timer, raw_data)
+    file_results = {"Poincare": None, "runs": None, "LS_spectrum": None}
+    if settings["Poincare_state"]:
+        # only the selected descriptors are calculated
+        signal.set_poincare(settings["Poincare_descriptors"])
+        file_results["Poincare"] = SimpleNamespace(**{name: getattr(signal.poincare, name)
+                                                      for name in settings["Poincare_descriptors"]})
+    if settings["runs_state"]:
+        signal.set_runs()
+        file_results["runs"] = SimpleNamespace(dec_runs=signal.runs.dec_runs, acc_runs=signal.runs.acc_runs,
+                                               neutral_runs=signal.runs.neutral_runs)
+    if settings["LS_spectrum_state"] and settings["LS_engine"] == "fft":
+        signal.set_FFT_spectrum(**settings["FFT_settings"])
+        file_results["LS_spectrum"] = signal.FFT_spectrum.get_bands(cuts=settings["LS_bands"],
+                                                                    df=signal.FFT_spectrum.resolution)
+    elif settings["LS_spectrum_state"]:
+        # the spectrum is calculated only up to the highest cut of the bands
+        signal.set_LS_spectrum(engine=settings["LS_engine"], max_frequency=max(settings["LS_bands"]),
+                               resolution=settings["LS_resolution"])
+        file_results["LS_spectrum"] = signal.LS_spectrum.get_bands(cuts=settings["LS_bands"],
+                                                                   df=signal.LS_spectrum.resolution)
+    if timer is not None:
+        file_results["timings"] = list(timings) + timer.records
+    return file_results
+
+
+def analyse_file_safely(path_to_file, settings, raw_data=None, timings=()):
+    """
+    like analyse_file, but a failure does not stop the project - it is returned instead of the results
+    :return: [file_results, None] or [None, description of the error]
+    """
+    try:
+        return [analyse_file(path_to_file, settings, raw_data, timings), None]
+    except Exception as error:
+        return [None, describe_error(error)]
+
+
+def read_file_safely(path_to_file, settings, memory_cache=None):
+    """
+    like read_file, but a failure is returned instead of the data
+    :return: [raw_data, timings, None] or [None, None, description of the error], timings - the records of the reading
+    (None if the timing is switched off)
+    """
+    timer = new_timer(path_to_file, settings)
+    try:
+        raw_data = read_file(path_to_file, settings, timer, memory_cache)
+    except Exception as error:
+        return [None, None, describe_error(error)]
+    return [raw_data, None if timer is None else timer.records, None]
+
+
+def read_and_analyse_file(path_to_file, settings, memory_cache=None):
+    """
+    reads the file through the memory cache and analyses it, a failure is returned instead of the results
+    :return: [file_results, None] or [None, description of the error], as analyse_file_safely
+    """
+    raw_data, timings, error = read_file_safely(path_to_file, settings, memory_cache)
+    if error is not None:
+        return [None, error]
+    return analyse_file_safely(path_to_file, settings, raw_data, timings or ())
+
 
 class Project:
     """
@@ -8,10 +169,19 @@ class Project:
     The main method of the Class is the step_thorugh_project class which goes over all the files in a project (folder
     with files), and calculates the HRV/HRA properties of the files
     """
-    def __init__(self, path, file_extension, column_signal, column_annot, column_sample_to_sample):
+    def __init__(self, path, file_extension, column_signal, column_annot, column_sample_to_sample, recursive=False,
+                 include=(), exclude=()):
+        """
+        :param recursive: look for the files in the subdirectories of path too, e.g. in site/subject/day/
+        :param include: the shell-style patterns of the paths of the files (relative to path), see FileIndex.scan
+        :param exclude: the shell-style patterns of the paths of the files and directories left out
+        """
         self.project_name = None
         self.path = path
         self.file_extension = file_extension
+        self.recursive = recursive
+        self.include = list(include)
+        self.exclude = list(exclude)
         self.column_signal = column_signal
         self.column_annot = column_annot
         self.column_sample_to_sample = column_sample_to_sample
@@ -19,26 +189,59 @@ class Project:
         self.square_filter=(-8000, 8000)
         self.annotation_filter=()
         self.files_list = self.get_files_list()
+        self.cache = None # the cache of the parsed files - see set_cache
+        self.memory_cache = None # the cache of the parsed files in memory - see set_memory_cache
+        self.timer = None # the StageTimer collecting the time of each stage of each file - see set_instrumentation
 
         # these three flags say whether or not the specific method should be used
         self.Poincare_state = False
         self.runs_state = False
         self.LS_spectrum_state = False
 
-        self.project_results = [] # this list of lists will hold the name of the file and the self.file_results for
-        # each file eg. [[filename1, {Poincare: , runs: , LS_spectrum}], [filename2, {Poincare: , runs: , LS_spectrum}}
+        self.Poincare_descriptors = list(POINCARE_DESCRIPTORS) # the Poincare plot descriptors kept for each file
+        self.LS_bands = [0, 0.003, 0.04, 0.15, 0.4] # the bands in which the power of the LS spectrum is calculated
+        self.LS_engine = "scipy" # the engine calculating the LS spectrum
+        self.LS_resolution = None # the spacing of the frequencies of the LS spectrum
+        self.FFT_settings = None # the settings of the FFT spectrum used instead of the LS one - see set_FFT_spectrum
+
+        self.results_table = ResultsTable() # the results of the files, in columns - see ResultsTable and project_results
+        self.failed_files = [] # the files which could not be analysed, [[filename, description of the error], ...]
+        self.results_files = {} # the names of the results files written in the streaming mode
+        self.manifest = {} # the fingerprints, settings and results of the analysed files - see write_state
+        self.persist_state = False # whether the state is kept on the drive (read or written) - see update_manifest
+
+    @property
+    def project_results(self):
+        """
+        the results of the files in the form of a list of lists - the name of the file and the file_results for each
+        file eg. [[filename1, {Poincare: , runs: , LS_spectrum}], [filename2, {Poincare: , runs: , LS_spectrum}}
+        the results are compact - only the descriptors are kept, see analyse_file
+        the results are kept in self.results_table, this list is built from it every time it is used
+        """
+        return self.results_table.rows()
+
+    @project_results.setter
+    def project_results(self, results):
+        self.results_table = ResultsTable.from_results(results)
 
     def get_files_list(self):
         """
-        build a list of the files associated with the project, i.e. in the correct directory, with the correct
-        extension
+        build a list of the files associated with the project, i.e. in the correct directory (or below it, if the
+        project is recursive), with the correct extension - the paths are relative to self.path and sorted, the
+        directories which have not changed since the last time are not read again (see FileIndex)
         """
-        return [item.split("/")[-1] for item in glob(self.path+'/*'+self.file_extension)]
+        if not os.path.isdir(self.path):
+            return []
+        return FileIndex(self.path).scan(self.file_extension, self.recursive, self.include, self.exclude)
 
-    def set_Poincare(self):
+    def set_Poincare(self, descriptors=None):
         """
         this means: calculate the Poincare descriptors
+        :param descriptors: the descriptors kept for each file, e.g. ["SDNN", "SD1", "SD2"] - the others are not
+        calculated at all; None means all the descriptors of POINCARE_DESCRIPTORS
         """
+        self.Poincare_descriptors = Poincare.check_descriptors(descriptors) if descriptors is not None \
+            else list(POINCARE_DESCRIPTORS)
         self.Poincare_state = True
 
     def set_runs(self):
@@ -47,11 +250,33 @@ class Project:
         """
         self.runs_state = True
 
-    def set_LS_spectrum(self):
+    def set_LS_spectrum(self, bands=[0, 0.003, 0.04, 0.15, 0.4], engine="scipy", resolution=None):
         """
         this means: calculate Lomb-Scargle spectrum
+        :param bands: the cuts of the bands in which the power is calculated - the spectra themselves are not kept and
+        they are calculated only up to the highest cut
+        :param engine: "scipy" (the reference) or "fast" (Press-Rybicki, for long recordings) - see LombScargleSpectrum
+        :param resolution: the spacing of the frequencies of the spectra, None means: as many frequencies between 0.01
+        and 2*pi as there are beats in the file - see LombScargleSpectrum
         """
         self.LS_spectrum_state = True
+        self.LS_bands = list(bands)
+        self.LS_engine = engine
+        self.LS_resolution = resolution
+
+    def set_FFT_spectrum(self, bands=[0, 0.003, 0.04, 0.15, 0.4], resampling_rate=4, segment=None, overlap=0.5):
+        """
+        this means: calculate the band powers of the FFT spectrum instead of the Lomb-Scargle spectrum - far cheaper for
+        long recordings; they are kept, written and exported as the LS spectrum results
+        :param bands: the cuts of the bands in Hz
+        :param resampling_rate: the rate at which the signal is resampled, in Hz
+        :param segment: the length of the Welch segments in seconds, None means the whole recording - see FFTSpectrum
+        :param overlap: the overlap of the segments, as a fraction of their length
+        """
+        self.LS_spectrum_state = True
+        self.LS_bands = list(bands)
+        self.LS_engine = "fft"
+        self.FFT_settings = {"resampling_rate": resampling_rate, "segment": segment, "overlap": overlap}
 
     def set_columns(self, column_signal=None, column_annotation=None, column_sample_to_sample=None):
         """
@@ -77,68 +302,372 @@ class Project:
         self.square_filter = square_filter
         self.quotient_filter = quotient_filter
 
-    def step_through_project_files(self):
+    def set_cache(self, max_size=1024**3, cache_dir=None):
+        """
+        switches on the cache of the parsed files - the arrays read from the files are saved as .npy files and, as long
+        as a file and the columns do not change, they are reloaded (memory-mapped) instead of parsing the file again
+        :param max_size: the maximum size of the cache in bytes, the least recently used files are removed above it
+        :param cache_dir: the directory of the cache, by default .HRAcache in the project folder
+        :return: does not return anything
+        """
+        if cache_dir is None:
+            cache_dir = self.path + "/.HRAcache"
+        self.cache = SignalCache.shared(cache_dir, max_size)
+
+    def set_memory_cache(self, max_size=256 * 1024**2):
+        """
+        switches on the cache of the parsed files in memory - the arrays read from the files (before filtering) are kept
+        and, as long as a file and the columns do not change, the next runs of the project (e.g. after set_filters) only
+        filter them and calculate the methods, the files are not read again
+        the cache is filled by the files read in this process - with workers > 1 only the files already in the cache are
+        passed to the processes, the others are read there, so the first run should be made with workers=1 or with the
+        pipeline (prefetch > 0)
+        the hits and misses are counted, see MemorySignalCache.statistics
+        :param max_size: the maximum size of the arrays in bytes, the least recently used files are dropped above it
+        :return: does not return anything
+        """
+        self.memory_cache = MemorySignalCache(max_size)
+
+    def invalidate_cache(self, file=None):
+        """
+        removes a file (the name as in self.files_list) or, if no file is given, all the files from the caches
+        """
+        path_to_file = None if file is None else self.path + "/" + file
+        if self.cache is not None:
+            self.cache.invalidate(path_to_file)
+        if self.memory_cache is not None:
+            self.memory_cache.invalidate(path_to_file)
+
+    def set_instrumentation(self, stage_callbacks=(), progress_callbacks=(), measure_memory=False):
+        """
+        switches on the measurement of the time (and the number of beats) of each stage of the analysis of each file,
+        the summary is written by dump_timings
+        :param stage_callbacks: functions called with the record of each stage of each file, see StageTimer
+        :param progress_callbacks: functions called with (filename, number of the files done, number of all the files)
+        after each file
+        :param measure_memory: measure the memory allocated in each stage too - this slows the analysis down
+        """
+        self.timer = StageTimer(measure_memory, stage_callbacks, progress_callbacks)
+
+    def analysis_settings(self):
+        """
+        collects the settings needed to analyse a single file, so that the files can be analysed in separate processes
+        :return: dictionary with the settings
+        """
+        return {"column_signal": self.column_signal, "column_annot": self.column_annot,
+                "column_sample_to_sample": self.column_sample_to_sample, "annotation_filter": self.annotation_filter,
+                "square_filter": self.square_filter, "quotient_filter": self.quotient_filter,
+                "Poincare_state": self.Poincare_state, "Poincare_descriptors": self.Poincare_descriptors,
+                "runs_state": self.runs_state,
+                "LS_spectrum_state": self.LS_spectrum_state, "LS_bands": self.LS_bands, "LS_engine": self.LS_engine,
+                "LS_resolution": self.LS_resolution, "FFT_settings": self.FFT_settings,
+                "cache_dir": None if self.cache is None else self.cache.cache_dir,
+                "cache_max_size": None if self.cache is None else self.cache.max_size,
+                "timing_state": self.timer is not None,
+                "measure_memory": self.timer is not None and self.timer.measure_memory}
+
+    def build_signal(self, path_to_file):
+        """
+        builds the Signal object for a file of the project - from the cache, if it is switched on and holds the file
+        :param path_to_file: path to the file
+        :return: Signal object, already filtered
+        """
+        return build_signal(path_to_file, self.analysis_settings())
+
+    def step_through_project_files(self, workers=1, streaming=False, prefetch=0):
         """
         this is the main method of this class - it visits every file and, if the _state variable is 1 calculates
         the respective HRV/HRA method
-        :return: dictionary with results, results = {Poincare: [], runs: [], LS_spectrum: []} - a list may be empty if the user
-         does not want a specific type of result
+        the results are put to self.project_results in the order of self.files_list, the files which could not be
+        analysed are put to self.failed_files and do not stop the project - both are emptied first, so the project can
+        be run again, e.g. after set_filters
+        :param workers: the number of processes analysing the files, 1 means: analyse the files in this process
+        :param streaming: if True, the results are not kept in self.project_results - the line of each file is written
+        to the results files as soon as the file is analysed (see stream_project_files)
+        :param prefetch: the number of files read ahead in the asyncio pipeline (see analyse_files_async), 0 means: no
+        pipeline, each file is read when its analysis starts
+        :return: does not return anything
         """
-        temp_poincare = None
-        temp_LS_spectrum = None
-        temp_runs = None
-        # above: just to begin with something
-        for file in self.files_list:
-            temp_path = self.path + "/" + file
-            temp_signal = Signal(path_to_file=temp_path, column_annot=self.column_annot, column_signal=self.column_signal,
-                                 column_sample_to_sample=self.column_sample_to_sample, annotation_filter=self.annotation_filter,
-                                 square_filter=self.square_filter, quotient_filter=self.quotient_filter)
-            if self.Poincare_state:
-                temp_signal.set_poincare()
-                temp_poincare = temp_signal.poincare
+        self.failed_files = []
+        if streaming:
+            self.stream_project_files(workers, prefetch)
+            return
+        self.results_table = ResultsTable()
+        for file, (temp_file_results, error) in self.analysed_files(workers, prefetch):
+            if error is None:
+                self.results_table.append(file, temp_file_results)
             else:
-                temp_poincare = None
+                self.failed_files.append([file, error])
 
-            if self.runs_state:
-                temp_signal.set_runs()
-                temp_runs = temp_signal.runs
-            else:
-                temp_runs = None
+    def analyse_files(self, workers=1):
+        """
+        analyses the files of the project, one by one or in a pool of processes - the files whose results in the
+        manifest are up to date (see is_up_to_date) are not analysed again, their results are taken from the manifest,
+        the results of the analysed files are put to the manifest
+        :param workers: the number of processes analysing the files, 1 means: analyse the files in this process
+        :return: generator of [filename, [file_results, error]], in the order of self.files_list - the result of a file
+        is available as soon as this file (and all the files before it) have been analysed
+        """
+        settings = self.analysis_settings()
+        manifest_settings = self.manifest_settings()
+        files_to_analyse = self.outdated_files(manifest_settings)
+        paths = [self.path + "/" + file for file in files_to_analyse]
+        analysed_files = self.analyse_paths(paths, settings, workers, self.memory_cache)
+        done = 0
+        for file in self.files_list:
+            if file not in files_to_analyse:
+                yield file, [self.results_from_manifest(file), None]
+                continue
+            file_results, error = next(analysed_files)
+            done += 1
+            self.collect_file_results(file, files_to_analyse, manifest_settings, file_results, error, done)
+            yield file, [file_results, error]
+
+    async def analyse_files_async(self, workers=1, prefetch=2):
+        """
+        the asyncio pipeline version of analyse_files - while the files are analysed in an executor (a thread, or a pool
+        of processes), the next files are read and parsed in a pool of threads, so that waiting for the (e.g. network)
+        drive overlaps with the computation
+        the files read ahead wait in a queue of at most prefetch files - the reading stops while the queue is full, so
+        the memory used does not grow when the analysis is slower than the reading
+        :param workers: the number of processes analysing the files, 1 means: analyse the files in a thread of this
+        process
+        :param prefetch: the number of files read ahead
+        :return: asynchronous generator of [filename, [file_results, error]], in the order of self.files_list - the
+        result of a file is available as soon as this file (and all the files before it) have been analysed
+        """
+        loop = asyncio.get_running_loop()
+        settings = self.analysis_settings()
+        manifest_settings = self.manifest_settings()
+        files_to_analyse = self.outdated_files(manifest_settings)
+        read_ahead = asyncio.Queue(maxsize=max(1, prefetch))
+        readers = ThreadPoolExecutor(max_workers=max(1, prefetch))
+        analysers = ProcessPoolExecutor(max_workers=workers) if workers > 1 else ThreadPoolExecutor(max_workers=1)
+
+        async def read_files():
+            for file in files_to_analyse:
+                # waits while the queue is full
+                await read_ahead.put(loop.run_in_executor(readers, read_file_safely, self.path + "/" + file, settings,
+                                                         self.memory_cache))
+
+        def ready(result):
+            future = loop.create_future()
+            future.set_result(result)
+            return future
+
+        done = 0
 
-            if self.LS_spectrum_state:
-                temp_signal.set_LS_spectrum()
-                temp_LS_spectrum = temp_signal.LS_spectrum
-            temp_file_results = {"Poincare": temp_poincare, "runs": temp_runs, "LS_spectrum": temp_LS_spectrum}
-            self.project_results.append([file, temp_file_results])
+        def finish(file, result):
+            nonlocal done
+            if file in files_to_analyse:
+                done += 1
+                self.collect_file_results(file, files_to_analyse, manifest_settings, *result, done)
+            return [file, result]
+
+        reading = asyncio.ensure_future(read_files())
+        in_progress = deque() # [filename, future of [file_results, error]], in the order of self.files_list
+        try:
+            for file in self.files_list:
+                if file not in files_to_analyse:
+                    in_progress.append([file, ready([self.results_from_manifest(file), None])])
+                else:
+                    raw_data, timings, error = await (await read_ahead.get())
+                    if error is not None:
+                        in_progress.append([file, ready([None, error])])
+                    else:
+                        in_progress.append([file, loop.run_in_executor(analysers, analyse_file_safely,
+                                                                       self.path + "/" + file, settings, raw_data,
+                                                                       timings or ())])
+                # no more than workers files are analysed at the same time, the ready results are passed on at once
+                while len(in_progress) > workers or (len(in_progress) > 0 and in_progress[0][1].done()):
+                    file, result = in_progress.popleft()
+                    yield finish(file, await result)
+            while len(in_progress) > 0:
+                file, result = in_progress.popleft()
+                yield finish(file, await result)
+        finally:
+            reading.cancel()
+            readers.shutdown(wait=False, cancel_futures=True)
+            analysers.shutdown(wait=False, cancel_futures=True)
+
+    def pipeline_files(self, workers=1, prefetch=2):
+        """
+        runs analyse_files_async in its own event loop
+        :return: generator of [filename, [file_results, error]], the same as the one of analyse_files
+        """
+        loop = asyncio.new_event_loop()
+        analysed_files = self.analyse_files_async(workers, prefetch)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(analysed_files.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(analysed_files.aclose())
+            loop.close()
+
+    def analysed_files(self, workers, prefetch):
+        """
+        :return: the generator of the results of the files - analyse_files, or the asyncio pipeline if prefetch > 0
+        """
+        return self.pipeline_files(workers, prefetch) if prefetch > 0 else self.analyse_files(workers)
+
+    def outdated_files(self, manifest_settings):
+        """
+        :return: dictionary {filename: os.stat of the file} of the files which have to be analysed, in the order of
+        self.files_list
+        """
+        return {file: os.stat(self.path + "/" + file) for file in self.files_list
+                if not self.is_up_to_date(file, manifest_settings)}
+
+    def collect_file_results(self, file, files_to_analyse, manifest_settings, file_results, error, done):
+        """
+        the records of the timer and the manifest are updated with the results of a freshly analysed file
+        :param files_to_analyse: see outdated_files
+        :param done: the number of the files analysed so far, this one included
+        """
+        if error is None:
+            timings = file_results.pop("timings", None)
+            if timings is not None:
+                self.timer.add_records(timings)
+            self.update_manifest(file, files_to_analyse[file], manifest_settings, file_results)
+        if self.timer is not None:
+            self.timer.progress(file, done, len(files_to_analyse))
+
+    @staticmethod
+    def analyse_paths(paths, settings, workers, memory_cache=None):
+        """
+        the generator of analyse_file_safely results for the paths, in their order
+        :param memory_cache: the MemorySignalCache, None means no memory cache - see set_memory_cache
+        """
+        if workers > 1 and len(paths) > 0:
+            columns = (settings["column_signal"], settings["column_annot"], settings["column_sample_to_sample"])
+            # the files in the memory cache are passed to the processes, the others are read there
+            cached_data = (None if memory_cache is None else memory_cache.load(path, columns) for path in paths)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for file_results in executor.map(analyse_file_safely, paths, repeat(settings), cached_data,
+                                                 chunksize=max(1, len(paths) // (4 * workers))):
+                    yield file_results
+        elif memory_cache is not None:
+            for path in paths:
+                yield read_and_analyse_file(path, settings, memory_cache)
+        else:
+            for path in paths:
+                yield analyse_file_safely(path, settings)
+
+    def stream_project_files(self, workers=1, prefetch=0):
+        """
+        the streaming, constant memory version of step_through_project_files - the results files are opened before the
+        files are analysed and the line of each file is written as soon as it is ready, the results are not kept in
+        self.project_results
+        the number of the columns of the runs file depends on the longest runs in the whole project, so only the
+        histograms of the runs are kept and the runs file is written when all the files have been analysed
+        :param workers: the number of processes analysing the files, 1 means: analyse the files in this process
+        :param prefetch: the number of files read ahead, see step_through_project_files
+        :return: dictionary with the names of the results files {"Poincare": , "runs": , "LS_spectrum": }
+        """
+        results_files = {}
+        open_files = {}
+        self.failed_files = []
+        self.results_table = ResultsTable() # the results of an earlier run would be written to the manifest
+        if self.Poincare_state:
+            results_files["Poincare"] = self.build_name(prefix="Poincare_")
+            open_files["Poincare"] = open(results_files["Poincare"], 'w')
+            open_files["Poincare"].write(self.Poincare_first_line(self.Poincare_descriptors))
+        if self.LS_spectrum_state:
+            results_files["LS_spectrum"] = self.build_name(prefix=self.spectrum_method() + "_spectrum_")
+            open_files["LS_spectrum"] = open(results_files["LS_spectrum"], 'w')
+            open_files["LS_spectrum"].write(self.LS_spectrum_first_line(self.LS_bands, self.spectrum_method()))
+        all_runs = [] # [[filename, runs], ...] - the histograms only
+        try:
+            for file, (temp_file_results, error) in self.analysed_files(workers, prefetch):
+                if error is not None:
+                    self.failed_files.append([file, error])
+                    continue
+                if self.Poincare_state:
+                    open_files["Poincare"].write(self.Poincare_line(file, temp_file_results["Poincare"],
+                                                                     self.Poincare_descriptors))
+                    open_files["Poincare"].flush()
+                if self.LS_spectrum_state:
+                    open_files["LS_spectrum"].write(self.LS_spectrum_line(file, temp_file_results["LS_spectrum"]))
+                    open_files["LS_spectrum"].flush()
+                if self.runs_state:
+                    all_runs.append([file, temp_file_results["runs"]])
+        finally:
+            for results in open_files.values():
+                results.close()
+        if self.runs_state and len(all_runs) > 0:
+            # the finalization pass - only now the longest runs in the project are known
+            longest_runs = self.longest_runs([file_runs[1] for file_runs in all_runs])
+            results_files["runs"] = self.build_name(prefix="runs_")
+            with open(results_files["runs"], 'w') as results:
+                results.write(self.runs_first_line(longest_runs))
+                for file, runs in all_runs:
+                    results.write(self.runs_line(file, runs, longest_runs))
+        self.results_files = results_files
+        return results_files
 
     # methods to finish
     def read_state(self):
         """
         this method checks if the project already exists, reads from the .project files the state of the project, and,
-        if some of the calculations have already been performed, it prevents the Project from re-doing them
+        if some of the calculations have already been performed, it prevents the Project from re-doing them - the
+        manifest of the files (see write_state) is read into self.manifest and step_through_project_files analyses only
+        the files which are new, have changed or have been analysed with different settings
         :return:
         """
         try:
             input_file = open(self.path + "/.HRAproject", 'r')
-            self.project_name = input_file.readline().split(':')[1].rstrip()
-            self.files_no = int(input_file.readline().split(':')[1].rstrip())
-            self.column_signal = int(input_file.readline().split(':')[1].rstrip())
-            self.column_annot = int(input_file.readline().split(':')[1].rstrip())
-            self.column_sample_to_sample = int(input_file.readline().split(':')[1].rstrip())
-            self.annotation_filter = eval(input_file.readline().split(':')[1].rstrip())
-            self.square_filter = eval(input_file.readline().split(':')[1].rstrip())
-            self.quotient_filter = int(input_file.readline().split(':')[1].rstrip())
-            self.Poincare_state = bool(input_file.readline().split(':')[1].rstrip())
-            self.runs_state = bool(input_file.readline().split(':')[1].rstrip())
-            self.LS_spectrum_state = bool(input_file.readline().split(':')[1].rstrip())
+            self.project_name = input_file.readline().split(':', 1)[1].rstrip()
+            self.files_no = int(self.read_value(input_file.readline()))
+            self.column_signal = self.read_value(input_file.readline())
+            self.column_annot = self.read_value(input_file.readline())
+            self.column_sample_to_sample = self.read_value(input_file.readline())
+            self.annotation_filter = self.read_value(input_file.readline())
+            self.square_filter = self.read_value(input_file.readline())
+            self.quotient_filter = self.read_value(input_file.readline())
+            self.Poincare_state = bool(self.read_value(input_file.readline()))
+            self.runs_state = bool(self.read_value(input_file.readline()))
+            self.LS_spectrum_state = bool(self.read_value(input_file.readline()))
             input_file.close()
+            if os.path.exists(self.path + "/.HRAmanifest"):
+                with open(self.path + "/.HRAmanifest", 'r') as manifest_file:
+                    manifest = json.load(manifest_file)
+                self.LS_bands = manifest["LS_bands"]
+                self.Poincare_descriptors = manifest.get("Poincare_descriptors", list(POINCARE_DESCRIPTORS))
+                self.LS_engine = manifest["LS_engine"]
+                self.LS_resolution = manifest.get("LS_resolution")
+                self.FFT_settings = manifest.get("FFT_settings")
+                self.manifest = manifest["files"]
+                self.persist_state = True
+                if "discovery" in manifest:
+                    # the files of the project are found again as they were found when the state was written
+                    self.recursive = manifest["discovery"]["recursive"]
+                    self.include = manifest["discovery"]["include"]
+                    self.exclude = manifest["discovery"]["exclude"]
+                    self.files_list = self.get_files_list()
             return(True)
         except Exception:
             return(False)
 
+    @staticmethod
+    def read_value(line):
+        """
+        reads the value from a "name:value" line of the .HRAproject file - numbers, tuples etc. are evaluated (safely),
+        anything else, e.g. the name of a column, is returned as a string
+        """
+        value = line.split(':', 1)[1].rstrip()
+        try:
+            return literal_eval(value)
+        except (ValueError, SyntaxError):
+            return value
+
     def write_state(self):
         """
-        this method writes the state of the project to the drive
+        this method writes the state of the project to the drive - the settings go to the .HRAproject file, the
+        manifest of the analysed files to the .HRAmanifest file (JSON) - for each file it holds the fingerprint of the
+        file, the settings used to analyse it and the calculated descriptors
         :return:
         """
         try:
@@ -146,9 +675,9 @@ class Project:
 
             output_line = "project name:" + str(self.project_name) + "\n"
             output_line += "number of files:"+ str(len(self.files_list)) + "\n"
-            output_line += "column signal:" + str(self.column_signal) + "\n"
-            output_line += "column annotation:" + str(self.column_annot) + "\n"
-            output_line += "column sample to sample:" + str(self.column_sample_to_sample) + "\n"
+            output_line += "column signal:" + repr(self.column_signal) + "\n"
+            output_line += "column annotation:" + repr(self.column_annot) + "\n"
+            output_line += "column sample to sample:" + repr(self.column_sample_to_sample) + "\n"
             output_line += "annotation filter:" + str(self.annotation_filter) + "\n"
             output_line += "square filter:" + str(self.square_filter) + "\n"
             output_line += "quotient filter:" + str(self.quotient_filter) + "\n"
@@ -157,87 +686,276 @@ class Project:
             output_line += "LS_spectrum state:" + str(int(self.LS_spectrum_state)) + "\n"
             output_file.write(output_line)
             output_file.close()
+            self.complete_manifest()
+            with open(self.path + "/.HRAmanifest", 'w') as manifest_file:
+                json.dump({"LS_bands": self.LS_bands, "LS_engine": self.LS_engine, "LS_resolution": self.LS_resolution,
+                           "FFT_settings": self.FFT_settings, "Poincare_descriptors": self.Poincare_descriptors,
+                           "discovery": {"recursive": self.recursive, "include": self.include, "exclude": self.exclude},
+                           "files": {file: self.manifest[file] for file in self.files_list if file in self.manifest}},
+                          manifest_file)
+            self.persist_state = True
             return True
         except Exception:
             return False
 
+    # the manifest of the files - self.manifest is a dictionary {filename: entry}, where entry is
+    # {"size": , "mtime": , "fingerprint": , "settings": , "results": } - see update_manifest and complete_manifest
+    def manifest_settings(self):
+        """
+        the settings which decide about the results of a file, in the form in which they are kept in the manifest
+        """
+        settings = self.analysis_settings()
+        del settings["cache_dir"], settings["cache_max_size"], settings["timing_state"], settings["measure_memory"]
+        return json.loads(json.dumps(settings))
+
+    @staticmethod
+    def fingerprint(path_to_file):
+        """
+        the fingerprint of the content of a file
+        """
+        content_hash = hashlib.blake2b(digest_size=16)
+        with open(path_to_file, 'rb') as input_file:
+            for block in iter(lambda: input_file.read(1024**2), b""):
+                content_hash.update(block)
+        return content_hash.hexdigest()
+
+    def is_up_to_date(self, file, settings):
+        """
+        checks if the results of a file in the manifest can be used - the file has not changed and has been analysed
+        with the current settings; the content of the file is read only if its size or modification time has changed
+        :param file: the name of the file, as in self.files_list
+        :param settings: the current settings, see manifest_settings
+        """
+        entry = self.manifest.get(file)
+        if entry is None or entry["settings"] != settings or "results" not in entry:
+            return False
+        file_stat = os.stat(self.path + "/" + file)
+        if entry["size"] == file_stat.st_size and entry["mtime"] == file_stat.st_mtime_ns:
+            return True
+        if entry["fingerprint"] is not None and entry["fingerprint"] == self.fingerprint(self.path + "/" + file):
+            # the file has been touched, but not changed
+            entry["size"], entry["mtime"] = file_stat.st_size, file_stat.st_mtime_ns
+            return True
+        return False
+
+    def update_manifest(self, file, file_stat, settings, file_results):
+        """
+        puts a freshly analysed file to the manifest - the fingerprint is calculated only when the state is written, and
+        the results are kept only if the state is kept on the drive, otherwise write_state takes them from the results
+        table (so that the streaming mode keeps no results in memory)
+        :param file_stat: the os.stat of the file from before the analysis
+        """
+        self.manifest[file] = {"size": file_stat.st_size, "mtime": file_stat.st_mtime_ns, "fingerprint": None,
+                               "settings": settings}
+        if self.persist_state:
+            self.manifest[file]["results"] = self.manifest_results(file_results)
+
+    @staticmethod
+    def manifest_results(file_results):
+        """
+        the results of a file in the form in which they are kept in the manifest (JSON)
+        """
+        results = {"Poincare": None, "runs": None, "LS_spectrum": None}
+        if file_results["Poincare"] is not None:
+            results["Poincare"] = {name: None if value is None else float(value)
+                                   for name, value in vars(file_results["Poincare"]).items()}
+        if file_results["runs"] is not None:
+            results["runs"] = {name: list(histogram) for name, histogram in vars(file_results["runs"]).items()}
+        if file_results["LS_spectrum"] is not None:
+            results["LS_spectrum"] = [float(power) for power in file_results["LS_spectrum"]]
+        return results
+
+    def complete_manifest(self):
+        """
+        prepares the manifest to be written - the missing results are taken from the results table and the missing
+        fingerprints are calculated, but only for the files which have not changed since they were analysed; the entries
+        which cannot be completed are dropped, so these files are analysed again
+        """
+        rows = {filename: row for row, filename in enumerate(self.results_table.filenames.tolist())}
+        for file in list(self.manifest):
+            entry = self.manifest[file]
+            if "results" not in entry:
+                if file not in rows:
+                    del self.manifest[file]
+                    continue
+                entry["results"] = self.manifest_results(self.results_table.file_results(rows[file]))
+            if entry["fingerprint"] is None:
+                try:
+                    file_stat = os.stat(self.path + "/" + file)
+                except OSError:
+                    del self.manifest[file]
+                    continue
+                if entry["size"] != file_stat.st_size or entry["mtime"] != file_stat.st_mtime_ns:
+                    del self.manifest[file]
+                    continue
+                entry["fingerprint"] = self.fingerprint(self.path + "/" + file)
+
+    def results_from_manifest(self, file):
+        """
+        builds the (compact) results of a file from the manifest - the same as the ones returned by analyse_file
+        """
+        results = self.manifest[file]["results"]
+        return {"Poincare": None if results["Poincare"] is None else SimpleNamespace(**results["Poincare"]),
+                "runs": None if results["runs"] is None else SimpleNamespace(**results["runs"]),
+                "LS_spectrum": None if results["LS_spectrum"] is None else array(results["LS_spectrum"])}
+
     def dump_Poincare(self):
         """
         this method writes a csv/xlsx/ods file to the disk - this file contains the Poincare plot descriptors for each
         file in the project
-        :return:
+        :return: the name of the file
         """
-        results_first_line = "filename\tSDNN\tSD1\tSD2\tSD1d\tSD1a\tC1d\tC1a\tSD2d\tSD2a\tC2d\tC2a\tSDNNd\tSDNNa\tCd\tCa\n"
+        Poincare = self.results_section("Poincare")
+        values = None if Poincare is None else column_stack([Poincare[name] for name in self.Poincare_descriptors])
         results_file = self.build_name(prefix="Poincare_")
-        results = open(results_file, 'w')
-        results.write(results_first_line)
-        for file_result in self.project_results:
-            file_name = file_result[0]
-            temp_poincare_object = file_result[1]['Poincare'] # this is a dictionary - I select key Poincare
-            res_line = file_name + "\t"
-            res_line += str(temp_poincare_object.SDNN) + "\t" + str(temp_poincare_object.SD1) + "\t" + str(temp_poincare_object.SD2) + "\t" + \
-                        str(temp_poincare_object.SD1d) + "\t" + str(temp_poincare_object.SD1a) + "\t" + str(temp_poincare_object.C1d) + "\t" + \
-                        str(temp_poincare_object.C1a) + "\t" + str(temp_poincare_object.SD2d) + "\t" + str(temp_poincare_object.SD2a) + "\t" + \
-                        str(temp_poincare_object.C2d) + "\t" + str(temp_poincare_object.C2a) + "\t" + str(temp_poincare_object.SDNNd) + "\t" + \
-                        str(temp_poincare_object.SDNNa) + "\t" + str(temp_poincare_object.Cd) + "\t" + str(temp_poincare_object.Ca) + "\n"
-            results.write(res_line)
-        results.close()
+        write_tsv(results_file, self.Poincare_first_line(self.Poincare_descriptors), self.results_table.filenames,
+                  values)
+        return results_file
 
     def dump_runs(self):
         """
         this method writes a csv/xlsx/ods file to the disk - this file contains the monotonic runs for each
         file in the project
-        :return:
+        :return: the name of the file
         """
-        max_dec_len, max_acc_len, max_neutral_len = self.find_longest_runs()
-        print(max_dec_len, max_acc_len, max_neutral_len)
-        results_first_line = "file_name" + "\t" + "\t".join(["dec"+str(_+1) for _ in range(max_dec_len)]) + "\t"+ \
-                     "\t".join(["acc" + str(_ + 1) for _ in range(max_acc_len)]) + "\t" + \
-                     "\t".join(["neutral" + str(_ + 1) for _ in range(max_neutral_len)]) + "\n"
+        runs = self.results_section("runs")
+        # the histograms in the table are already padded to the longest runs in the project
+        values = None if runs is None else column_stack([runs[name] for name in ResultsTable.runs_names])
         results_file = self.build_name(prefix="runs_")
-        results = open(results_file, 'w')
-        results.write(results_first_line)
-        for file_result in self.project_results:
-            file_name = file_result[0]
-            temp_runs_object = file_result[1]['runs']  # this is a dictionary - I select key 'runs'
-            print(temp_runs_object.neutral_runs)
-            res_line = file_name + "\t"
-            res_line += "\t".join([str(_) for _ in (temp_runs_object.dec_runs + [0] * (max_dec_len - len(temp_runs_object.dec_runs)))]) + "\t" + \
-                       "\t".join([str(_) for _ in (temp_runs_object.acc_runs + [0] * (max_acc_len - len(temp_runs_object.acc_runs)))]) + "\t" + \
-                        "\t".join([str(_) for _ in (temp_runs_object.neutral_runs + [0] * (max_neutral_len - len(temp_runs_object.neutral_runs)))]) + "\n"
-            print(res_line)
-            results.write(res_line)
-        results.close()
-
-    def dump_LS_spectrum(self, bands=[0, 0.003, 0.04, 0.15, 0.4]):
+        write_tsv(results_file, self.runs_first_line(self.find_longest_runs()), self.results_table.filenames, values)
+        return results_file
+
+    def dump_LS_spectrum(self, bands=None):
         """
         this method writes a csv/xlsx/ods file to the disk - this file contains the LS_spectrum for each
         file in the project
-        :return:
+        :param bands: the spectra are not kept, so the bands must be set with set_LS_spectrum before the project is
+        run - if bands are given here, they must be the same
+        :return: the name of the file - FFT_spectrum_... for the band powers of the FFT spectrum (see set_FFT_spectrum)
+        """
+        if bands is not None and list(bands) != self.LS_bands:
+            raise WrongCuts
+        values = self.results_section("LS_spectrum")
+        results_file = self.build_name(prefix=self.spectrum_method() + "_spectrum_")
+        write_tsv(results_file, self.LS_spectrum_first_line(self.LS_bands, self.spectrum_method()),
+                  self.results_table.filenames, values)
+        return results_file
+
+    def results_section(self, section):
+        """
+        a section of the results table for the dump_ methods, checked before the results file is opened
+        :param section: "Poincare", "runs" or "LS_spectrum"
+        :return: the section, None if there are no results at all (no files, or all of them failed) - then only the
+        header is written
+        """
+        values = getattr(self.results_table, section)
+        if values is None and len(self.results_table) > 0:
+            # the analysis has not been switched on when the project was run
+            raise MissingResults
+        return values
+
+    def dump_npz(self):
+        """
+        writes all the results of the project to a compressed numpy archive (see export.write_npz), which can be read
+        back with export.read_npz
+        :return: the name of the file
+        """
+        results_file = self.build_name(extension=".npz")
+        write_npz(results_file, self.results_table, self.LS_bands if self.LS_spectrum_state else None,
+                  self.spectrum_method())
+        return results_file
+
+    def dump_sqlite(self, path_to_database=None):
+        """
+        writes all the results of the project to an SQLite database (see export.write_sqlite)
+        :param path_to_database: None means a new database next to the other results files
+        :return: the name of the file
+        """
+        if path_to_database is None:
+            path_to_database = self.build_name(extension=".sqlite")
+        write_sqlite(path_to_database, self.results_table, self.LS_band_names(self.LS_bands), LS_bands=self.LS_bands,
+                     spectrum_method=self.spectrum_method())
+        return path_to_database
+
+    def dump_timings(self):
         """
-        results_first_line = "VLF\tULF\tLF\tHF\tTP\n"
-        results_file = self.build_name(prefix="LS_spectrum_")
-        results = open(results_file, 'w')
-        results.write(results_first_line)
-        for file_result in self.project_results:
-            file_name = file_result[0]
-            temp_spectral_results_object = file_result[1]['LS_spectrum']
-            temp_spectral_results_for_file = temp_spectral_results_object.get_bands(cuts=bands,
-                                                                                  df=temp_spectral_results_object.frequency[1]-temp_spectral_results_object.frequency[0])
-            results.write("\t".join(map(str, temp_spectral_results_for_file))+"\n")
-        results.close()
-
-    def build_name(self, prefix=""):
+        this method writes a csv file to the disk - this file contains the summary of the time of each stage of the
+        analysis over all the files analysed since set_instrumentation
+        :return: the name of the file
+        """
+        results_file = self.build_name(prefix="timings_")
+        with open(results_file, 'w') as results:
+            results.write("stage\tfiles\tbeats\tseconds\tbeats_per_second\tallocated_bytes\n")
+            for stage in self.timer.summary():
+                results.write("\t".join(map(str, stage)) + "\n")
+        return results_file
+
+    # the lines of the results files - shared by the dump_ methods and by the streaming mode
+    @staticmethod
+    def Poincare_first_line(descriptors=POINCARE_DESCRIPTORS):
+        return "filename\t" + "\t".join(descriptors) + "\n"
+
+    @staticmethod
+    def Poincare_line(file_name, poincare, descriptors=POINCARE_DESCRIPTORS):
+        return table_text(array([file_name]), array([[getattr(poincare, name) for name in descriptors]], dtype=float))
+
+    @staticmethod
+    def runs_first_line(longest_runs):
+        max_dec_len, max_acc_len, max_neutral_len = longest_runs
+        return "\t".join(["file_name"] + ["dec"+str(_+1) for _ in range(max_dec_len)] +
+                         ["acc" + str(_ + 1) for _ in range(max_acc_len)] +
+                         ["neutral" + str(_ + 1) for _ in range(max_neutral_len)]) + "\n"
+
+    @staticmethod
+    def runs_line(file_name, runs, longest_runs):
+        # the histograms are padded with zeros to the longest runs in the project
+        max_dec_len, max_acc_len, max_neutral_len = longest_runs
+        return table_text(array([file_name]), array([runs.dec_runs + [0] * (max_dec_len - len(runs.dec_runs)) +
+                                                     runs.acc_runs + [0] * (max_acc_len - len(runs.acc_runs)) +
+                                                     runs.neutral_runs + [0] * (max_neutral_len - len(runs.neutral_runs))],
+                                                    dtype=int))
+
+    def spectrum_method(self):
+        """
+        :return: the estimator of the band powers kept as the LS_spectrum results - "FFT" (see set_FFT_spectrum, the
+        cuts in Hz) or "LS" (Lomb-Scargle)
+        """
+        return "FFT" if self.LS_engine == "fft" else "LS"
+
+    @staticmethod
+    def LS_band_names(bands):
+        """
+        the names of the bands - the standard names of the standard bands, the cuts of the other bands
+        """
+        return [STANDARD_BANDS.get((low, high), str(low) + "-" + str(high)) for low, high in zip(bands[:-1], bands[1:])]
+
+    @staticmethod
+    def LS_spectrum_first_line(bands=(0, 0.003, 0.04, 0.15, 0.4), method="LS"):
+        """
+        the header of the spectrum file - the columns of the FFT band powers hold the method and the cuts in Hz, e.g.
+        "FFT LF 0.04-0.15 Hz"
+        """
+        names = Project.LS_band_names(bands)
+        if method == "FFT":
+            names = [" ".join(["FFT"] + ([STANDARD_BANDS[(low, high)]] if (low, high) in STANDARD_BANDS else []) +
+                              [str(low) + "-" + str(high), "Hz"]) for low, high in zip(bands[:-1], bands[1:])]
+        return "\t".join(["filename"] + names) + "\n"
+
+    @staticmethod
+    def LS_spectrum_line(file_name, band_powers):
+        return table_text(array([file_name]), array([band_powers], dtype=float))
+
+    def build_name(self, prefix="", extension=".csv"):
         import datetime
         import os
         """
         this function builds the name of the results file - the aim is to leave the existing results files_list
         """
-        current_name = self.path + "/" + prefix + "results"+str(datetime.date.today())+".csv"
+        current_name = self.path + "/" + prefix + "results"+str(datetime.date.today())+extension
         i = 1
         while (True):
             if os.path.exists(current_name):
-                current_name = self.path + "/" + prefix + "results" + str(datetime.date.today()) + "_" + str(i) + ".csv"
+                current_name = self.path + "/" + prefix + "results" + str(datetime.date.today()) + "_" + str(i) + extension
             else:
                 break
             i += 1
@@ -247,8 +965,17 @@ class Project:
         """
         this function looks for the longest run of a type WITHIN a PROJECT
         """
-        longest_dec_run = max([len(_[1]["runs"].dec_runs) for _ in self.project_results]) # _ is obviously dummy
-        longest_acc_run = max([len(_[1]["runs"].acc_runs) for _ in self.project_results])
-        longest_neutral_run = max([len(_[1]["runs"].neutral_runs) for _ in self.project_results])
-        return longest_dec_run, longest_acc_run, longest_neutral_run
+        if self.results_table.runs is None:
+            return 0, 0, 0
+        return tuple(self.results_table.runs[name].shape[1] for name in ResultsTable.runs_names)
 
+    @staticmethod
+    def longest_runs(all_runs):
+        """
+        this function looks for the longest run of a type in a list of Runs objects (or of any objects with the
+        dec_runs, acc_runs and neutral_runs histograms)
+        """
+        longest_dec_run = max([len(_.dec_runs) for _ in all_runs])
+        longest_acc_run = max([len(_.acc_runs) for _ in all_runs])
+        longest_neutral_run = max([len(_.neutral_runs) for _ in all_runs])
+        return longest_dec_run, longest_acc_run, longest_neutral_run
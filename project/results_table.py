@@ -0,0 +1,282 @@
+import re
+from fnmatch import translate
+from types import SimpleNamespace
+from numpy import array, asarray, zeros, full, nan, concatenate, flatnonzero, ones, argsort, nanmean, isnan
+
+
+class ResultsTable:
+    """
+    This class holds the results of a project in columns, one row per file:
+    filenames - array of the names of the files
+    Poincare - dictionary {descriptor: float array}, nan where a descriptor could not be calculated
+    runs - dictionary {"dec_runs": , "acc_runs": , "neutral_runs": } of 2-D int arrays - the histograms of the runs,
+    padded with zeros to the longest run in the project, runs_lengths holds the lengths of the histograms of each file
+    LS_spectrum - 2-D float array, the powers in the bands
+    A section is None if none of the files has it. Thanks to the columns the results of tens of thousands of files can be
+    filtered, sorted and summarised without visiting the results of each file.
+    The results of the files are appended one by one (append) - they are moved to the columns in blocks of
+    block_size files, or when the columns are used.
+    """
+    runs_names = ("dec_runs", "acc_runs", "neutral_runs")
+    sections = ("Poincare", "runs", "runs_lengths", "LS_spectrum")
+
+    def __init__(self, filenames=(), Poincare=None, runs=None, runs_lengths=None, LS_spectrum=None, block_size=1024):
+        self.columns = {"filenames": asarray(filenames, dtype=str), "Poincare": Poincare, "runs": runs,
+                        "runs_lengths": runs_lengths, "LS_spectrum": LS_spectrum}
+        self.block_size = block_size
+        self.pending = [] # the results appended since the columns were last built, [[filename, file_results], ...]
+
+    @classmethod
+    def from_results(cls, results):
+        """
+        :param results: list of [filename, file_results], file_results as returned by analyse_file
+        :return: the ResultsTable
+        """
+        table = cls()
+        for filename, file_results in results:
+            table.append(filename, file_results)
+        return table
+
+    def append(self, filename, file_results):
+        """
+        adds the results of a file
+        :param file_results: dictionary {"Poincare": , "runs": , "LS_spectrum": }, as returned by analyse_file
+        """
+        self.pending.append([filename, file_results])
+        if len(self.pending) >= self.block_size:
+            self.build_columns()
+
+    def build_columns(self):
+        """
+        moves the pending results to the columns
+        :return: the columns
+        """
+        if len(self.pending) > 0:
+            block = self.columns_from_results(self.pending)
+            self.pending = []
+            self.columns = block if len(self.columns["filenames"]) == 0 else self.concatenate_columns(self.columns,
+                                                                                                        block)
+        return self.columns
+
+    @property
+    def filenames(self):
+        return self.build_columns()["filenames"]
+
+    @property
+    def Poincare(self):
+        return self.build_columns()["Poincare"]
+
+    @property
+    def runs(self):
+        return self.build_columns()["runs"]
+
+    @property
+    def runs_lengths(self):
+        return self.build_columns()["runs_lengths"]
+
+    @property
+    def LS_spectrum(self):
+        return self.build_columns()["LS_spectrum"]
+
+    def __len__(self):
+        return len(self.columns["filenames"]) + len(self.pending)
+
+    @staticmethod
+    def columns_from_results(results):
+        """
+        builds the columns from a list of [filename, file_results]
+        """
+        file_results = [item[1] for item in results]
+        columns = {"filenames": array([item[0] for item in results], dtype=str), "Poincare": None, "runs": None,
+                   "runs_lengths": None, "LS_spectrum": None}
+        Poincare = [item["Poincare"] for item in file_results]
+        if any(descriptors is not None for descriptors in Poincare):
+            # the descriptors in the order in which they are kept by the Project
+            names = list(dict.fromkeys(name for descriptors in Poincare if descriptors is not None
+                                       for name in vars(descriptors)))
+            columns["Poincare"] = {name: array([nan if descriptors is None or getattr(descriptors, name, None) is None
+                                                else getattr(descriptors, name) for descriptors in Poincare],
+                                               dtype=float) for name in names}
+        runs = [item["runs"] for item in file_results]
+        if any(histograms is not None for histograms in runs):
+            columns["runs"], columns["runs_lengths"] = {}, {}
+            for name in ResultsTable.runs_names:
+                lengths = array([0 if histograms is None else len(getattr(histograms, name)) for histograms in runs],
+                                dtype=int)
+                padded = zeros((len(runs), lengths.max(initial=0)), dtype=int)
+                for row, histograms in enumerate(runs):
+                    if histograms is not None:
+                        padded[row, :lengths[row]] = getattr(histograms, name)
+                columns["runs"][name], columns["runs_lengths"][name] = padded, lengths
+        spectra = [item["LS_spectrum"] for item in file_results]
+        if any(band_powers is not None for band_powers in spectra):
+            bands = max(len(band_powers) for band_powers in spectra if band_powers is not None)
+            columns["LS_spectrum"] = full((len(spectra), bands), nan)
+            for row, band_powers in enumerate(spectra):
+                if band_powers is not None:
+                    columns["LS_spectrum"][row, :len(band_powers)] = band_powers
+        return columns
+
+    @staticmethod
+    def pad(matrix, width, value):
+        """
+        :return: the 2-D array widened to width columns with value
+        """
+        if matrix.shape[1] == width:
+            return matrix
+        padded = full((matrix.shape[0], width), value, dtype=matrix.dtype)
+        padded[:, :matrix.shape[1]] = matrix
+        return padded
+
+    @staticmethod
+    def concatenate_columns(first, second):
+        """
+        joins the columns of two sets of files - the sections missing from one of them are filled with nan (zeros for
+        the runs)
+        """
+        sizes = [len(first["filenames"]), len(second["filenames"])]
+        columns = {"filenames": concatenate((first["filenames"], second["filenames"]))}
+        parts = [first, second]
+        if first["Poincare"] is None and second["Poincare"] is None:
+            columns["Poincare"] = None
+        else:
+            names = list(dict.fromkeys(list(first["Poincare"] or {}) + list(second["Poincare"] or {})))
+            columns["Poincare"] = {name: concatenate([(part["Poincare"] or {}).get(name, full(size, nan))
+                                                      for part, size in zip(parts, sizes)]) for name in names}
+        if first["runs"] is None and second["runs"] is None:
+            columns["runs"], columns["runs_lengths"] = None, None
+        else:
+            columns["runs"], columns["runs_lengths"] = {}, {}
+            for name in ResultsTable.runs_names:
+                matrices = [zeros((size, 0), dtype=int) if part["runs"] is None else part["runs"][name]
+                            for part, size in zip(parts, sizes)]
+                width = max(matrix.shape[1] for matrix in matrices)
+                columns["runs"][name] = concatenate([ResultsTable.pad(matrix, width, 0) for matrix in matrices])
+                columns["runs_lengths"][name] = concatenate([zeros(size, dtype=int) if part["runs"] is None
+                                                             else part["runs_lengths"][name]
+                                                             for part, size in zip(parts, sizes)])
+        if first["LS_spectrum"] is None and second["LS_spectrum"] is None:
+            columns["LS_spectrum"] = None
+        else:
+            matrices = [full((size, 0), nan) if part["LS_spectrum"] is None else part["LS_spectrum"]
+                        for part, size in zip(parts, sizes)]
+            width = max(matrix.shape[1] for matrix in matrices)
+            columns["LS_spectrum"] = concatenate([ResultsTable.pad(matrix, width, nan) for matrix in matrices])
+        return columns
+
+    def select(self, rows):
+        """
+        :param rows: the indices of the files (or a boolean mask)
+        :return: a new ResultsTable with the selected files, in the order of rows
+        """
+        columns = self.build_columns()
+        rows = asarray(rows)
+        if rows.dtype == bool:
+            rows = flatnonzero(rows)
+        selected = {"filenames": columns["filenames"][rows]}
+        for section in self.sections:
+            if columns[section] is None:
+                selected[section] = None
+            elif section == "LS_spectrum":
+                selected[section] = columns[section][rows]
+            else:
+                selected[section] = {name: values[rows] for name, values in columns[section].items()}
+        if selected["runs"] is not None:
+            # the padding is trimmed to the longest runs of the selected files
+            for name in self.runs_names:
+                selected["runs"][name] = selected["runs"][name][:, :selected["runs_lengths"][name].max(initial=0)]
+        return ResultsTable(block_size=self.block_size, **selected)
+
+    def match(self, pattern):
+        """
+        :param pattern: the shell-style pattern of the filenames, e.g. "AVA*_night.rea"
+        :return: boolean array, True for the files matching the pattern
+        """
+        matches = re.compile(translate(pattern)).match
+        return array([matches(filename) is not None for filename in self.filenames.tolist()], dtype=bool)
+
+    def filter(self, pattern=None, mask=None):
+        """
+        selects the files matching the pattern and the condition, e.g. table.filter("AVA*", table.Poincare["SD1"] > 20)
+        :param pattern: the shell-style pattern of the filenames, None means all the files
+        :param mask: boolean array, one value per file, None means all the files
+        :return: a new ResultsTable
+        """
+        selected = ones(len(self), dtype=bool)
+        if pattern is not None:
+            selected &= self.match(pattern)
+        if mask is not None:
+            selected &= asarray(mask, dtype=bool)
+        return self.select(selected)
+
+    def column(self, name):
+        """
+        :param name: "filename", a Poincare descriptor or the number of a band of the LS spectrum
+        :return: the array with the values of all the files
+        """
+        if name == "filename":
+            return self.filenames
+        if isinstance(name, int):
+            return self.LS_spectrum[:, name]
+        return self.Poincare[name]
+
+    def sort(self, by="filename", descending=False):
+        """
+        :param by: the column, see column
+        :return: a new ResultsTable with the files sorted by the column (nan last), the order of equal values is kept
+        """
+        values = self.column(by)
+        if not descending:
+            return self.select(argsort(values, kind="stable"))
+        # the reversed column is sorted and the order reversed back, so that the equal values keep their order
+        order = len(values) - 1 - argsort(values[::-1], kind="stable")[::-1]
+        if values.dtype.kind == "f":
+            # nan is sorted last, so after the reversal it is first
+            missing = isnan(values[order])
+            order = concatenate([order[~missing], order[missing]])
+        return self.select(order)
+
+    def group_summary(self, patterns, statistic=nanmean):
+        """
+        summarises the groups of files - e.g. the recordings of each patient or each night
+        :param patterns: the shell-style patterns of the filenames, one per group (the groups may overlap)
+        :param statistic: the function calculating the statistic over the files, with the axis argument, nan should be
+        ignored
+        :return: dictionary {pattern: {"files": the number of the files, "Poincare": {descriptor: statistic},
+        "runs": {name: the sum of the histograms}, "LS_spectrum": the statistic of each band}}
+        """
+        summary = {}
+        for pattern in patterns:
+            group = self.filter(pattern)
+            group_summary = {"files": len(group), "Poincare": None, "runs": None, "LS_spectrum": None}
+            if len(group) > 0:
+                if group.Poincare is not None:
+                    group_summary["Poincare"] = {name: statistic(values, axis=0)
+                                                 for name, values in group.Poincare.items()}
+                if group.runs is not None:
+                    group_summary["runs"] = {name: values.sum(axis=0) for name, values in group.runs.items()}
+                if group.LS_spectrum is not None:
+                    group_summary["LS_spectrum"] = statistic(group.LS_spectrum, axis=0)
+            summary[pattern] = group_summary
+        return summary
+
+    def file_results(self, row):
+        """
+        the results of a single file in the form returned by analyse_file
+        """
+        columns = self.build_columns()
+        results = {"Poincare": None, "runs": None, "LS_spectrum": None}
+        if columns["Poincare"] is not None:
+            results["Poincare"] = SimpleNamespace(**{name: values[row] for name, values in columns["Poincare"].items()})
+        if columns["runs"] is not None:
+            results["runs"] = SimpleNamespace(**{name: columns["runs"][name][row, :columns["runs_lengths"][name][row]]
+                                                 .tolist() for name in self.runs_names})
+        if columns["LS_spectrum"] is not None:
+            results["LS_spectrum"] = columns["LS_spectrum"][row]
+        return results
+
+    def rows(self):
+        """
+        :return: list of [filename, file_results] - the results of each file in the form returned by analyse_file
+        """
+        return [[filename, self.file_results(row)] for row, filename in enumerate(self.filenames.tolist())]
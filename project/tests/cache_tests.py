@@ -0,0 +1,177 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+from numpy import memmap, shares_memory
+from project.cache import SignalCache, MemorySignalCache
+from project.project_class import Project
+from signal_properties.RRclasses import Signal
+
+
+class TestSignalCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        for file in ["firest.rea", "second.rea", "third.rea"]:
+            shutil.copy(os.getcwd() + "/test_files/" + file, self.temp_dir)
+        self.cache = SignalCache(self.temp_dir + "/.HRAcache")
+        self.columns = (1, 2, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_store_and_load(self):
+        path = self.temp_dir + "/firest.rea"
+        self.assertTrue(self.cache.load(path, self.columns) is None)
+        raw_data = Signal.read_data(path, *self.columns)
+        self.cache.store(path, self.columns, raw_data)
+        cached_data = self.cache.load(path, self.columns)
+        for array_read, array_cached in zip(raw_data, cached_data):
+            self.assertTrue(isinstance(array_cached, memmap))
+            self.assertTrue((array_read == array_cached).all())
+        # a different column configuration is a different entry
+        self.assertTrue(self.cache.load(path, (1, 1, 1)) is None)
+
+    def test_changed_file(self):
+        path = self.temp_dir + "/firest.rea"
+        self.cache.store(path, self.columns, Signal.read_data(path, *self.columns))
+        with open(path, 'a') as changed_file:
+            changed_file.write("1.0\t800.0\t0.0\t1.0\t1.0\t1.0\n")
+        self.assertTrue(self.cache.load(path, self.columns) is None)
+
+    def test_eviction(self):
+        paths = [self.temp_dir + "/" + file for file in ["firest.rea", "second.rea", "third.rea"]]
+        self.cache.store(paths[0], self.columns, Signal.read_data(paths[0], *self.columns))
+        entry_size = self.cache.size()
+        self.cache.max_size = 2 * entry_size
+        self.cache.store(paths[1], self.columns, Signal.read_data(paths[1], *self.columns))
+        os.utime(self.cache.entries()[0][2], (0, 0))  # the first file is the least recently used one
+        self.cache.load(paths[0], self.columns)  # ... but not any more
+        self.cache.store(paths[2], self.columns, Signal.read_data(paths[2], *self.columns))
+        self.assertTrue(self.cache.size() <= 2 * entry_size)
+        self.assertFalse(self.cache.load(paths[0], self.columns) is None)
+        self.assertTrue(self.cache.load(paths[1], self.columns) is None)
+
+    def test_index(self):
+        paths = [self.temp_dir + "/" + file for file in ["firest.rea", "second.rea", "third.rea"]]
+        cache = SignalCache.shared(self.temp_dir + "/.HRAcache")
+        self.assertTrue(SignalCache.shared(self.temp_dir + "/.HRAcache") is cache)
+        cache.store(paths[0], self.columns, Signal.read_data(paths[0], *self.columns))
+        # once the index has been read, storing and evicting do not visit the entries on the drive
+        with mock.patch.object(cache, "entries", side_effect=AssertionError("the entries read again")):
+            for path in paths:
+                cache.store(path, self.columns, Signal.read_data(path, *self.columns))
+            self.assertEqual(len(cache.index), 3)
+            cache.max_size = cache.index_size - 1
+            cache.evict()
+            cache.invalidate(paths[2])
+        self.assertEqual(sorted(cache.index), sorted(entry[2] for entry in cache.entries()))
+        self.assertEqual(len(cache.index), 1)
+        self.assertEqual(cache.index_size, cache.size())
+
+    def test_invalidate(self):
+        path = self.temp_dir + "/firest.rea"
+        self.cache.store(path, self.columns, Signal.read_data(path, *self.columns))
+        self.cache.invalidate(path)
+        self.assertTrue(self.cache.load(path, self.columns) is None)
+        self.assertTrue(self.cache.size() == 0)
+
+    def test_project_with_cache(self):
+        results = []
+        for run in range(2):
+            test_project = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                                   column_sample_to_sample=1)
+            test_project.set_cache()
+            test_project.set_Poincare()
+            test_project.set_runs()
+            test_project.step_through_project_files()
+            results.append(sorted([file_result[0], file_result[1]["Poincare"].SD1, file_result[1]["runs"].dec_runs]
+                                  for file_result in test_project.project_results))
+        self.assertEqual(len(test_project.cache.entries()), 3)
+        self.assertEqual(results[0], results[1])
+        test_project.invalidate_cache()
+        self.assertEqual(test_project.cache.size(), 0)
+
+
+class TestMemorySignalCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        for file in ["firest.rea", "second.rea", "third.rea"]:
+            shutil.copy(os.getcwd() + "/test_files/" + file, self.temp_dir)
+        self.paths = [self.temp_dir + "/" + file for file in ["firest.rea", "second.rea", "third.rea"]]
+        self.columns = (1, 2, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_store_and_load(self):
+        cache = MemorySignalCache()
+        self.assertTrue(cache.load(self.paths[0], self.columns) is None)
+        raw_data = Signal.read_data(self.paths[0], *self.columns)
+        cache.store(self.paths[0], self.columns, raw_data)
+        cached_data = cache.load(self.paths[0], self.columns)
+        # the cache keeps read-only views of the arrays, without copying them or changing the arrays of the caller
+        for array_read, array_cached in zip(raw_data, cached_data):
+            self.assertTrue(shares_memory(array_cached, array_read))
+        self.assertFalse(cached_data[1].flags.writeable)
+        self.assertTrue(raw_data[1].flags.writeable)
+        self.assertTrue(cache.load(self.paths[0], (1, 1, 1)) is None)
+        self.assertEqual(cache.statistics(), {"hits": 1, "misses": 2, "files": 1,
+                                              "size": sum(array_read.nbytes for array_read in raw_data),
+                                              "max_size": 256 * 1024**2})
+        # the filters mark the bad beats in a copy of the annotation
+        signal = Signal(path_to_file=list(cached_data), annotation_filter=(1, 2, 3), square_filter=(300, 1500))
+        self.assertTrue((cache.load(self.paths[0], self.columns)[1] == raw_data[1]).all())
+        self.assertTrue(len(signal.signal) > 0)
+        with open(self.paths[0], 'a') as changed_file:
+            changed_file.write("1.0\t800.0\t0.0\t1.0\t1.0\t1.0\n")
+        self.assertTrue(cache.load(self.paths[0], self.columns) is None)
+
+    def test_eviction(self):
+        raw_data = [Signal.read_data(path, *self.columns) for path in self.paths]
+        sizes = [MemorySignalCache.arrays_size(arrays) for arrays in raw_data]
+        cache = MemorySignalCache(max_size=sizes[0] + sizes[1])
+        cache.store(self.paths[0], self.columns, raw_data[0])
+        cache.store(self.paths[1], self.columns, raw_data[1])
+        cache.load(self.paths[0], self.columns) # the second file is the least recently used one now
+        cache.store(self.paths[2], self.columns, raw_data[2])
+        self.assertTrue(cache.size <= cache.max_size)
+        self.assertTrue(cache.load(self.paths[1], self.columns) is None)
+        self.assertFalse(cache.load(self.paths[0], self.columns) is None)
+        cache.invalidate()
+        self.assertEqual([cache.size, len(cache.entries)], [0, 0])
+        # a recording larger than the whole cache is not kept
+        cache.max_size = sizes[0] - 1
+        cache.store(self.paths[0], self.columns, raw_data[0])
+        self.assertEqual(len(cache.entries), 0)
+
+    def test_project_filters(self):
+        test_project = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                               column_sample_to_sample=1)
+        test_project.set_memory_cache()
+        test_project.set_Poincare()
+        test_project.set_runs()
+        test_project.step_through_project_files()
+        self.assertEqual(test_project.memory_cache.statistics()["misses"], 3)
+        # only the filters change - the files are not read again
+        for prefetch, annotation_filter in [[0, (1,)], [2, (1, 2, 3)]]:
+            test_project.set_filters(annotation_filter=annotation_filter, square_filter=(300, 1500))
+            test_project.step_through_project_files(prefetch=prefetch)
+        self.assertEqual(test_project.memory_cache.statistics()["hits"], 6)
+        self.assertEqual(len(test_project.project_results), 3)
+        self.assertEqual(test_project.memory_cache.statistics()["misses"], 3)
+        reference = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                            column_sample_to_sample=1)
+        reference.set_filters(annotation_filter=(1, 2, 3), square_filter=(300, 1500))
+        reference.set_Poincare()
+        reference.set_runs()
+        reference.step_through_project_files()
+        for cached, read in zip(test_project.project_results, reference.project_results):
+            self.assertEqual(cached[0], read[0])
+            self.assertEqual(cached[1]["Poincare"].SD1, read[1]["Poincare"].SD1)
+            self.assertEqual(cached[1]["runs"].dec_runs, read[1]["runs"].dec_runs)
+        test_project.invalidate_cache()
+        self.assertEqual(test_project.memory_cache.statistics()["files"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
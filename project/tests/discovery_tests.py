@@ -0,0 +1,68 @@
+import unittest
+import os
+import shutil
+import tempfile
+from project.discovery import FileIndex
+from project.project_class import Project
+
+
+class TestFileIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.files = ["site1/subject2/day1/b.rea", "site1/subject2/day1/a.rea", "site1/subject1/day2/c.rea",
+                      "site2/subject1/day1/d.rea", "top.rea"]
+        for file in self.files + ["site1/subject1/day2/notes.txt", ".HRAcache/hidden.rea"]:
+            os.makedirs(os.path.dirname(os.path.join(self.temp_dir, file)), exist_ok=True)
+            shutil.copy(os.getcwd() + "/test_files/firest.rea", os.path.join(self.temp_dir, file))
+        self.age_directories()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def age_directories(self):
+        # the directories modified a moment ago are not trusted by the index
+        for directory, subdirectories, files in os.walk(self.temp_dir):
+            os.utime(directory, (1000000000, 1000000000))
+
+    def test_recursive_scan(self):
+        index = FileIndex(self.temp_dir)
+        self.assertEqual(index.scan(".rea", recursive=True), sorted(self.files))
+        self.assertEqual(index.scan(".rea"), ["top.rea"])
+        self.assertEqual(index.scan(".rea", recursive=True, include=["site1/*"]),
+                         ["site1/subject1/day2/c.rea", "site1/subject2/day1/a.rea", "site1/subject2/day1/b.rea"])
+        self.assertEqual(index.scan(".rea", recursive=True, exclude=["site1/subject2", "*/d.rea"]),
+                         ["site1/subject1/day2/c.rea", "top.rea"])
+
+    def test_index(self):
+        FileIndex(self.temp_dir).scan(".rea", recursive=True)
+        self.assertTrue(os.path.exists(self.temp_dir + "/.HRAindex"))
+        # creating the index has changed the main directory - as if it had been created long ago
+        self.age_directories()
+        index = FileIndex(self.temp_dir)
+        self.assertEqual(index.scan(".rea", recursive=True), sorted(self.files))
+        self.assertEqual(index.rescanned, [])
+        self.assertEqual(index.directories["site1/subject2/day1"]["files"]["a.rea"][0],
+                         os.path.getsize(os.getcwd() + "/test_files/firest.rea"))
+        # a new file changes only its own directory
+        shutil.copy(os.getcwd() + "/test_files/firest.rea", self.temp_dir + "/site2/subject1/day1/e.rea")
+        os.utime(self.temp_dir + "/site2/subject1/day1", (1000000100, 1000000100))
+        index = FileIndex(self.temp_dir)
+        self.assertTrue("site2/subject1/day1/e.rea" in index.scan(".rea", recursive=True))
+        self.assertEqual(index.rescanned, ["site2/subject1/day1"])
+
+    def test_recursive_project(self):
+        test_project = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                               column_sample_to_sample=1, recursive=True, exclude=["site2/*"])
+        self.assertEqual(test_project.files_list, sorted(self.files[:3]) + ["top.rea"])
+        test_project.set_Poincare()
+        test_project.step_through_project_files()
+        self.assertEqual([file_result[0] for file_result in test_project.project_results], test_project.files_list)
+        self.assertTrue(test_project.write_state())
+        reopened = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                           column_sample_to_sample=1)
+        self.assertEqual(reopened.files_list, ["top.rea"])
+        self.assertTrue(reopened.read_state())
+        self.assertEqual(reopened.files_list, test_project.files_list)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import contextlib
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+from project.project_class import Project
+from project.export import read_npz
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        for file in ["firest.rea", "second.rea", "third.rea"]:
+            shutil.copy(os.getcwd() + "/test_files/" + file, self.temp_dir)
+        self.project = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                               column_sample_to_sample=1)
+        self.project.files_list = sorted(self.project.files_list)
+        self.project.set_Poincare()
+        self.project.set_runs()
+        self.project.set_LS_spectrum(engine="fast")
+        self.project.step_through_project_files()
+        self.table = self.project.results_table
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_tsv(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            runs_file = self.project.dump_runs()
+        self.assertEqual(output.getvalue(), "")
+        with open(runs_file) as runs:
+            lines = runs.read().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[1].split("\t")[0], "firest.rea")
+        self.assertEqual(len(lines[0].split("\t")), len(lines[1].split("\t")))
+        self.assertEqual([int(count) for count in lines[1].split("\t")[1:len(self.table.runs["dec_runs"][0]) + 1]],
+                         self.table.runs["dec_runs"][0].tolist())
+        with open(self.project.dump_LS_spectrum()) as spectrum:
+            lines = spectrum.read().splitlines()
+        self.assertEqual(lines[0], "filename\tULF\tVLF\tLF\tHF")
+        self.assertEqual(lines[2].split("\t")[0], "second.rea")
+        self.assertEqual([float(power) for power in lines[2].split("\t")[1:]], self.table.LS_spectrum[1].tolist())
+
+    def test_npz(self):
+        table = read_npz(self.project.dump_npz())
+        self.assertEqual(table.filenames.tolist(), self.table.filenames.tolist())
+        self.assertEqual(list(table.Poincare), self.project.Poincare_descriptors)
+        self.assertTrue((table.Poincare["SD1"] == self.table.Poincare["SD1"]).all())
+        self.assertTrue((table.runs["acc_runs"] == self.table.runs["acc_runs"]).all())
+        self.assertTrue((table.LS_spectrum == self.table.LS_spectrum).all())
+        self.assertEqual(table.rows()[2][1]["runs"].neutral_runs, self.project.project_results[2][1]["runs"].neutral_runs)
+
+    def test_sqlite(self):
+        database = self.project.dump_sqlite()
+        # writing again replaces the tables
+        self.project.dump_sqlite(database)
+        with contextlib.closing(sqlite3.connect(database)) as connection:
+            SD1 = connection.execute("SELECT SD1 FROM Poincare WHERE filename = 'third.rea'").fetchall()
+            self.assertEqual(SD1, [(self.table.Poincare["SD1"][2],)])
+            dec_runs = connection.execute("SELECT count FROM runs WHERE filename = 'firest.rea' AND type = 'dec' "
+                                          "ORDER BY length").fetchall()
+            self.assertEqual([count for count, in dec_runs],
+                             self.table.runs["dec_runs"][0, :self.table.runs_lengths["dec_runs"][0]].tolist())
+            HF = connection.execute("SELECT power FROM LS_spectrum WHERE band = 'HF' ORDER BY filename").fetchall()
+            self.assertEqual([power for power, in HF], self.table.LS_spectrum[:, 3].tolist())
+            indices = connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+            self.assertEqual(len(indices), 3)
+
+if __name__ == '__main__':
+    unittest.main()
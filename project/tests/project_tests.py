@@ -1,6 +1,15 @@
 import unittest
+import contextlib
+import sqlite3
+import numpy
 import os
-from project.project_class import Project
+import shutil
+import tempfile
+import asyncio
+from unittest import mock
+from project.project_class import Project, read_file_safely
+from signal_properties.timing import StageTimer
+from signal_properties.my_exceptions import MissingResults
 
 class TestProject(unittest.TestCase):
     def setUp(self):
@@ -84,5 +93,247 @@ class TestProject(unittest.TestCase):
         self.assertTrue(os.path.exists(local_path))
         os.remove(local_path)
 
+
+class TestProjectModes(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        for file in ["firest.rea", "second.rea", "third.rea"]:
+            shutil.copy(os.getcwd() + "/test_files/" + file, self.temp_dir)
+        with open(self.temp_dir + "/broken.rea", 'w') as broken_file:
+            broken_file.write("time[min]\trri[ms]\n0.1\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_project(self, workers, prefetch=0):
+        test_project = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                               column_sample_to_sample=1)
+        test_project.files_list = sorted(test_project.files_list)
+        test_project.set_Poincare()
+        test_project.set_runs()
+        test_project.step_through_project_files(workers=workers, prefetch=prefetch)
+        return test_project
+
+    def test_parallel_results(self):
+        serial_project = self.run_project(workers=1)
+        parallel_project = self.run_project(workers=2)
+        self.assertEqual([file_result[0] for file_result in parallel_project.project_results],
+                         ['firest.rea', 'second.rea', 'third.rea'])
+        for serial_result, parallel_result in zip(serial_project.project_results, parallel_project.project_results):
+            self.assertEqual(vars(serial_result[1]["Poincare"]), vars(parallel_result[1]["Poincare"]))
+            self.assertEqual(serial_result[1]["runs"].dec_runs, parallel_result[1]["runs"].dec_runs)
+
+    def test_failed_file(self):
+        parallel_project = self.run_project(workers=2)
+        self.assertEqual(len(parallel_project.project_results), 3)
+        self.assertEqual([failed[0] for failed in parallel_project.failed_files], ['broken.rea'])
+
+    def test_streaming(self):
+        test_project = self.run_project(workers=1)
+        test_project.dump_Poincare()
+        test_project.dump_runs()
+        dumped = {"Poincare": test_project.build_name(prefix="Poincare_"),
+                  "runs": test_project.build_name(prefix="runs_")}
+        streaming_project = self.run_project(workers=2)
+        streaming_project.project_results = []
+        streaming_project.step_through_project_files(workers=2, streaming=True)
+        self.assertEqual(streaming_project.project_results, [])
+        self.assertEqual(sorted(streaming_project.results_files.keys()), ["Poincare", "runs"])
+        for method in ["Poincare", "runs"]:
+            self.assertEqual(streaming_project.results_files[method], dumped[method])
+            # the files dumped from the stored results are the first ones, i.e. without _1 in the name
+            with open(dumped[method].replace("_1.csv", ".csv")) as dumped_file:
+                with open(streaming_project.results_files[method]) as streamed_file:
+                    self.assertEqual(dumped_file.read(), streamed_file.read())
+
+    def test_instrumentation(self):
+        records, progress = [], []
+        test_project = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                               column_sample_to_sample=1)
+        test_project.set_Poincare()
+        test_project.set_runs()
+        test_project.set_instrumentation(stage_callbacks=[records.append],
+                                         progress_callbacks=[lambda *arguments: progress.append(arguments)],
+                                         measure_memory=True)
+        test_project.step_through_project_files(workers=2)
+        self.assertEqual(len(progress), 4)
+        self.assertEqual([done for file, done, total in progress], [1, 2, 3, 4])
+        # the broken file fails in the parsing, so only the good files have records
+        self.assertEqual(sorted(set(record["file"] for record in records)), ['firest.rea', 'second.rea', 'third.rea'])
+        self.assertEqual(sorted(set(record["stage"] for record in records)),
+                         ["Poincare", "filtering", "parsing", "runs"])
+        self.assertTrue(all(record["allocated_bytes"] >= 0 for record in records))
+        summary = {stage[0]: stage for stage in test_project.timer.summary()}
+        self.assertEqual(summary["Poincare"][1], 3)
+        self.assertTrue(summary["parsing"][2] > 0)
+        timings_file = test_project.dump_timings()
+        with open(timings_file) as timings:
+            self.assertEqual(len(timings.readlines()), 5)
+        # the instrumentation does not change the results
+        self.assertEqual(sorted(vars(file_result[1]["Poincare"])["SD1"] for file_result in test_project.project_results),
+                         sorted(vars(file_result[1]["Poincare"])["SD1"]
+                                for file_result in self.run_project(workers=1).project_results))
+        # without a timer every stage gets its own, empty record
+        with StageTimer.timed(None, "parsing") as record:
+            record["beats"] = 100
+        with StageTimer.timed(None, "parsing") as record:
+            self.assertEqual(record, {})
+
+    def test_no_results(self):
+        test_project = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                               column_sample_to_sample=1)
+        test_project.files_list = ["broken.rea"]
+        test_project.set_Poincare()
+        test_project.set_runs()
+        test_project.set_LS_spectrum()
+        test_project.step_through_project_files()
+        # all the files failed - only the headers are written
+        for results_file in [test_project.dump_Poincare(), test_project.dump_runs(), test_project.dump_LS_spectrum()]:
+            with open(results_file) as results:
+                self.assertEqual(len(results.readlines()), 1)
+            os.remove(results_file)
+        # the results of an analysis which has not been switched on cannot be written
+        test_project = self.run_project(workers=1)
+        spectrum_file = test_project.build_name(prefix="LS_spectrum_")
+        self.assertRaises(MissingResults, test_project.dump_LS_spectrum)
+        self.assertFalse(os.path.exists(spectrum_file))
+
+    def test_Poincare_descriptors(self):
+        test_project = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                               column_sample_to_sample=1)
+        test_project.set_Poincare(descriptors=["SDNN", "SD1", "SD2"])
+        test_project.step_through_project_files()
+        all_descriptors = {file_result[0]: file_result[1]["Poincare"]
+                           for file_result in self.run_project(workers=1).project_results}
+        for file, results in test_project.project_results:
+            self.assertEqual(sorted(vars(results["Poincare"])), ["SD1", "SD2", "SDNN"])
+            for name in ["SDNN", "SD1", "SD2"]:
+                self.assertEqual(getattr(results["Poincare"], name), getattr(all_descriptors[file], name))
+        test_project.dump_Poincare()
+        with open(test_project.build_name(prefix="Poincare_").replace("_1.csv", ".csv")) as results_file:
+            self.assertEqual(results_file.readline(), "filename\tSDNN\tSD1\tSD2\n")
+
+    def test_pipeline(self):
+        serial_project = self.run_project(workers=1)
+        for workers in [1, 2]:
+            pipeline_project = self.run_project(workers=workers, prefetch=2)
+            self.assertEqual([failed[0] for failed in pipeline_project.failed_files], ['broken.rea'])
+            self.assertEqual(len(pipeline_project.project_results), 3)
+            self.assertEqual(len(pipeline_project.manifest), 3)
+            for serial_result, pipeline_result in zip(serial_project.project_results,
+                                                      pipeline_project.project_results):
+                self.assertEqual(serial_result[0], pipeline_result[0])
+                self.assertEqual(vars(serial_result[1]["Poincare"]), vars(pipeline_result[1]["Poincare"]))
+
+    def test_pipeline_async_iterator(self):
+        test_project = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                               column_sample_to_sample=1)
+        test_project.files_list = sorted(test_project.files_list)
+        test_project.set_runs()
+        read_files = []
+
+        def recording_read(path_to_file, settings, memory_cache=None):
+            read_files.append(path_to_file)
+            return read_file_safely(path_to_file, settings, memory_cache)
+
+        async def first_result():
+            analysed_files = test_project.analyse_files_async(prefetch=1)
+            file, (file_results, error) = await analysed_files.__anext__()
+            await asyncio.sleep(0.2)
+            await analysed_files.aclose()
+            return file
+
+        with mock.patch("project.project_class.read_file_safely", recording_read):
+            self.assertEqual(asyncio.run(first_result()), 'broken.rea')
+        # one file analysed, one waiting for the analysis and one in the queue - the reading stops there
+        self.assertTrue(len(read_files) <= 3)
+
+    def test_FFT_spectrum(self):
+        test_project = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                               column_sample_to_sample=1)
+        test_project.files_list = sorted(test_project.files_list)
+        test_project.set_FFT_spectrum(segment=120)
+        test_project.step_through_project_files(workers=2)
+        # only the broken file fails, the spectrum itself does not
+        self.assertEqual([failed[0] for failed in test_project.failed_files], ['broken.rea'])
+        self.assertEqual(len(test_project.project_results), 3)
+        self.assertEqual(test_project.results_table.LS_spectrum.shape, (3, 4))
+        self.assertTrue((test_project.results_table.LS_spectrum >= 0).all())
+        # the FFT band powers are not written as the Lomb-Scargle ones
+        spectrum_file = test_project.dump_LS_spectrum()
+        self.assertTrue(os.path.basename(spectrum_file).startswith("FFT_spectrum_"))
+        with open(spectrum_file) as spectrum:
+            self.assertEqual(spectrum.readline(), "filename\tFFT ULF 0-0.003 Hz\tFFT VLF 0.003-0.04 Hz\t"
+                                                  "FFT LF 0.04-0.15 Hz\tFFT HF 0.15-0.4 Hz\n")
+        with numpy.load(test_project.dump_npz()) as archive:
+            self.assertEqual(str(archive["spectrum_method"]), "FFT")
+            self.assertEqual(archive["LS_bands"].tolist(), test_project.LS_bands)
+        with contextlib.closing(sqlite3.connect(test_project.dump_sqlite())) as connection:
+            self.assertEqual(connection.execute("SELECT name FROM sqlite_master WHERE name LIKE '%spectrum'").fetchall(),
+                             [("FFT_spectrum",)])
+            self.assertEqual(connection.execute("SELECT low, high FROM FFT_spectrum WHERE band = 'LF'").fetchall(),
+                             [(0.04, 0.15)] * 3)
+        self.assertTrue(test_project.write_state())
+        # the FFT settings are a part of the settings of the files in the manifest
+        test_project.set_FFT_spectrum(segment=60)
+        self.assertEqual(len(test_project.outdated_files(test_project.manifest_settings())), 4)
+        reopened = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                           column_sample_to_sample=1)
+        self.assertTrue(reopened.read_state())
+        self.assertEqual(reopened.LS_engine, "fft")
+        self.assertEqual(reopened.FFT_settings["segment"], 120)
+
+    def test_manifest_not_persisted(self):
+        # the files are not fingerprinted and their results are not kept until the state is written
+        with mock.patch.object(Project, "fingerprint", side_effect=AssertionError):
+            test_project = self.run_project(workers=1)
+            test_project.stream_project_files()
+        self.assertEqual(len(test_project.manifest), 3)
+        for entry in test_project.manifest.values():
+            self.assertIsNone(entry["fingerprint"])
+            self.assertNotIn("results", entry)
+        # the streaming mode keeps no results, so there is nothing to write
+        self.assertTrue(test_project.write_state())
+        self.assertEqual(test_project.manifest, {})
+        test_project.step_through_project_files()
+        self.assertTrue(test_project.write_state())
+        self.assertEqual(len(test_project.manifest), 3)
+        for entry in test_project.manifest.values():
+            self.assertIsNotNone(entry["fingerprint"])
+            self.assertIn("results", entry)
+
+    def test_incremental_analysis(self):
+        test_project = self.run_project(workers=1)
+        self.assertTrue(test_project.write_state())
+        # the results of firest.rea are marked, so that we know if they are taken from the manifest
+        test_project.manifest['firest.rea']['results']['Poincare']['SD1'] = -1.0
+        self.assertTrue(test_project.write_state())
+        shutil.copy(self.temp_dir + "/second.rea", self.temp_dir + "/fourth.rea")
+        os.utime(self.temp_dir + "/third.rea", (0, 0)) # touched, but not changed
+        with open(self.temp_dir + "/second.rea", 'a') as changed_file:
+            changed_file.write("1.0\t800.0\t0.0\t1.0\t1.0\t1.0\n")
+
+        def rerun_project():
+            rerun = Project(path=self.temp_dir, file_extension=".rea", column_signal=0, column_annot=0,
+                            column_sample_to_sample=0)
+            rerun.files_list = sorted(rerun.files_list)
+            self.assertTrue(rerun.read_state())
+            rerun.step_through_project_files()
+            return rerun, {file_result[0]: file_result[1] for file_result in rerun.project_results}
+
+        rerun, results = rerun_project()
+        self.assertEqual(rerun.column_signal, 1)
+        self.assertEqual(sorted(results.keys()), ['firest.rea', 'fourth.rea', 'second.rea', 'third.rea'])
+        self.assertEqual(results['firest.rea']["Poincare"].SD1, -1.0)
+        self.assertEqual(vars(results['third.rea']["Poincare"]), vars(test_project.project_results[2][1]["Poincare"]))
+        self.assertEqual(vars(results['fourth.rea']["Poincare"]), vars(test_project.project_results[1][1]["Poincare"]))
+        self.assertNotEqual(results['second.rea']["Poincare"].SD1, test_project.project_results[1][1]["Poincare"].SD1)
+        # different settings - all the files are analysed again
+        rerun.write_state()
+        rerun.set_filters(square_filter=(300, 2000))
+        rerun.write_state()
+        rerun, results = rerun_project()
+        self.assertNotEqual(results['firest.rea']["Poincare"].SD1, -1.0)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,80 @@
+import unittest
+import os
+import shutil
+import tempfile
+from numpy import isnan
+from project.project_class import Project
+from project.results_table import ResultsTable
+
+
+class TestResultsTable(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        for file in ["firest.rea", "second.rea", "third.rea"]:
+            shutil.copy(os.getcwd() + "/test_files/" + file, self.temp_dir)
+        shutil.copy(os.getcwd() + "/test_files/second.rea", self.temp_dir + "/night_second.rea")
+        self.project = Project(path=self.temp_dir, file_extension=".rea", column_signal=1, column_annot=2,
+                               column_sample_to_sample=1)
+        self.project.files_list = sorted(self.project.files_list)
+        self.project.set_Poincare()
+        self.project.set_runs()
+        self.project.set_LS_spectrum(engine="fast")
+        self.project.step_through_project_files()
+        self.table = self.project.results_table
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_columns(self):
+        self.assertEqual(self.table.filenames.tolist(), ['firest.rea', 'night_second.rea', 'second.rea', 'third.rea'])
+        self.assertEqual(list(self.table.Poincare.keys()), self.project.Poincare_descriptors)
+        self.assertEqual(self.table.Poincare["SD1"].shape, (4,))
+        self.assertEqual(self.table.LS_spectrum.shape, (4, 4))
+        for name in ResultsTable.runs_names:
+            self.assertEqual(self.table.runs[name].shape, (4, self.table.runs_lengths[name].max()))
+
+    def test_blocks(self):
+        # the results appended in small blocks give the same columns
+        rows = self.project.project_results
+        blocks = ResultsTable(block_size=3)
+        for file, file_results in rows:
+            blocks.append(file, file_results)
+        self.assertEqual(blocks.rows()[3][1]["runs"].dec_runs, rows[3][1]["runs"].dec_runs)
+        for name in ResultsTable.runs_names:
+            self.assertTrue((blocks.runs[name] == self.table.runs[name]).all())
+        self.assertTrue((blocks.Poincare["SD2"] == self.table.Poincare["SD2"]).all())
+
+    def test_filter_and_sort(self):
+        second = self.table.filter("*second*")
+        self.assertEqual(second.filenames.tolist(), ['night_second.rea', 'second.rea'])
+        self.assertEqual(second.Poincare["SD1"][0], second.Poincare["SD1"][1])
+        low = self.table.filter(mask=self.table.Poincare["SD1"] < self.table.Poincare["SD1"].max())
+        self.assertEqual(len(low), 4 - (self.table.Poincare["SD1"] == self.table.Poincare["SD1"].max()).sum())
+        by_SD1 = self.table.sort("SD1", descending=True)
+        self.assertTrue((by_SD1.Poincare["SD1"][:-1] >= by_SD1.Poincare["SD1"][1:]).all())
+        self.assertEqual(self.table.sort(3).filenames.shape, (4,))
+        # the files without the Poincare descriptors are last, the equal values keep their order
+        table = ResultsTable.from_results([["first", {"Poincare": None, "runs": None, "LS_spectrum": None}]]
+                                          + self.table.rows())
+        by_SD1 = table.sort("SD1", descending=True)
+        self.assertEqual(by_SD1.filenames[-1], "first")
+        filenames = by_SD1.filenames.tolist()
+        self.assertLess(filenames.index("night_second.rea"), filenames.index("second.rea"))
+
+    def test_group_summary(self):
+        summary = self.table.group_summary(["*second*", "third*", "nothing*"])
+        self.assertEqual(summary["*second*"]["files"], 2)
+        self.assertAlmostEqual(summary["*second*"]["Poincare"]["SDNN"], self.table.filter("second*").Poincare["SDNN"][0])
+        self.assertEqual(summary["third*"]["runs"]["dec_runs"].tolist(),
+                         self.table.filter("third*").runs["dec_runs"][0].tolist())
+        self.assertEqual(summary["nothing*"]["files"], 0)
+
+    def test_missing_sections(self):
+        table = ResultsTable.from_results([["first", {"Poincare": None, "runs": None, "LS_spectrum": None}]])
+        self.assertTrue(table.Poincare is None and table.runs is None and table.LS_spectrum is None)
+        table.append("second", self.project.project_results[0][1])
+        self.assertTrue(isnan(table.Poincare["SD1"][0]))
+        self.assertEqual(table.runs["dec_runs"][0].sum(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
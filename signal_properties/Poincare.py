@@ -1,18 +1,49 @@
-from numpy import concatenate, delete
-from scipy import mean, var, sqrt, where
+from functools import cached_property
+from numpy import array, concatenate, asarray, zeros, sign, errstate, cumsum, maximum, \
+    nan_to_num, mean, var, sqrt
+from signal_properties.my_exceptions import WrongDescriptor
+from signal_properties.windows import beat_windows, time_windows
 
 
 class Poincare:
-    def __init__(self, signal):
-        # signal is object of Signal class
+    # all the descriptors, each of them is calculated on its first use and then kept - the asymmetry descriptors are
+    # calculated in groups (see short_term, long_term, total), so a group is calculated only if one of its descriptors
+    # is used
+    descriptors = ("SD1", "SD2", "SDNN", "SD1d", "C1d", "SD1a", "C1a", "SD1I", "SD2d", "C2d", "SD2a", "C2a", "SD2I",
+                   "SDNNd", "Cd", "SDNNa", "Ca")
+
+    def __init__(self, signal, descriptors=None):
+        """
+        :param signal: object of Signal class
+        :param descriptors: the descriptors calculated right away, e.g. ["SDNN", "SD1", "SD2"] - None means "none of
+        them", any descriptor is calculated anyway when it is used
+        """
         self.xi, self.xii = self.prepare_PP(signal)
         # descriptors will be capital, functions lower case
-        self.SD1 = self.sd1()
-        self.SD2 = self.sd2()
-        self.SDNN = self.sdnn()
-        self.SD1d, self.C1d, self.SD1a, self.C1a, self.SD1I = self.short_term_asymmetry()
-        self.SD2d, self.C2d, self.SD2a, self.C2a, self.SD2I = self.long_term_asymmetry()
-        self.SDNNd, self.Cd, self.SDNNa, self.Ca = self.total_asymmetry()
+        for name in self.check_descriptors(descriptors):
+            getattr(self, name)
+
+    @classmethod
+    def check_descriptors(cls, descriptors):
+        """
+        :return: the list of the descriptors, [] for None
+        :raises WrongDescriptor: if any of them is not a Poincare plot descriptor
+        """
+        descriptors = [] if descriptors is None else list(descriptors)
+        unknown = [name for name in descriptors if name not in cls.descriptors]
+        if len(unknown) > 0:
+            raise WrongDescriptor(", ".join(map(str, unknown)))
+        return descriptors
+
+    SD1 = cached_property(lambda self: self.sd1())
+    SD2 = cached_property(lambda self: self.sd2())
+    SDNN = cached_property(lambda self: self.sdnn())
+    short_term = cached_property(lambda self: self.short_term_asymmetry())
+    long_term = cached_property(lambda self: self.long_term_asymmetry())
+    total = cached_property(lambda self: self.total_asymmetry())
+    SD1d, C1d, SD1a, C1a, SD1I = (cached_property(lambda self, i=i: self.short_term[i]) for i in range(5))
+    SD2d, C2d, SD2a, C2a, SD2I = (cached_property(lambda self, i=i: self.long_term[i]) for i in range(5))
+    SDNNd, Cd, SDNNa, Ca = (cached_property(lambda self, i=i: self.total[i]) for i in range(4))
 
     def prepare_PP(self, signal):
         """
@@ -24,26 +55,46 @@ class Poincare:
         # the signal has already been filtered in the constructor of the Signal class - i.e. all places which should
         # be removed were marked in signal.annotation as 16
 
-        # preparing the Poincare plot auxiliary vectors (see Filtering Poincare Plots)
-        xi = signal.signal[0:(len(signal.signal)-1)]
-        xii = signal.signal[1:len(signal.signal)]
-
-        bad_beats = where(signal.annotation == 16)[0]
-        bad_beats_minus_one = bad_beats - 1
-        all_bad_beats = concatenate((bad_beats, bad_beats_minus_one))
+        # preparing the Poincare plot auxiliary vectors (see Filtering Poincare Plots) - a pair is removed if any of
+        # its beats is bad, one mask selects the remaining pairs
+        good_beats = signal.annotation != 16
+        good_pairs = good_beats[:-1] & good_beats[1:]
+        # the kernel works in place on the sums and squares the increments, so integer signals (e.g. int16 from
+        # Signal.from_arrays) are converted to float once, here
+        xi = asarray(signal.signal[:-1][good_pairs], dtype=float)
+        xii = asarray(signal.signal[1:][good_pairs], dtype=float)
+        return xi, xii
 
-        # now removing all bad beats from xi and xii, according to the above paper
-        xi = delete(xi, all_bad_beats)
-        xii = delete(xii, all_bad_beats)
+    # the fused kernel - the series below are calculated once and shared by all the descriptors, the descriptors are
+    # vectorized reductions over them
+    @cached_property
+    def pair_series(self):
+        """
+        :return: the increments (xii - xi), their squares and the squares of the deviations of the sums (xii + xi) from
+        their mean
+        """
+        increments = self.xii - self.xi
+        squared_sums = self.xii + self.xi
+        if len(squared_sums) > 0:
+            squared_sums -= squared_sums.mean()
+        squared_sums *= squared_sums
+        return increments, increments * increments, squared_sums
 
-        return xi, xii
+    @cached_property
+    def class_sums(self):
+        """
+        the masks of the decelerating, accelerating and no change pairs are built once, and the squared increments and
+        the squared deviations of the sums are summed over each of them
+        :return: two arrays of the sums, in the order: decelerating, accelerating, no change
+        """
+        increments, squared_increments, squared_sums = self.pair_series
+        masks = (increments > 0, increments < 0, increments == 0)
+        return (array([squared_increments.sum(where=mask) for mask in masks]),
+                array([squared_sums.sum(where=mask) for mask in masks]))
 
     def sd1(self):
-        try:
-            result = sqrt(var(self.xii - self.xi)/2)
-        except ZeroDivisionError:
-            result = None
-        return result
+        with errstate(invalid="ignore"):
+            return sqrt(var(self.pair_series[0])/2)
         # CAREFUL HERE AND BELOW!!! the definition of variance used in scipy has the denominator equal to n, NOT (n-1)!
         # this seems to be more appropriate for what we do here, so
         # if you want to get the result you would get in R or Matlab comment the line above, uncomment the lines below and go to the
@@ -56,7 +107,9 @@ class Poincare:
         #   return None
 
     def sd2(self):
-        return(sqrt(var(self.xii + self.xi)/2))
+        # the mean of the squared deviations is the variance of the sums
+        with errstate(invalid="ignore"):
+            return sqrt(mean(self.pair_series[2])/2)
         # CAREFUL HERE!!! the definition of variance used in scipy has the denominator equal to n, NOT (n-1)!
         # this seems to be more appropriate for what we do here, so
         # if you want to get the result you would get in R or Matlab comment the line above, uncomment the lines below and go to the
@@ -79,46 +132,26 @@ class Poincare:
 
     def short_term_asymmetry(self):
         n = len(self.xii)
-        auxilary = (self.xii - self.xi) / sqrt(2)
-        decelerating_indices = where(auxilary > 0)[0]
-        accelerating_indices = where(auxilary < 0)[0]
-        failed = False
-        try:
-            SD1d = sqrt(1 / n * sum(auxilary[decelerating_indices]**2))
-        except ZeroDivisionError:
-            failed = True
-        try:
-            SD1a = sqrt(1 / n * sum(auxilary[accelerating_indices]**2))
-        except ZeroDivisionError:
-            failed = True
-        if failed:
+        if n == 0:
             return None, None, None, None, None
-        else:
-            SD1I = sqrt(SD1d**2 + SD1a**2)
-            C1d = SD1d**2/SD1I**2
-            C1a = SD1a**2/SD1I**2
-            return(SD1d, C1d, SD1a, C1a, SD1I)
+        # the squares of the projections of the increments on the line perpendicular to the identity line, (xii - xi)/sqrt(2)
+        SD1d, SD1a = sqrt(self.class_sums[0][:2] / 2 / n)
+        SD1I = sqrt(SD1d**2 + SD1a**2)
+        C1d = SD1d**2/SD1I**2
+        C1a = SD1a**2/SD1I**2
+        return(SD1d, C1d, SD1a, C1a, SD1I)
 
     def long_term_asymmetry(self):
         n = len(self.xii)
-        auxilary_updown = (self.xii - self.xi)
-
-        decelerating_indices = where(auxilary_updown > 0)[0]
-        accelerating_indices = where(auxilary_updown < 0)[0]
-        nochange_indices = where(auxilary_updown == 0)[0]
-        auxilary = (self.xii + self.xi - mean(self.xi) - mean(self.xii)) / sqrt(2)
-        failed = False
-        try:
-            SD2d = sqrt(1/n * (sum(auxilary[decelerating_indices]**2) + 1/2 * sum(auxilary[nochange_indices]**2)))
-            SD2a = sqrt(1/n * (sum(auxilary[accelerating_indices]**2) + 1/2 * sum(auxilary[nochange_indices]**2)))
-        except ZeroDivisionError:
-            failed = True
-        if failed:
+        if n == 0:
             return None, None, None, None, None
-        else:
-            SD2I = sqrt(SD2d**2 + SD2a**2)
-            C2d = (SD2d/SD2I)**2
-            C2a = (SD2a/SD2I)**2
+        # the no change pairs are shared equally by both classes
+        decelerating, accelerating, no_change = self.class_sums[1] / 2
+        SD2d = sqrt(1/n * (decelerating + 1/2 * no_change))
+        SD2a = sqrt(1/n * (accelerating + 1/2 * no_change))
+        SD2I = sqrt(SD2d**2 + SD2a**2)
+        C2d = (SD2d/SD2I)**2
+        C2a = (SD2a/SD2I)**2
         return(SD2d, C2d, SD2a, C2a, SD2I)
 
     def total_asymmetry(self):
@@ -133,4 +166,231 @@ class Poincare:
         if failed:
             return None, None, None, None
         else:
-            return(SDNNd, Cd, SDNNa, Ca)
\ No newline at end of file
+            return(SDNNd, Cd, SDNNa, Ca)
+
+
+class PoincareAccumulator:
+    """
+    This class calculates the same descriptors as the Poincare class in one pass over the signal, which may be read in
+    chunks of any length - only the moments of the increments (xii - xi) and of the sums (xii + xi) are kept, separately
+    for the decelerating (xii > xi), accelerating (xii < xi) and no change pairs, so the memory used does not depend on
+    the length of the recording.
+    The moments are the count, the mean and the sum of the squared deviations from the mean (Welford), so they can be
+    merged (Chan et al.) without losing precision - two accumulators may be filled in parallel, e.g. with the
+    consecutive parts of a recording or with different files, and then combined with the merge method.
+    The pairs are filtered as in the Poincare class, i.e. a pair is removed if any of its beats is annotated as 16.
+    """
+    # the rows of the moment arrays
+    classes = {"decelerating": 0, "accelerating": 1, "no_change": 2}
+
+    def __init__(self):
+        self.count = zeros(3)
+        # columns: the increments, the sums
+        self.mean = zeros((3, 2))
+        self.squared_deviations = zeros((3, 2))
+        # the first and the last beat seen - [value, annotation] - needed to join the consecutive chunks
+        self.first = None
+        self.last = None
+
+    def update(self, signal, annotation=None):
+        """
+        adds the next chunk of the recording - the pair made by the last beat of the previous chunk and the first beat
+        of this chunk is included
+        :param signal: the next part of the signal
+        :param annotation: its annotations, None means "all correct"
+        :return: the accumulator itself
+        """
+        signal = asarray(signal, dtype=float)
+        annotation = zeros(len(signal), dtype=int) if annotation is None else asarray(annotation)
+        if len(signal) == 0:
+            return self
+        if self.first is None:
+            self.first = [signal[0], annotation[0]]
+        if self.last is not None:
+            signal = concatenate(([self.last[0]], signal))
+            annotation = concatenate(([self.last[1]], annotation))
+        self.last = [signal[-1], annotation[-1]]
+        good = (annotation[:-1] != 16) & (annotation[1:] != 16)
+        xi = signal[:-1][good]
+        xii = signal[1:][good]
+        self.add_moments(*self.pair_moments(xii - xi, xii + xi))
+        return self
+
+    @staticmethod
+    def pair_moments(increments, sums):
+        """
+        the moments of a batch of Poincare pairs, split into the decelerating, accelerating and no change pairs
+        :return: count, mean, squared_deviations - see the constructor
+        """
+        count = zeros(3)
+        mean = zeros((3, 2))
+        squared_deviations = zeros((3, 2))
+        direction = sign(increments)
+        for row, selected in enumerate((direction > 0, direction < 0, direction == 0)):
+            count[row] = selected.sum()
+            if count[row] > 0:
+                for column, values in enumerate((increments[selected], sums[selected])):
+                    mean[row, column] = values.mean()
+                    squared_deviations[row, column] = ((values - mean[row, column])**2).sum()
+        return count, mean, squared_deviations
+
+    @staticmethod
+    def combine_moments(count_a, mean_a, squared_deviations_a, count_b, mean_b, squared_deviations_b):
+        """
+        combines the moments of two disjoint sets of pairs (Chan et al.), the arguments may be arrays of moments
+        :return: count, mean, squared_deviations
+        """
+        count = count_a + count_b
+        # the weight of the second set, 0 where both sets are empty
+        weight = (count_b / count.clip(min=1))[..., None]
+        delta = mean_b - mean_a
+        mean = mean_a + delta * weight
+        squared_deviations = squared_deviations_a + squared_deviations_b + delta**2 * (count_a[..., None] * weight)
+        return count, mean, squared_deviations
+
+    def add_moments(self, count, mean, squared_deviations):
+        self.count, self.mean, self.squared_deviations = self.combine_moments(self.count, self.mean,
+                                                                              self.squared_deviations, count, mean,
+                                                                              squared_deviations)
+
+    def merge(self, other, contiguous=False):
+        """
+        combines two accumulators, neither of them is changed
+        :param other: another PoincareAccumulator
+        :param contiguous: True if the other accumulator holds the part of the recording directly following this one -
+        then the pair made by the last beat of this part and the first beat of the other one is included
+        :return: a new PoincareAccumulator
+        """
+        merged = PoincareAccumulator()
+        merged.count, merged.mean, merged.squared_deviations = self.count.copy(), self.mean.copy(), \
+            self.squared_deviations.copy()
+        merged.add_moments(other.count, other.mean, other.squared_deviations)
+        if contiguous and self.last is not None and other.first is not None:
+            bridge = PoincareAccumulator().update([self.last[0], other.first[0]], [self.last[1], other.first[1]])
+            merged.add_moments(bridge.count, bridge.mean, bridge.squared_deviations)
+        merged.first = self.first if self.first is not None else other.first
+        merged.last = other.last if other.last is not None else self.last
+        return merged
+
+    def descriptors(self):
+        """
+        :return: dictionary with the descriptors, named as the attributes of the Poincare class
+        """
+        return self.descriptors_from_moments(self.count, self.mean, self.squared_deviations)
+
+    @staticmethod
+    def descriptors_from_moments(count, mean, squared_deviations):
+        """
+        calculates the Poincare plot descriptors from the moments of the decelerating, accelerating and no change pairs
+        the definitions (and the variance with the denominator n) are the same as in the Poincare class
+        the moments may have leading dimensions (e.g. one row per window, see WindowedPoincare) - the descriptors are
+        then arrays of the same leading shape
+        :param count: array (..., 3)
+        :param mean: array (..., 3, 2), the columns are the increments and the sums
+        :param squared_deviations: array (..., 3, 2)
+        :return: dictionary with the descriptors, None if there are no pairs (nan for the windows without pairs)
+        """
+        names = ["SD1", "SD2", "SDNN", "SD1d", "C1d", "SD1a", "C1a", "SD1I", "SD2d", "C2d", "SD2a", "C2a", "SD2I",
+                 "SDNNd", "Cd", "SDNNa", "Ca"]
+        n = count.sum(axis=-1)
+        if n.ndim == 0 and n == 0:
+            return {name: None for name in names}
+        dec, acc, no_change = (PoincareAccumulator.classes[name] for name in ("decelerating", "accelerating",
+                                                                             "no_change"))
+        total_count, total_mean, total_squared_deviations = count[..., 0], mean[..., 0, :], squared_deviations[..., 0, :]
+        for row in (1, 2):
+            total_count, total_mean, total_squared_deviations = PoincareAccumulator.combine_moments(
+                total_count, total_mean, total_squared_deviations, count[..., row], mean[..., row, :],
+                squared_deviations[..., row, :])
+        d = {}
+        with errstate(divide="ignore", invalid="ignore"):
+            d["SD1"] = sqrt(total_squared_deviations[..., 0] / n / 2)
+            d["SD2"] = sqrt(total_squared_deviations[..., 1] / n / 2)
+            d["SDNN"] = sqrt((d["SD1"]**2 + d["SD2"]**2) / 2)
+            # short term - the sums of the squared increments, not centred
+            squared_increments = squared_deviations[..., 0] + count * mean[..., 0]**2
+            d["SD1d"] = sqrt(squared_increments[..., dec] / 2 / n)
+            d["SD1a"] = sqrt(squared_increments[..., acc] / 2 / n)
+            d["SD1I"] = sqrt(d["SD1d"]**2 + d["SD1a"]**2)
+            d["C1d"] = d["SD1d"]**2 / d["SD1I"]**2
+            d["C1a"] = d["SD1a"]**2 / d["SD1I"]**2
+            # long term - the sums of the squared deviations of the sums from their mean over all the pairs
+            deviations = squared_deviations[..., 1] + count * (mean[..., 1] - total_mean[..., 1:])**2
+            d["SD2d"] = sqrt((deviations[..., dec] + deviations[..., no_change] / 2) / 2 / n)
+            d["SD2a"] = sqrt((deviations[..., acc] + deviations[..., no_change] / 2) / 2 / n)
+            d["SD2I"] = sqrt(d["SD2d"]**2 + d["SD2a"]**2)
+            d["C2d"] = (d["SD2d"] / d["SD2I"])**2
+            d["C2a"] = (d["SD2a"] / d["SD2I"])**2
+            # total
+            d["SDNNd"] = sqrt((d["SD1d"]**2 + d["SD2d"]**2) / 2)
+            d["SDNNa"] = sqrt((d["SD1a"]**2 + d["SD2a"]**2) / 2)
+            d["Cd"] = d["SDNNd"]**2 / d["SDNN"]**2
+            d["Ca"] = d["SDNNa"]**2 / d["SDNN"]**2
+        return {name: d[name] for name in names}
+
+
+class WindowedPoincare:
+    """
+    This class calculates the Poincare plot descriptors in windows sliding along the recording, e.g. in every 5-minute
+    window of a 24h recording. The sums (of the counts, the increments, the sums and their squares, separately for the
+    decelerating, accelerating and no change pairs) are accumulated once over the whole recording, so the moments of
+    any window are differences of two rows of these cumulative sums - the cost does not depend on the number of windows
+    or on their overlap.
+    A window holds the pairs whose both beats are in the window, the pairs with a beat annotated as 16 are removed, as
+    in prepare_PP. Each descriptor (SD1, SD2, C1d, ...) is an array with one value per window, nan for the windows
+    without pairs.
+    """
+    def __init__(self, signal, window, step=None, in_time=False):
+        """
+        :param signal: object of Signal class
+        :param window: the length of the window in beats or, if in_time is True, in the units of signal.timetrack
+        :param step: the distance between the beginnings of consecutive windows (same units), None means window, i.e.
+        the windows do not overlap
+        :param in_time: the window and the step are given in time, not in beats
+        """
+        step = window if step is None else step
+        if in_time:
+            self.window_starts, self.window_ends = time_windows(signal.timetrack, window, step)
+        else:
+            self.window_starts, self.window_ends = beat_windows(len(signal.signal), window, step)
+        descriptors = PoincareAccumulator.descriptors_from_moments(*self.window_moments(signal))
+        for name, values in descriptors.items():
+            setattr(self, name, values)
+        self.descriptors = descriptors
+
+    def window_moments(self, signal):
+        """
+        calculates the moments of the pairs in each window from the cumulative sums over the whole recording
+        :return: count (windows, 3), mean (windows, 3, 2), squared_deviations (windows, 3, 2) - as in PoincareAccumulator
+        """
+        rr = asarray(signal.signal, dtype=float)
+        annotation = asarray(signal.annotation)
+        good = (annotation[:-1] != 16) & (annotation[1:] != 16)
+        increments = rr[1:] - rr[:-1]
+        # the sums are shifted by their mean, so that the cumulative sums of their squares do not lose precision
+        sums = rr[1:] + rr[:-1]
+        shift = sums[good].mean() if good.any() else 0.0
+        sums = sums - shift
+        direction = sign(increments)
+        # the columns: count, increments, squared increments, sums, squared sums - for each of the three classes
+        values = zeros((len(increments) + 1, 3, 5))
+        for row, selected in enumerate((direction > 0, direction < 0, direction == 0)):
+            selected = selected & good
+            values[1:, row, 0] = selected
+            values[1:, row, 1] = increments * selected
+            values[1:, row, 2] = increments**2 * selected
+            values[1:, row, 3] = sums * selected
+            values[1:, row, 4] = sums**2 * selected
+        cumulative = cumsum(values, axis=0)
+        # the pairs of the window [start, end) are the pairs start, ..., end - 2
+        first_pairs = self.window_starts
+        last_pairs = maximum(self.window_ends - 1, self.window_starts)
+        window_sums = cumulative[last_pairs] - cumulative[first_pairs]
+        count = window_sums[..., 0]
+        with errstate(divide="ignore", invalid="ignore"):
+            mean = window_sums[..., 1::2] / count[..., None]
+            squared_deviations = window_sums[..., 2::2] - count[..., None] * mean**2
+        mean = nan_to_num(mean)
+        squared_deviations = nan_to_num(squared_deviations).clip(min=0)
+        mean[..., 1] += shift
+        return count, mean, squared_deviations
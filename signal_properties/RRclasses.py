@@ -1,61 +1,198 @@
 from re import findall
-from scipy import array, where, cumsum
-from signal_properties.Poincare import Poincare
-from signal_properties.runs import Runs
-from signal_properties.spectral import LombScargleSpectrum
+from itertools import islice
+from types import SimpleNamespace
+from numpy import array, asarray, cumsum, zeros, loadtxt, concatenate, flatnonzero, isin, isnan, errstate, nan
+from signal_properties.my_exceptions import WrongColumn
+from signal_properties.Poincare import Poincare, PoincareAccumulator, WindowedPoincare
+from signal_properties.runs import Runs, RunsAccumulator, WindowedRuns
+from signal_properties.spectral import LombScargleSpectrum, LombScargleSpectrogram, FFTSpectrum
+from signal_properties.timing import StageTimer
 
 
 
 class Signal: ### uwaga! timetrack! dodac, przetestowac, zdefiniowac wyjatek, podniesc wyjatek w spectrum gdy nie ma timetracka!
-    def __init__(self, path_to_file, column_signal=0, column_annot=0, column_sample_to_sample=0, quotient_filter=-1, square_filter=(-8000, 8000), annotation_filter=()):
+    def __init__(self, path_to_file, column_signal=0, column_annot=0, column_sample_to_sample=0, quotient_filter=-1, square_filter=(-8000, 8000), annotation_filter=(), timer=None):
         # 0 are there to facilitate the construction of signals from console
+        # timer - a StageTimer recording the time of each stage, None (the default) means no instrumentation
         self.quotient_filter = quotient_filter
         self.square_filter = square_filter
         self.annotation_filter = annotation_filter
-        self.signal, self.annotation, self.timetrack = self.read_data(path_to_file, column_signal, column_annot,
-                                                                             column_sample_to_sample)
+        self.timer = timer
+        # the data passed as a list of arrays is not parsed, so it is not timed
+        with StageTimer.timed(None if type(path_to_file) == list else timer, "parsing") as record:
+            data = self.read_data(path_to_file, column_signal, column_annot, column_sample_to_sample)
+            record["beats"] = len(data[0])
+        self.set_data(*data)
+
+    @classmethod
+    def from_arrays(cls, signal, annotation=None, timetrack=None, signal_dtype=None, annotation_dtype=None,
+                    copy_annotation=True, quotient_filter=-1, square_filter=(-8000, 8000), annotation_filter=(),
+                    timer=None):
+        """
+        builds a Signal from data which already is in memory - numpy arrays, memoryviews or any objects supporting the
+        buffer protocol - without copying it when its dtype is already the requested one
+        :param signal: the signal, e.g. the RR intervals
+        :param annotation: the annotations, None means "all correct"
+        :param timetrack: the times of the samples, None means the cumulative sum of the signal
+        :param signal_dtype: the dtype in which the signal is kept, e.g. "float32" to halve the memory, None means the
+        dtype of the data
+        :param annotation_dtype: the dtype in which the annotations are kept, e.g. "int8", None means the dtype of the
+        data
+        :param copy_annotation: the filters mark the bad beats in the annotation, so it is copied by default - with
+        False the annotation passed here is changed in place (it must be writeable then)
+        :param timer: a StageTimer recording the time of each stage, None means no instrumentation
+        :return: the Signal
+        """
+        signal_object = cls.__new__(cls)
+        signal_object.quotient_filter = quotient_filter
+        signal_object.square_filter = square_filter
+        signal_object.annotation_filter = annotation_filter
+        signal_object.timer = timer
+        signal = asarray(signal, dtype=signal_dtype)
+        if annotation is None:
+            annotation = zeros(len(signal), dtype=int if annotation_dtype is None else annotation_dtype)
+        elif copy_annotation:
+            annotation = array(annotation, dtype=annotation_dtype)
+        else:
+            annotation = asarray(annotation, dtype=annotation_dtype)
+        # the timetrack is accumulated in double precision, whatever the dtype of the signal
+        timetrack = cumsum(signal, dtype=float) if timetrack is None else asarray(timetrack)
+        signal_object.set_data(signal, annotation, timetrack)
+        return signal_object
+
+    def set_data(self, signal, annotation, timetrack):
+        """
+        takes the data read from a file or passed from memory, filters it and clears the results of the analyses
+        """
+        self.signal, self.annotation, self.timetrack = signal, annotation, timetrack
         # here the data is filtered - this filtration will apply throughout the whole application
-        self.filter_data()
+        with StageTimer.timed(self.timer, "filtering", len(signal)):
+            self.filter_data()
 
         # now the HRV and HRA methods are being applied
 
         self.poincare = None
+        self.windowed_poincare = None
         self.runs = None
+        self.windowed_runs = None
         self.LS_spectrum = None
+        self.LS_spectrogram = None
+        self.FFT_spectrum = None
 
-    def read_data(self, path_to_file, column_signal, column_annot, column_sample_to_sample):
+    @staticmethod
+    def read_data(path_to_file, column_signal, column_annot, column_sample_to_sample):
         if type(path_to_file) == list:
+            # the signal and the timetrack which already are arrays (e.g. memory-mapped from the cache) are not copied,
+            # the annotation is always copied, because the filters mark the bad beats in it
             if len(path_to_file) == 2:
                 # this is the possibility to pass a list with signal and annotation vector as its elements
-                return array(path_to_file[0]), array(path_to_file[1]), cumsum(array(path_to_file[0]))
+                return asarray(path_to_file[0]), array(path_to_file[1]), cumsum(path_to_file[0])
             else:
-                return array(path_to_file[0]), array(path_to_file[1]), array(path_to_file[2])
+                return asarray(path_to_file[0]), array(path_to_file[1]), asarray(path_to_file[2])
+        # the columns may be given by their numbers or by their names in the header, e.g. "rri[ms]" or "rr-flags[]"
+        # 0 as the sample-to-sample column means "no sample-to-sample column", unless it has been given by its name
+        read_sample_to_sample = column_sample_to_sample != 0
         reafile_current = open(path_to_file, 'r')
-        reafile_current.readline()
-        signal = []  # this variable contains the signal for spectral analysis
-        annotation = []
-        sample_to_sample = [] # this variable holds the sample-to-sample values (like the beat-to-beat interval,
-        # RR interval) - this will be used in the Lomb-Scargle periodogram, which requires the time-track column
-        # here the reading of the file starts
-
-        for line in reafile_current:
-            line_content = findall(r'\b[0-9\.]+', line)
-            signal.append(float(line_content[column_signal]))
-            if column_signal != column_annot:  # see below - similar condition
-                annotation.append(int(float(line_content[column_annot])))
-            if column_sample_to_sample !=0 and column_sample_to_sample != column_signal:
-                sample_to_sample.append(float(line_content[column_sample_to_sample]))
-        signal = array(signal)
-        if column_sample_to_sample == column_signal:
-            sample_to_sample = signal
+        header = reafile_current.readline()
+        data_start = reafile_current.tell()
+        first_line = reafile_current.readline()
+        reafile_current.seek(data_start)
+        delimiter = Signal.find_delimiter(first_line)
+        column_signal, column_annot, column_sample_to_sample = Signal.resolve_columns(header, delimiter, column_signal,
+                                                                                      column_annot,
+                                                                                      column_sample_to_sample)
+        columns = Signal.columns_to_read(column_signal, column_annot, column_sample_to_sample, read_sample_to_sample)
+        if first_line.strip() == "":
+            table = zeros((0, len(columns)))
+        else:
+            try:
+                # the fast path - the whole file is read into a typed array, only the requested columns are converted
+                table = loadtxt(reafile_current, delimiter=delimiter, usecols=columns, ndmin=2, comments=None)
+            except ValueError:
+                # the file is not a regular table of numbers - falling back to the token by token parser
+                reafile_current.seek(data_start)
+                table = Signal.parse_columns(reafile_current, columns)
+        reafile_current.close()
 
-        timetrack = cumsum(sample_to_sample)
+        signal, annotation, sample_to_sample = Signal.split_table(table, columns, column_signal, column_annot,
+                                                                  column_sample_to_sample, read_sample_to_sample)
+        return signal, annotation, cumsum(sample_to_sample)
 
+    @staticmethod
+    def columns_to_read(column_signal, column_annot, column_sample_to_sample, read_sample_to_sample):
+        """
+        :return: the sorted numbers of the columns which have to be read from the file
+        """
+        columns = [column_signal]
+        if column_signal != column_annot:
+            columns.append(column_annot)
+        if read_sample_to_sample and column_sample_to_sample != column_signal:
+            columns.append(column_sample_to_sample)
+        return sorted(set(columns))
+
+    @staticmethod
+    def split_table(table, columns, column_signal, column_annot, column_sample_to_sample, read_sample_to_sample):
+        """
+        splits the table read from the file into the signal, the annotation and the sample-to-sample intervals
+        :param table: 2-D array holding the columns listed in columns
+        :return: signal, annotation, sample_to_sample (empty if there is no sample-to-sample column)
+        """
+        signal = table[:, columns.index(column_signal)]
         if column_signal == column_annot:
             annotation = 0*signal
-        annotation = array(annotation)
-        reafile_current.close()
-        return signal, annotation, timetrack
+        else:
+            annotation = table[:, columns.index(column_annot)].astype(int)
+        if column_sample_to_sample == column_signal:
+            sample_to_sample = signal
+        elif read_sample_to_sample:
+            sample_to_sample = table[:, columns.index(column_sample_to_sample)]
+        else:
+            sample_to_sample = zeros(0)
+        return signal, annotation, sample_to_sample
+
+    @staticmethod
+    def find_delimiter(line):
+        """
+        finds the delimiter of the columns in a line of the file - tab or comma, None means any whitespace
+        """
+        for delimiter in ("\t", ","):
+            if delimiter in line:
+                return delimiter
+        return None
+
+    @staticmethod
+    def resolve_columns(header, delimiter, *columns):
+        """
+        translates the names of the columns into their numbers, the columns given by numbers are returned unchanged
+        :param header: the first line of the file
+        :param delimiter: the delimiter of the columns, None means any whitespace
+        :param columns: the numbers or the names of the columns
+        :return: list with the numbers of the columns
+        """
+        names = [name.strip() for name in header.strip().split(delimiter)]
+        resolved = []
+        for column in columns:
+            if isinstance(column, str):
+                if column not in names:
+                    raise WrongColumn(column)
+                column = names.index(column)
+            resolved.append(column)
+        return resolved
+
+    @staticmethod
+    def parse_columns(lines, columns):
+        """
+        this is the original, token by token parser - it reads every number in a line, whatever separates them, and is
+        used for the files which are not regular tables
+        :param lines: the lines of the file (without the header)
+        :param columns: the numbers of the columns to be read
+        :return: 2-D array with the requested columns
+        """
+        table = []
+        for line in lines:
+            line_content = findall(r'\b[0-9\.]+', line)
+            table.append([float(line_content[column]) for column in columns])
+        return array(table).reshape(-1, len(columns))
 
     def filter_data(self):
         """
@@ -66,39 +203,212 @@ class Signal: ### uwaga! timetrack! dodac, przetestowac, zdefiniowac wyjatek, po
         (sinus, ventricular, supraventricular, artifact) respectively
         """
 
-        # now, let the filtering begin
-        # beginning with the annotation filter
-        # 16 henceforth means "bad"
-        if len(self.annotation_filter)>0:
-            for beat_type in self.annotation_filter:
-                self.annotation[where(self.annotation == beat_type)] = 16
-
-        # now the square filter
-        self.annotation[where(self.signal < self.square_filter[0])[0]] = 16
-        self.annotation[where(self.signal > self.square_filter[1])[0]] = 16
-
-        # now removing bad beats from the beginning and the end of the recording
-        try:
-            while self.annotation[0] != 0:
-                self.signal = self.signal[1:]
-                self.annotation = self.annotation[1:]
-                self.timetrack = self.timetrack[1:]
-
-            # removing nonsinus beats from the end
-            while self.annotation[-1]!=0:
-                self.signal=self.signal[0:-1]
-                self.annotation=self.annotation[0:-1]
-                self.timetrack=self.timetrack[0:-1]
-        except IndexError:
+        # now, let the filtering begin - all the filters mark the bad beats as 16 in the annotation
+        self.mark_bad_beats(self.signal, self.annotation, self.annotation_filter, self.square_filter,
+                            self.quotient_filter)
+
+        # now removing bad beats from the beginning and the end of the recording - the arrays are sliced once, at the
+        # first and after the last good beat
+        good_beats = flatnonzero(self.annotation == 0)
+        if len(good_beats) == 0:
             print("no good beats")
+            first, end = len(self.signal), len(self.signal)
+        else:
+            first, end = good_beats[0], good_beats[-1] + 1
+        self.signal = self.signal[first:end]
+        self.annotation = self.annotation[first:end]
+        self.timetrack = self.timetrack[first:end]
 
         return None
 
-    def set_poincare(self):
-        self.poincare = Poincare(self)
+    @staticmethod
+    def mark_bad_beats(signal, annotation, annotation_filter, square_filter, quotient_filter=-1, previous_beat=None,
+                       next_beat=None):
+        """
+        applies the annotation filter, the square filter and the quotient filter in one pass - the bad beats are marked
+        as 16 in the annotation, which is changed in place
+        the filters look at single beats and their neighbours only, so they can be applied to any part of the signal -
+        previous_beat and next_beat are the beats just before and just after the part (None at the ends of the signal)
+        """
+        # 16 henceforth means "bad"
+        bad_beats = isin(annotation, annotation_filter)
+        bad_beats |= (signal < square_filter[0]) | (signal > square_filter[1])
+        if quotient_filter >= 0:
+            bad_beats |= Signal.quotient_mask(signal, quotient_filter, previous_beat, next_beat)
+        annotation[bad_beats] = 16
+
+    @staticmethod
+    def quotient_mask(signal, quotient_filter, previous_beat=None, next_beat=None):
+        """
+        the quotient filter - a beat is bad if both its ratio to the previous beat and its ratio to the next beat are
+        outside [1 - quotient_filter, 1 + quotient_filter], so an ectopic beat and the compensatory pause after it are
+        removed, but their normal neighbours are not; the first and the last beat of the signal are compared with their
+        only neighbour
+        :return: boolean array, True for the bad beats
+        """
+        extended = concatenate(([nan if previous_beat is None else previous_beat], signal,
+                                [nan if next_beat is None else next_beat]))
+        with errstate(divide="ignore", invalid="ignore"):
+            to_previous = extended[1:-1] / extended[:-2]
+            to_next = extended[1:-1] / extended[2:]
+        # nan means "no neighbour"
+        out_of_previous = (abs(to_previous - 1) > quotient_filter) | isnan(to_previous)
+        out_of_next = (abs(to_next - 1) > quotient_filter) | isnan(to_next)
+        return out_of_previous & out_of_next & ~(isnan(to_previous) & isnan(to_next))
+
+    def set_poincare(self, descriptors=None):
+        """
+        :param descriptors: the Poincare plot descriptors calculated right away, e.g. ["SDNN", "SD1", "SD2"] - None
+        means that each descriptor is calculated when it is used for the first time
+        """
+        with StageTimer.timed(self.timer, "Poincare", len(self.signal)):
+            self.poincare = Poincare(self, descriptors)
+
+    def set_windowed_poincare(self, window, step=None, in_time=False):
+        self.windowed_poincare = WindowedPoincare(self, window, step=step, in_time=in_time)
 
     def set_runs(self):
-        self.runs = Runs(self)
+        with StageTimer.timed(self.timer, "runs", len(self.signal)):
+            self.runs = Runs(self)
+
+    def set_windowed_runs(self, window=None, step=None, in_time=False, boundary="start", segments=None):
+        self.windowed_runs = WindowedRuns(self, window, step=step, in_time=in_time, boundary=boundary,
+                                          segments=segments)
+
+    def set_LS_spectrum(self, engine="scipy", max_frequency=None, resolution=None):
+        with StageTimer.timed(self.timer, "LS_spectrum", len(self.signal)):
+            self.LS_spectrum = LombScargleSpectrum(self, engine=engine, max_frequency=max_frequency,
+                                                   resolution=resolution)
+
+    def set_FFT_spectrum(self, resampling_rate=4, segment=None, overlap=0.5):
+        with StageTimer.timed(self.timer, "FFT_spectrum", len(self.signal)):
+            self.FFT_spectrum = FFTSpectrum(self, resampling_rate=resampling_rate, segment=segment, overlap=overlap)
+
+    def set_LS_spectrogram(self, window, step=None, bands=[0, 0.04, 0.15, 0.4], resolution=None, time_unit=1000):
+        self.LS_spectrogram = LombScargleSpectrogram(self, window, step=step, bands=bands, resolution=resolution,
+                                                     time_unit=time_unit)
+
+
+class StreamingSignal:
+    """
+    This is the variant of the Signal class for very long recordings (e.g. 7-day Holter recordings) - the file is never
+    loaded as a whole, it is read in chunks of chunk_size lines, each chunk is filtered and passed to the accumulators
+    (PoincareAccumulator, RunsAccumulator), which carry their state across the borders of the chunks. The memory used
+    depends on the size of the chunk, not on the length of the recording, and the results are the same as those of the
+    Signal class.
+    The LS spectrum needs the whole recording, so it is not available here.
+    """
+    def __init__(self, path_to_file, column_signal=0, column_annot=0, column_sample_to_sample=0, quotient_filter=-1, square_filter=(-8000, 8000), annotation_filter=(), chunk_size=100000):
+        self.path_to_file = path_to_file
+        self.columns = (column_signal, column_annot, column_sample_to_sample)
+        self.quotient_filter = quotient_filter
+        self.square_filter = square_filter
+        self.annotation_filter = annotation_filter
+        self.chunk_size = chunk_size
+
+        self.poincare = None
+        self.runs = None
+
+    def read_chunks(self):
+        """
+        reads the file chunk by chunk - the columns are the same as in Signal.read_data
+        :return: generator of signal, annotation, timetrack of the consecutive chunks
+        """
+        read_sample_to_sample = self.columns[2] != 0
+        time_offset = 0.0
+        columns = None
+        with open(self.path_to_file, 'r') as reafile_current:
+            header = reafile_current.readline()
+            while True:
+                lines = list(islice(reafile_current, self.chunk_size))
+                if len(lines) == 0:
+                    break
+                if columns is None:
+                    delimiter = Signal.find_delimiter(lines[0])
+                    column_signal, column_annot, column_sample_to_sample = Signal.resolve_columns(header, delimiter,
+                                                                                                  *self.columns)
+                    columns = Signal.columns_to_read(column_signal, column_annot, column_sample_to_sample,
+                                                     read_sample_to_sample)
+                try:
+                    table = loadtxt(lines, delimiter=delimiter, usecols=columns, ndmin=2, comments=None)
+                except ValueError:
+                    table = Signal.parse_columns(lines, columns)
+                signal, annotation, sample_to_sample = Signal.split_table(table, columns, column_signal, column_annot,
+                                                                          column_sample_to_sample,
+                                                                          read_sample_to_sample)
+                # the timetrack continues from the end of the previous chunk
+                timetrack = cumsum(concatenate(([time_offset], sample_to_sample)))[1:]
+                if len(timetrack) > 0:
+                    time_offset = timetrack[-1]
+                yield signal, annotation, timetrack
 
-    def set_LS_spectrum(self):
-        self.LS_spectrum = LombScargleSpectrum(self)
+    def marked_chunks(self):
+        """
+        applies the filters to the chunks - the last beat of each chunk is passed on with the next chunk, because the
+        quotient filter needs the beat following it
+        :return: generator of signal, annotation, timetrack of the consecutive chunks, the bad beats marked as 16
+        """
+        pending = None # the last beat of the previous chunk, not filtered yet
+        previous_beat = None # the beat before it
+        for chunk in self.read_chunks():
+            if pending is not None:
+                chunk = [concatenate((waiting, current)) for waiting, current in zip(pending, chunk)]
+            pending = [part[-1:] for part in chunk]
+            chunk = [part[:-1] for part in chunk]
+            Signal.mark_bad_beats(chunk[0], chunk[1], self.annotation_filter, self.square_filter, self.quotient_filter,
+                                  previous_beat, pending[0][0])
+            if len(chunk[0]) > 0:
+                previous_beat = chunk[0][-1]
+            yield chunk
+        if pending is not None:
+            Signal.mark_bad_beats(pending[0], pending[1], self.annotation_filter, self.square_filter,
+                                  self.quotient_filter, previous_beat, None)
+            yield pending
+
+    def filtered_chunks(self):
+        """
+        filters the chunks as Signal.filter_data filters the whole signal - the bad beats at the beginning of the
+        recording are dropped and the bad beats at the end of each chunk are held back until a good beat follows them,
+        so the bad beats at the end of the recording are dropped as well
+        :return: generator of signal, annotation, timetrack of the consecutive filtered chunks
+        """
+        held_back = None
+        for chunk in self.marked_chunks():
+            if held_back is not None:
+                chunk = [concatenate((held, current)) for held, current in zip(held_back, chunk)]
+            good_beats = flatnonzero(chunk[1] == 0)
+            if len(good_beats) == 0:
+                # nothing to pass on yet - before the first good beat the bad beats are simply dropped
+                if held_back is not None:
+                    held_back = chunk
+                continue
+            # before the first good beat of the recording held_back is None, so the leading bad beats are dropped
+            first = good_beats[0] if held_back is None else 0
+            end = good_beats[-1] + 1
+            held_back = [part[end:] for part in chunk]
+            yield [part[first:end] for part in chunk]
+
+    def analyse(self, poincare=True, runs=True):
+        """
+        reads the recording once and calculates the requested descriptors
+        :param poincare: calculate the Poincare plot descriptors (self.poincare)
+        :param runs: calculate the runs (self.runs)
+        """
+        poincare_accumulator = PoincareAccumulator() if poincare else None
+        runs_accumulator = RunsAccumulator() if runs else None
+        for signal, annotation, timetrack in self.filtered_chunks():
+            if poincare:
+                poincare_accumulator.update(signal, annotation)
+            if runs:
+                runs_accumulator.update(signal, annotation)
+        if poincare:
+            self.poincare = SimpleNamespace(**poincare_accumulator.descriptors())
+        if runs:
+            runs_accumulator.finish()
+            self.runs = runs_accumulator
+
+    def set_poincare(self):
+        self.analyse(poincare=True, runs=False)
+
+    def set_runs(self):
+        self.analyse(poincare=False, runs=True)
@@ -3,4 +3,24 @@ class WrongSignal(Exception):
     pass
 
 class WrongCuts(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class WrongColumn(Exception):
+    # this exception should be raised if a column requested by its name is not in the header of the file
+    pass
+
+class WrongTimetrack(Exception):
+    # this exception should be raised if an analysis in time is requested for a signal without a timetrack
+    pass
+
+class WrongBoundary(Exception):
+    # this exception should be raised if an unknown rule for the runs crossing the borders of the windows is requested
+    pass
+
+class WrongDescriptor(Exception):
+    # this exception should be raised if a Poincare plot descriptor which does not exist is requested
+    pass
+
+class MissingResults(Exception):
+    # this exception should be raised if the results of an analysis which has not been switched on are written
+    pass
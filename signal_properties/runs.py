@@ -1,23 +1,23 @@
-from scipy import where
-from signal_properties.my_exceptions import WrongSignal
+from numpy import asarray, sign, diff, flatnonzero, bincount, concatenate, zeros, cumsum, searchsorted, maximum
+from signal_properties.my_exceptions import WrongSignal, WrongBoundary
+from signal_properties.windows import beat_windows, time_windows
 
 
 class Runs:
 
     def __init__(self, signal):
-        # self.sinus_segments = self.split_on_annot(signal) # - uncomment here and in tests
-        self.runs = self.count_for_all(signal)
-        self.dec_runs, self.acc_runs, self.neutral_runs = self.count_for_all(signal)
         # signal is an object of the "Signal" class
-        # the algorithm is the same I used in the PCSS time series suit
+        # the algorithm is the same I used in the PCSS time series suit, only the implementation is vectorized
+        self.runs = self.count_for_all(signal)
+        self.dec_runs, self.acc_runs, self.neutral_runs = self.runs
 
     def split_on_annot(self, signal):
         # this function splits the signal time series into disjoint subseries,
         #  breaking the signal on annotations which are not 0
-        # this is necessary for the "split_segments_into_runs" function, which accepts a "clean" segment
+        # it is not used in the calculations any more (see run_table), but it is handy when debugging
         # it accepts an object of the Signal class (varname: signal)
         # it returns a list of "clean" subjects without annotations (annotations are assumed to be 0 for all of them)
-        bad_indices = where(signal.annotation != 0)[0]
+        bad_indices = flatnonzero(signal.annotation != 0)
 
         # checking if there is anything to do
         if len(bad_indices) == 0:
@@ -30,80 +30,38 @@ class Runs:
             if start < end:
                 signal_segments.append(signal.signal[start:end])
             start = idx + 1
-            #  the last run has been rejected automatically, now let us remove the
-            #  first run (we do not know where it started -- possibly before the beginning of the recording,
-            #  and we do not know where the last run ended, possibly after the end of the recording)
         if signal.annotation[len(signal.signal)-1] == 0:
             signal_segments.append(signal.signal[start:len(signal.signal)])
 
         return signal_segments
 
-    def split_segments_into_runs(self, signal_segment, all_runs = [], directions = []):
-        # this function accepts a signal without annotations - this signal comes from the
-        #  segmentation into "normal" (correct) beats ("samples") segments
-        # it return dictionary with two keys: all_runs and directions
-        # all_runs - this list keeps all the runs in order
-        # directions - this list keeps the designations - thether the run in the "all_runs"
-        #  list is a decelerating list (1) or an accelerating list (-1) or no_change list (0)
-        if (len(signal_segment) < 2): # the length of the signal must be sufficient
-            raise WrongSignal
-        if signal_segment[0] == signal_segment[1]:
-            last = 0
-        else:
-            if signal_segment[0] < signal_segment[1]:
-                last = 1
-            else:
-                last = -1
-        begin = 1 # we are dropping the first sample - this is just a reference and cannot be a part of a run - this
-        # could happen either after the beginning of a signal or after an "incorrect" (e.g. extrasystolic) sample
-        # well, perhaps the run after the beginning or after the incorrect beat should be rejected altogether ...
-        for index in range(1, len(signal_segment)):
-            if signal_segment[index] == signal_segment[index - 1]:
-                current = 0
-            else:
-                if signal_segment[index] > signal_segment[index - 1]:
-                    current = 1
-                else:
-                    current = -1
-
-            if current != last:
-                if last == -1:
-                    all_runs.extend([signal_segment[begin:index]])
-                    directions.append("acc")
-                if last == 0:
-                    all_runs.extend([signal_segment[begin:index]])
-                    directions.append("neutral")
-                if last == 1:
-                    all_runs.extend([signal_segment[begin:index]])
-                    directions.append("dec")
-
-                begin = index
-                last = current
-        # now check the last run
-        if last == -1:
-            all_runs.extend([signal_segment[begin:index + 1]])
-            directions.append("acc")
-        if last == 0:
-            all_runs.extend([signal_segment[begin:index + 1]])
-            directions.append("neutral")
-        if last == 1:
-            all_runs.extend([signal_segment[begin:index + 1]])
-            directions.append("dec")
-        return [all_runs, directions]
-
-
-    def split_all_into_runs(self, signal):
-        # this function splits the chunks of sinus origin (or "correct") beats
-        #  (samples) into separate runs and directions of these runs
-        list_of_separate_segments = self.split_on_annot(signal)
-        separate_runs_and_directions = {"all_runs":[], "directions":[]}
-        for segment in list_of_separate_segments:
-            if len(segment) > 0:
-                temp = self.split_segments_into_runs(segment, all_runs=[], directions=[])
-                # see what self.split_segments_into_runs returns - it is a list with separate runs and directions
-                separate_runs_and_directions["all_runs"].extend(temp[0])
-                separate_runs_and_directions["directions"].extend(temp[1])
-        return separate_runs_and_directions
+    @staticmethod
+    def run_table(signal, annotation):
+        """
+        this function finds all the runs in the signal in one vectorized pass and returns them as a table of three
+        arrays of equal length:
+        starts - the index of the first sample of each run
+        lengths - the length of each run
+        directions - 1 for decelerating, -1 for accelerating and 0 for no change runs
+        the signal is split into "clean" segments on the annotations which are not 0, the first sample of each clean
+        segment is just a reference and cannot be a part of a run (we do not know where the run started - possibly
+        before the beginning of the recording or before the "incorrect" (e.g. extrasystolic) sample)
+        :param signal: the signal, e.g. the RR intervals time series
+        :param annotation: the annotations, 0 means "correct" sample
+        :return: starts, lengths, directions
+        """
+        signal = asarray(signal)
+        annotation = asarray(annotation)
+        good = annotation == 0
+        # the direction of each step between consecutive samples and whether the step lies inside a clean segment
+        steps = sign(diff(signal))
+        valid = good[:-1] & good[1:]
+        # a run starts at a valid step preceded by an invalid step or by a step of a different direction
+        # and it ends at a valid step followed by an invalid step or by a step of a different direction
+        changed = steps[1:] != steps[:-1]
+        starts = flatnonzero(valid & concatenate(([True], ~valid[:-1] | changed)))
+        ends = flatnonzero(valid & concatenate((~valid[1:] | changed, [True]))) + 1
+        return starts + 1, ends - starts, steps[starts]
 
     def count_for_all(self, signal):
         if (len(signal.signal) < 2):
@@ -112,55 +70,183 @@ class Runs:
         # this functon counts all the runs of a specific type (decelerations, accelerations, no change)
         # up to the maximum values
         # e.g. if there is only one deceleration run of the type 1 2 3 4 5, the result will be
-        # decelerations = [0,0,0,0,1], accelerations = NULL, neutral = NULL
-        split_signal = self.split_all_into_runs(signal)
-        directions = split_signal["directions"]
-        dec_runs = [split_signal["all_runs"][i] for i in range(len(directions)) if directions[i] == "dec"]
-        # list comprehension to extract deceleration runs
-        # example a = [1, 2, 1, 1]; b = ["dec", "acc", "dec", "acc"]; [a[i] for i in range(len(b)) if b[i] == "dec"; [1, 2, 1]
-        acc_runs = [split_signal["all_runs"][i] for i in range(len(directions)) if directions[i] == "acc"] # like above
-        neutral_runs = [split_signal["all_runs"][i] for i in range(len(directions)) if directions[i] == "neutral"]
-
-        # these variables are lists of lengths of runs, so if dec runs is [[1,2], [1,2,3]] then the dec_runs_count
-        # will be [2, 3]
-        dec_runs_count = [len(a) for a in dec_runs]
-        acc_runs_count = [len(a) for a in acc_runs]
-        neutral_runs_count = [len(a) for a in neutral_runs]
-
-        try:
-            max_dec = max(dec_runs_count)
-        except ValueError:
-            max_dec = 0
-
-        try:
-            max_acc = max(acc_runs_count)
-        except ValueError:
-            max_acc = 0
-
-        try:
-            max_neutral = max(neutral_runs_count)
-        except ValueError:
-            max_neutral = 0
-
-        dec_runs_all = [0] * max_dec
-        acc_runs_all = [0] * max_acc
-        neutral_runs_all = [0] * max_neutral
-
-        for idx_dec in range(1, max_dec + 1):
-            # basically, return 1 if a given deceleration run in dec_runs_count is of idx_dec length and then sum
-            # the ones, in this way the deceleration runs of length idx_dec will be counted
-            for i in range(len(dec_runs_count)):
-                if dec_runs_count[i] == idx_dec:
-                    dec_runs_all[idx_dec-1] += 1 # necessary to address the list element correctly
-        
-        for idx_acc in range(1, max_acc + 1):
-            for i in range(len(acc_runs_count)):
-                if acc_runs_count[i] == idx_acc:
-                    acc_runs_all[idx_acc-1] += 1
-
-        for idx_neutral in range(1, max_neutral + 1):
-            for i in range(len(neutral_runs_count)):
-                    if neutral_runs_count[i] == idx_neutral:
-                        neutral_runs_all[idx_neutral - 1] += 1
-
+        # decelerations = [0,0,0,1], accelerations = [], neutral = []
+        good = asarray(signal.annotation) == 0
+        # a clean segment must hold at least two samples - one reference sample and one sample in a run
+        previous_good = concatenate(([False], good[:-1]))
+        next_good = concatenate((good[1:], [False]))
+        if (good & ~previous_good & ~next_good).any():
+            raise WrongSignal
+        starts, lengths, directions = self.run_table(signal.signal, signal.annotation)
+        # the histograms - e.g. if the lengths of the deceleration runs are [2, 3, 2] then dec_runs_all will be
+        # [0, 2, 1], i.e. the number of runs of length 1, 2, 3 ...
+        dec_runs_all = self.count_lengths(lengths[directions == 1])
+        acc_runs_all = self.count_lengths(lengths[directions == -1])
+        neutral_runs_all = self.count_lengths(lengths[directions == 0])
         return dec_runs_all, acc_runs_all, neutral_runs_all
+
+    @staticmethod
+    def count_lengths(lengths):
+        # the number of runs of length 1, 2, ... up to the longest run, as a list
+        if len(lengths) == 0:
+            return []
+        return bincount(lengths)[1:].tolist()
+
+
+class RunsAccumulator:
+    """
+    This class counts the runs like the Runs class, but the signal may be given in consecutive chunks of any length -
+    the run which is still open at the end of a chunk, the last sample and the state of the annotations are carried over
+    to the next chunk, so the result does not depend on where the signal has been cut.
+    The histograms are available as dec_runs, acc_runs and neutral_runs after the finish method has been called.
+    """
+    def __init__(self):
+        # the histograms, as lists of counts of runs of length 1, 2, ...
+        self.histograms = {1: [], -1: [], 0: []}
+        self.last = None # the last sample and its annotation
+        self.previous_good = False # is the sample before the last one "correct"
+        self.open_run = None # the direction and the length of the run which may continue in the next chunk
+        self.samples = 0
+        self.runs = None
+        self.dec_runs, self.acc_runs, self.neutral_runs = None, None, None
+
+    def update(self, signal, annotation):
+        """
+        adds the next chunk of the signal
+        :param signal: the next part of the signal
+        :param annotation: its annotations, 0 means "correct" sample
+        :return: the accumulator itself
+        """
+        signal = asarray(signal)
+        annotation = asarray(annotation)
+        if len(signal) == 0:
+            return self
+        self.samples += len(signal)
+        if self.last is not None:
+            signal = concatenate(([self.last[0]], signal))
+            annotation = concatenate(([self.last[1]], annotation))
+        good = annotation == 0
+        # a clean segment must hold at least two samples - the last sample is checked in the next chunk
+        previous_good = concatenate(([self.previous_good], good[:-2]))
+        if (good[:-1] & ~previous_good & ~good[1:]).any():
+            raise WrongSignal
+        starts, lengths, directions = Runs.run_table(signal, annotation)
+        ends = starts + lengths
+        if self.open_run is not None:
+            if len(starts) > 0 and starts[0] == 1 and directions[0] == self.open_run[0]:
+                # the first run of this chunk is the continuation of the open run
+                lengths[0] += self.open_run[1]
+            else:
+                self.count_run(*self.open_run)
+            self.open_run = None
+        if len(starts) > 0 and ends[-1] == len(signal):
+            # the last run reaches the end of the chunk, so it may be continued in the next one
+            self.open_run = (directions[-1], lengths[-1])
+            lengths, directions = lengths[:-1], directions[:-1]
+        for direction in (1, -1, 0):
+            self.add_lengths(direction, Runs.count_lengths(lengths[directions == direction]))
+        self.previous_good = good[-2] if len(good) > 1 else self.previous_good
+        self.last = (signal[-1], annotation[-1])
+        return self
+
+    def count_run(self, direction, length):
+        self.add_lengths(direction, [0] * (length - 1) + [1])
+
+    def add_lengths(self, direction, counts):
+        histogram = self.histograms[direction]
+        histogram.extend([0] * (len(counts) - len(histogram)))
+        for index, count in enumerate(counts):
+            histogram[index] += count
+
+    def finish(self):
+        """
+        closes the last run and checks the end of the signal
+        :return: dec_runs, acc_runs, neutral_runs - as in the Runs class
+        """
+        if self.samples < 2:
+            raise WrongSignal
+        if self.last[1] == 0 and not self.previous_good:
+            raise WrongSignal
+        if self.open_run is not None:
+            self.count_run(*self.open_run)
+            self.open_run = None
+        self.dec_runs, self.acc_runs, self.neutral_runs = self.histograms[1], self.histograms[-1], self.histograms[0]
+        self.runs = self.dec_runs, self.acc_runs, self.neutral_runs
+        return self.runs
+
+
+class WindowedRuns:
+    """
+    This class counts the runs in windows, e.g. in every hour of the recording or in the sleep and wake segments. The
+    run table of the whole recording is built once (see Runs.run_table) together with the cumulative histograms of the
+    runs, so the histograms of any window are the differences of two rows of the cumulative histograms - the signal is
+    never scanned again, whatever the number of windows and their overlap.
+    The runs crossing the border of a window are assigned according to the boundary rule:
+    "start" - a run belongs to the window holding its first sample,
+    "end" - a run belongs to the window holding its last sample,
+    "drop" - a run belongs to a window only if all its samples are in the window
+    (the reference sample preceding a run is not a part of the run).
+    dec_runs, acc_runs and neutral_runs are 2-D arrays - one row per window, the columns hold the numbers of runs of
+    length 1, 2, ... up to the longest run of the given type in the whole recording.
+    """
+    boundary_rules = ("start", "end", "drop")
+
+    def __init__(self, signal, window=None, step=None, in_time=False, boundary="start", segments=None):
+        """
+        :param signal: object of Signal class
+        :param window: the length of the window in beats or, if in_time is True, in the units of signal.timetrack
+        :param step: the distance between the beginnings of consecutive windows, None means window (no overlap)
+        :param in_time: the window and the step are given in time, not in beats
+        :param boundary: the rule for the runs crossing the borders of the windows - "start", "end" or "drop"
+        :param segments: instead of the regular windows - a list of [first beat, beat after the last beat] of any
+        windows, e.g. of the sleep and wake segments
+        """
+        if boundary not in self.boundary_rules:
+            raise WrongBoundary(boundary)
+        self.boundary = boundary
+        if segments is not None:
+            segments = asarray(segments, dtype=int).reshape(-1, 2)
+            self.window_starts, self.window_ends = segments[:, 0], segments[:, 1]
+        else:
+            step = window if step is None else step
+            if in_time:
+                self.window_starts, self.window_ends = time_windows(signal.timetrack, window, step)
+            else:
+                self.window_starts, self.window_ends = beat_windows(len(signal.signal), window, step)
+        starts, lengths, directions = Runs.run_table(signal.signal, signal.annotation)
+        self.dec_runs, self.acc_runs, self.neutral_runs = (self.count_in_windows(starts[directions == direction],
+                                                                                 lengths[directions == direction])
+                                                           for direction in (1, -1, 0))
+        self.runs = self.dec_runs, self.acc_runs, self.neutral_runs
+
+    @staticmethod
+    def cumulative_histograms(lengths):
+        """
+        :param lengths: the lengths of the consecutive runs of one type
+        :return: array (runs + 1, longest run) - row k holds the histogram of the first k runs
+        """
+        longest = lengths.max() if len(lengths) > 0 else 0
+        cumulative = zeros((len(lengths) + 1, longest), dtype=int)
+        for length in range(1, longest + 1):
+            cumulative[1:, length - 1] = cumsum(lengths == length)
+        return cumulative
+
+    def count_in_windows(self, starts, lengths):
+        """
+        :param starts: the first samples of the consecutive runs of one type
+        :param lengths: their lengths
+        :return: array (windows, longest run) with the histogram of the runs in each window
+        """
+        cumulative = self.cumulative_histograms(lengths)
+        # the runs do not overlap, so both their first and their last samples are sorted
+        ends = starts + lengths - 1
+        if self.boundary == "start":
+            first_runs = searchsorted(starts, self.window_starts)
+            last_runs = searchsorted(starts, self.window_ends)
+        elif self.boundary == "end":
+            first_runs = searchsorted(ends, self.window_starts)
+            last_runs = searchsorted(ends, self.window_ends)
+        else:
+            first_runs = searchsorted(starts, self.window_starts)
+            last_runs = maximum(searchsorted(ends, self.window_ends), first_runs)
+        return cumulative[last_runs] - cumulative[first_runs]
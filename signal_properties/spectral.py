@@ -1,112 +1,346 @@
 from signal_properties.my_exceptions import WrongCuts
-import scipy
+from signal_properties.windows import time_windows
 import scipy.signal as sc
+import scipy.fft
 import numpy as np
+from math import factorial
 
 
 class LombScargleSpectrum:
-    def __init__(self, signal):
+    def __init__(self, signal, engine="scipy", max_frequency=None, resolution=None):
+        # engine - "scipy" is the reference engine (scipy.signal.lombscargle, O(n^2)), "fast" is the O(n log n)
+        # engine of Press and Rybicki (see fast_lombscargle)
+        # max_frequency - the spectrum is calculated only below this frequency, e.g. the highest cut of the bands of
+        # interest; None means: up to 2*pi
+        # resolution - the spacing of the frequencies; None means: the spacing of the original grid, i.e. 2*pi divided
+        # into as many frequencies as there are beats - the band powers do not change then when max_frequency is set
+        self.engine = engine
+        self.max_frequency = max_frequency
         self.filtered_signal, self.filtered_time_track = self.filter_and_timetrack(signal)
+        self.resolution = resolution
+        if self.resolution is None:
+            self.resolution = (2*np.pi - 0.01) / max(len(self.filtered_time_track) - 1, 1)
         self.periodogram, self.frequency = self.build_spectrum()
-        # self.bands = self.get_bands(cuts=[0, 0.003, 0.04, 0.15, 0.4], df=self.frequency[1]-self.frequency[0]) # this
+        self.cumulative_periodogram = None # the cumulative sum of the periodogram, see get_bands
+        self.cumulative_periodogram_of = None # ... and the periodogram it has been calculated for
+        # self.bands = self.get_bands(cuts=[0, 0.003, 0.04, 0.15, 0.4], df=self.resolution) # this
         # is basically the result which is expected in HRV - depending on the length of the recording the first two
         # entries may be combined to VLF in short recordings
 
-    def filter_and_timetrack(self, signal):
+    @staticmethod
+    def filter_and_timetrack(signal):
         # this function prepares data for Lomb-Scargle - i.e. filtered cumulative sum of time,   filtered signal
-        bad_beats = scipy.where(signal.annotation != 0)[0]
-        filtered_timetrack = scipy.delete(signal.timetrack, bad_beats)
-        filtered_signal = scipy.delete(signal.signal, bad_beats)
-        return filtered_signal, filtered_timetrack
+        good_beats = np.asarray(signal.annotation) == 0
+        return np.asarray(signal.signal)[good_beats], np.asarray(signal.timetrack)[good_beats]
 
-    def build_spectrum(self):
-        frequency = scipy.linspace(0.01, 2*scipy.pi, len(self.filtered_time_track))
+    def frequency_grid(self):
+        """
+        the (angular) frequencies of the spectrum - evenly spaced from 0.01, self.resolution apart, up to 2*pi or
+        below self.max_frequency
+        """
+        n = len(self.filtered_time_track)
+        if self.resolution == (2*np.pi - 0.01) / max(n - 1, 1):
+            # exactly the frequencies of the original grid
+            frequency = np.linspace(0.01, 2*np.pi, n)
+        elif self.max_frequency is None:
+            frequency = 0.01 + self.resolution * np.arange(int(np.floor((2*np.pi - 0.01) / self.resolution)) + 1)
+        else:
+            frequency = 0.01 + self.resolution * np.arange(max(int(np.ceil((self.max_frequency - 0.01) /
+                                                                             self.resolution)), 0))
+        if self.max_frequency is not None:
+            frequency = frequency[:np.searchsorted(frequency, self.max_frequency)]
+        return frequency
+
+    def build_spectrum(self, frequency=None):
+        # frequency - the (angular) frequencies of the spectrum, None means self.frequency_grid()
+        if frequency is None:
+            frequency = self.frequency_grid()
         # here the assumption is that the frequencies are below 1Hz
         # which obviously may not be true
-        periodogram = scisignal.lombscargle(self.filtered_time_track, self.filtered_signal, frequency) / len(self.filtered_time_track) * 4 * self.filtered_time_track[len(self.filtered_time_track)-1] / (2*scipy.pi) / 2
+        if len(frequency) == 0:
+            periodogram = np.zeros(0)
+        elif self.engine == "fast":
+            periodogram = self.fast_lombscargle(self.filtered_time_track, self.filtered_signal, frequency)
+        else:
+            periodogram = sc.lombscargle(self.filtered_time_track, self.filtered_signal, frequency)
+        periodogram = periodogram / len(self.filtered_time_track) * 4 * self.filtered_time_track[len(self.filtered_time_track)-1] / (2*np.pi) / 2
         return periodogram, frequency
 
+    @staticmethod
+    def fast_lombscargle(time_track, signal, frequency, oversampling=10, m_fft=6):
+        """
+        the fast, O(n log n), Lomb-Scargle periodogram - Press, Rybicki, "Fast algorithm for spectral analysis of
+        unevenly sampled data", The Astrophysical Journal 338, 277-280 (1989)
+        the trigonometric sums of the periodogram are calculated with the FFT, after "extirpolating" the data to a
+        regular grid; the result is the same (unnormalized) periodogram as the one of scipy.signal.lombscargle - with the
+        default settings the relative error of the power in the bands (see get_bands) is below 1e-4 (see the tests)
+        :param time_track: the times of the samples
+        :param signal: the values of the samples
+        :param frequency: the angular frequencies - they MUST be evenly spaced, like the ones in build_spectrum
+        :param oversampling: the size of the FFT grid relative to the number of frequencies
+        :param m_fft: the number of the grid points each sample is extirpolated to
+        :return: the periodogram
+        """
+        n_frequencies = len(frequency)
+        f0 = frequency[0] / (2*np.pi)
+        df = (frequency[-1] - frequency[0]) / max(n_frequencies - 1, 1) / (2*np.pi)
+        # sums of signal * cos(omega t), signal * sin(omega t), cos(2 omega t), sin(2 omega t)
+        C, S = LombScargleSpectrum.trig_sum(time_track, signal, df, n_frequencies, f0, 1, oversampling, m_fft)
+        C2, S2 = LombScargleSpectrum.trig_sum(time_track, np.ones(len(time_track)), df, n_frequencies, f0, 2,
+                                              oversampling, m_fft)
+        return LombScargleSpectrum.periodogram_from_sums(C, S, C2, S2, len(time_track))
+
+    @staticmethod
+    def periodogram_from_sums(C, S, C2, S2, n):
+        """
+        the Lomb-Scargle periodogram from the trigonometric sums - C = sum(signal * cos(omega t)),
+        S = sum(signal * sin(omega t)), C2 = sum(cos(2 omega t)), S2 = sum(sin(2 omega t)) over the n samples
+        """
+        # the time shift tau of the Lomb-Scargle periodogram, tan(2 omega tau) = S2 / C2
+        omega_tau = 0.5 * np.arctan2(S2, C2)
+        cos_tau, sin_tau = np.cos(omega_tau), np.sin(omega_tau)
+        cos_2tau, sin_2tau = np.cos(2 * omega_tau), np.sin(2 * omega_tau)
+        YC = C * cos_tau + S * sin_tau
+        YS = S * cos_tau - C * sin_tau
+        CC = 0.5 * (n + C2 * cos_2tau + S2 * sin_2tau)
+        SS = 0.5 * (n - C2 * cos_2tau - S2 * sin_2tau)
+        return 0.5 * (YC**2 / CC + YS**2 / SS)
+
+    @staticmethod
+    def trig_sum(time_track, values, df, n_frequencies, f0, frequency_factor, oversampling, m_fft):
+        """
+        the sums of values * cos(2 pi f t) and values * sin(2 pi f t) for f = frequency_factor * (f0 + df * k),
+        k = 0, ..., n_frequencies - 1, calculated with one FFT
+        :return: the cosine sums, the sine sums
+        """
+        df = df * frequency_factor
+        f0 = f0 * frequency_factor
+        n_fft = 2 ** int(np.ceil(np.log2(n_frequencies * oversampling)))
+        t0 = np.min(time_track)
+        values = values * np.exp(2j * np.pi * f0 * (time_track - t0))
+        # the times on the FFT grid - the grid is periodic with the period 1 / df
+        grid_time = ((time_track - t0) * n_fft * df) % n_fft
+        fft_grid = np.fft.ifft(LombScargleSpectrum.extirpolate(grid_time, values, n_fft, m_fft))[:n_frequencies]
+        fft_grid *= n_fft * np.exp(2j * np.pi * t0 * (f0 + df * np.arange(n_frequencies)))
+        return fft_grid.real, fft_grid.imag
+
+    @staticmethod
+    def extirpolate(x, y, n, m):
+        """
+        "extirpolation" (the reverse of interpolation) of the values y at the points x to the grid 0, 1, ..., n-1 -
+        each value is spread over m neighbouring grid points with the Lagrange interpolation weights, so that
+        sum(y * g(x)) == sum(grid * g(grid points)) for any polynomial g of degree < m
+        :return: the values on the grid
+        """
+        result = np.zeros(n, dtype=y.dtype)
+        # the points which lie exactly on the grid
+        on_grid = x % 1 == 0
+        np.add.at(result, x[on_grid].astype(int), y[on_grid])
+        x, y = x[~on_grid], y[~on_grid]
+        # the first of the m grid points of each value
+        first_point = np.clip((x - m // 2).astype(int), 0, n - m)
+        numerator = y * np.prod(x - first_point - np.arange(m)[:, np.newaxis], 0)
+        denominator = factorial(m - 1)
+        for j in range(m):
+            if j > 0:
+                denominator *= j / (j - m)
+            grid_point = first_point + (m - 1 - j)
+            np.add.at(result, grid_point, numerator / (denominator * (x - grid_point)))
+        return result
+
     def get_bands(self, cuts, df):
         self.test_cuts(cuts)
-        # cuts is a list holding the frequency bands of interest
+        # cuts is a list holding the frequency bands of interest, a band includes its lower cut, but not the upper one
         # df is the integration measure
-        first = cuts[0]
-        power_in_bands = []
-        for second in cuts[1:]:
-            # no interpolation since th frequencies are closely spaced in self.frequency (see the build_spectrum method)
-            first_index = scipy.where(self.frequency >= first)[0]
-            second_index = scipy.where(self.frequency >= second)[0]
-            # print(first_index, second_index, self.frequency[0])
-            if first_index[0] == second_index[0]:
-                # here, if there is no power in the first band, and there is some in the following one,
-                # this condition must hold
-                power_in_bands.append(0.0)
-                first = second # go to the next band
-            elif len(second_index > 0): # if there is any power in the band above the current band
-                power_in_bands.append(sum(self.periodogram[first_index[-1]:second_index[0]]))
-                first = second
-            elif len(first_index) >= 1: # so, there is no power in the band above - is there any power
-                power_in_bands.append(sum(self.periodogram[first_index[0]:first_index[-1]]))
-                break
-            else:
-                break
-        print("dupa", power_in_bands * df)
-        return scipy.array(power_in_bands) * df
-
-    def test_cuts(self, cuts):
-        if len(cuts) != len(scipy.unique(cuts)) or (cuts != sorted(cuts)):
+        # the power in the bands is read from the cumulative sum of the periodogram, which is calculated only once, so
+        # any number of band definitions can be evaluated on the same spectrum at almost no cost
+        if self.cumulative_periodogram_of is not self.periodogram:
+            self.cumulative_periodogram = np.concatenate(([0.0], np.cumsum(self.periodogram)))
+            self.cumulative_periodogram_of = self.periodogram
+        return self.band_powers(self.cumulative_periodogram, self.frequency, cuts, df)
+
+    @staticmethod
+    def band_powers(cumulative_periodogram, frequency, cuts, df):
+        """
+        the power in the bands from the cumulative sum of the periodogram (with a leading 0) along its last axis
+        """
+        # no interpolation since the frequencies are closely spaced in self.frequency (see the build_spectrum method)
+        # the first frequency of each band - a cut above the highest frequency points to the end of the spectrum
+        cut_indices = np.searchsorted(frequency, cuts)
+        return np.diff(cumulative_periodogram[..., cut_indices], axis=-1) * df
+
+    @staticmethod
+    def test_cuts(cuts):
+        if len(cuts) != len(np.unique(cuts)) or (list(cuts) != sorted(cuts)):
             raise WrongCuts
 
 
-class FFTSpectrum:
+class LombScargleSpectrogram:
+    """
+    This class calculates the Lomb-Scargle periodograms in time windows sliding along the filtered timetrack, e.g. in
+    5-minute windows with 50% overlap over a 24h recording. All the windows share one frequency grid, so the result is
+    a 2-D array of power (windows x frequencies) plus the power in the bands for each window.
+    The trigonometric sums of the periodogram are accumulated once over all the beats, for a block of frequencies at a
+    time, and the sums of each window are differences of two rows of these cumulative sums - there is no loop over the
+    windows and the cost does not depend on their overlap.
+    The periodogram of each window is the same as the one of LombScargleSpectrum calculated for the window alone, with
+    its mean removed, on the same (angular) frequencies (with the timetrack of the window starting at 0).
+    The cuts of the bands, the frequencies and the resolution are in Hz (the timetrack is in time_unit units per second,
+    by default in ms), like in FFTSpectrum - the periodograms themselves are calculated at the angular frequencies, in
+    radians per unit of the timetrack (angular_frequency), and the band powers are integrated over them, as in
+    LombScargleSpectrum.
+    """
+    def __init__(self, signal, window, step=None, bands=[0, 0.04, 0.15, 0.4], resolution=None, time_unit=1000,
+                 max_frequencies=1024, block_size=2**20):
+        """
+        :param signal: object of Signal class
+        :param window: the length of the windows, in the units of the timetrack
+        :param step: the distance between the beginnings of consecutive windows, None means window (no overlap)
+        :param bands: the cuts of the bands in Hz; with the default cuts the bands are VLF, LF, HF (in short windows the
+        ULF band cannot be separated from VLF)
+        :param resolution: the spacing of the frequencies in Hz, None means the resolution of the window (1 / its
+        length in seconds), but no more than max_frequencies frequencies; the frequencies run from resolution up to the
+        highest cut of the bands
+        :param time_unit: the number of the units of the timetrack in a second, 1000 means ms
+        :param max_frequencies: the limit of the number of the frequencies of the default grid
+        :param block_size: the maximum number of (beat, frequency) elements processed at once - limits the memory used
+        """
+        LombScargleSpectrum.test_cuts(bands)
+        step = window if step is None else step
+        self.cuts = list(bands)
+        if resolution is None:
+            resolution = max(time_unit / window, max(bands) / max_frequencies)
+        self.resolution = resolution
+        self.frequency = self.resolution * np.arange(1, int(np.ceil(max(bands) / self.resolution)))
+        self.angular_frequency = 2*np.pi / time_unit * self.frequency
+        self.angular_resolution = 2*np.pi / time_unit * self.resolution
+        self.filtered_signal, self.filtered_time_track = LombScargleSpectrum.filter_and_timetrack(signal)
+        self.window_starts, self.window_ends = time_windows(self.filtered_time_track, window, step)
+        self.power = self.build_spectrogram(block_size)
+        cumulative_power = np.concatenate((np.zeros((len(self.power), 1)), np.cumsum(self.power, axis=1)), axis=1)
+        self.band_powers = LombScargleSpectrum.band_powers(cumulative_power, self.frequency, self.cuts,
+                                                           self.angular_resolution)
+        self.TP = self.band_powers.sum(axis=1)
+        if len(self.cuts) == 4:
+            self.VLF, self.LF, self.HF = self.band_powers.T
+        else:
+            self.VLF, self.LF, self.HF = None, None, None
 
-    def __init__(self, signal, resampling_rate):
-        self.filtered_signal, self.filtered_time_track = FFTSpectrum.filter_and_timetrack(signal)
+    def build_spectrogram(self, block_size):
+        """
+        :return: the periodograms of the windows, array (windows, frequencies), nan for the windows with less than two
+        beats - the signal of each window has its mean removed, otherwise the mean (e.g. 800 ms) leaks into all the
+        bands when the beats are unevenly spaced
+        """
+        time_track = self.filtered_time_track - (self.filtered_time_track[0] if len(self.filtered_time_track) else 0)
+        signal = np.asarray(self.filtered_signal, dtype=float)
+        signal = signal - (signal.mean() if len(signal) else 0)
+        starts, ends = self.window_starts, self.window_ends
+        n = (ends - starts)[:, None]
+        cumulative_signal = np.concatenate(([0.0], np.cumsum(signal)))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            window_means = ((cumulative_signal[ends] - cumulative_signal[starts]) / (ends - starts))[:, None]
+        # the sums of signal * cos, signal * sin, cos(2 phase), sin(2 phase), cos, sin - the last two remove the means
+        sums = [np.zeros((len(starts), len(self.angular_frequency))) for _ in range(6)]
+        frequencies_in_block = max(1, block_size // max(len(time_track), 1))
+        for first in range(0, len(self.angular_frequency), frequencies_in_block):
+            block = slice(first, first + frequencies_in_block)
+            phase = np.outer(time_track, self.angular_frequency[block])
+            cos_phase, sin_phase = np.cos(phase), np.sin(phase)
+            terms = (signal[:, None] * cos_phase, signal[:, None] * sin_phase, cos_phase**2 - sin_phase**2,
+                     2 * sin_phase * cos_phase, cos_phase, sin_phase)
+            for window_sums, term in zip(sums, terms):
+                cumulative = np.zeros((len(time_track) + 1, term.shape[1]))
+                np.cumsum(term, axis=0, out=cumulative[1:])
+                window_sums[:, block] = cumulative[ends] - cumulative[starts]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            C, S = sums[0] - window_means * sums[4], sums[1] - window_means * sums[5]
+            periodogram = LombScargleSpectrum.periodogram_from_sums(C, S, sums[2], sums[3], n)
+            # the normalization of LombScargleSpectrum, with the duration of the window
+            duration = (time_track[np.maximum(ends - 1, starts)] - time_track[starts])[:, None]
+            periodogram = periodogram / n * 4 * duration / (2*np.pi) / 2
+        periodogram[(n < 2)[:, 0]] = np.nan
+        return periodogram
+
+
+class FFTSpectrum:
+    """
+    This class calculates the power spectral density of the signal with the FFT - the filtered signal is resampled
+    (linearly interpolated) at resampling_rate Hz, and its periodogram is calculated with the real FFT, on the whole
+    recording or averaged over overlapping segments (the Welch method), which lowers the variance of the estimate and
+    the memory used on long recordings. This is far cheaper than the Lomb-Scargle spectrum of long recordings.
+    The periodogram is one-sided and it is normalized so that its sum times the resolution is the variance of the
+    resampled signal, the frequencies are in Hz (the timetrack is in time_unit units per second, by default in ms), so
+    the band powers of get_bands - the same as the ones of LombScargleSpectrum - are the variances in the bands.
+    """
+    def __init__(self, signal, resampling_rate=4, segment=None, overlap=0.5, fast_length=True, time_unit=1000,
+                 block_size=2**22):
+        """
+        :param signal: object of Signal class
+        :param resampling_rate: the rate of the resampled signal, in Hz
+        :param segment: the length of the Welch segments, in seconds, None means the whole recording in one segment
+        :param overlap: the overlap of the consecutive segments, as a fraction of their length
+        :param fast_length: pad each segment with zeros to the nearest length whose prime factors are only 2, 3 and 5
+        (see scipy.fft.next_fast_len), for which the FFT is fastest
+        :param time_unit: the number of the units of the timetrack in a second, 1000 means ms
+        :param block_size: the maximum number of the samples of the segments transformed at once - limits the memory
+        used
+        """
         self.resampling_rate = resampling_rate # this is the resampling FREQUENCY (in Hz)
-        self.magnitude, self.phase, self.frequency = FFTSpectrum.build_fft_spectrum(self.filtered_signal, self.filtered_time_track, self.resampling_rate)
-        # self.bands = self.get_bands(cuts=[0, 0.003, 0.04, 0.15, 0.4], df=self.frequency[1]-self.frequency[0]) this
-        # is basically the result which is expected in HRV - depending on the length of the recording the first two
-        # entries may be combined to VLF in short recordings
+        self.filtered_signal, self.filtered_time_track = LombScargleSpectrum.filter_and_timetrack(signal)
+        self.resampled_signal = self.resample(self.filtered_signal, self.filtered_time_track,
+                                              time_unit / resampling_rate)
+        n = len(self.resampled_signal)
+        self.segment_length = n if segment is None else min(n, max(int(round(segment * resampling_rate)), 2))
+        self.step = max(int(round(self.segment_length * (1 - overlap))), 1)
+        self.n_fft = scipy.fft.next_fast_len(max(self.segment_length, 1), real=True) if fast_length \
+            else self.segment_length
+        self.resolution = resampling_rate / max(self.n_fft, 1)
+        self.frequency = np.fft.rfftfreq(self.n_fft, d=1 / resampling_rate) if n >= 2 else np.zeros(0)
+        self.periodogram = self.build_spectrum(block_size) if n >= 2 else np.zeros(0)
+        self.cumulative_periodogram = None # the cumulative sum of the periodogram, see get_bands
+        self.cumulative_periodogram_of = None # ... and the periodogram it has been calculated for
 
     @staticmethod
-    def filter_and_timetrack(signal):
-        # this function prepares data for Lomb-Scargle and FFT periodograms - i.e. filtered cumulative sum of time,
-        # filtered signal
-        bad_beats = scipy.where(signal.annotation != 0)[0]
-        filtered_timetrack = scipy.delete(signal.timetrack, bad_beats)
-        filtered_signal = scipy.delete(signal.signal, bad_beats)
-        return filtered_signal, filtered_timetrack
+    def resample(signal, time_track, time_step):
+        """
+        :param time_step: the spacing of the resampled signal, in the units of the timetrack
+        :return: the signal linearly interpolated on the regular grid from the first to the last sample
+        """
+        if len(time_track) < 2:
+            return np.zeros(0)
+        # the grid is built from the number of its points, so that the rounding errors of the step do not add up
+        points = int(np.floor((time_track[-1] - time_track[0]) / time_step)) + 1
+        return np.interp(time_track[0] + time_step * np.arange(points), time_track, signal)
 
-    @staticmethod
-    def resample(signal, time_track, resampling_rate):
-        # this method does not use the object in which it is enclosed, so I am making it static
-        from scipy.interpolate import interp1d
-        f_interp = interp1d(time_track, signal)
-        time_step = 1 / resampling_rate * 1000
-        print(time_step)
-        time_track_resampled = np.arange(np.min(time_track), np.max(time_track), step=time_step)
-        signal_resampled = f_interp(time_track_resampled)
-        return signal_resampled, time_track_resampled
+    def build_spectrum(self, block_size):
+        """
+        :return: the one-sided periodogram averaged over the segments - each segment has its mean removed and it is
+        weighted with the Hann window (not if there is only the whole recording)
+        """
+        starts = np.arange(0, len(self.resampled_signal) - self.segment_length + 1, self.step)
+        window = np.hanning(self.segment_length) if len(starts) > 1 else np.ones(self.segment_length)
+        periodogram = np.zeros(len(self.frequency))
+        # the segments are transformed a block at a time
+        segments_in_block = max(1, block_size // self.segment_length)
+        for first in range(0, len(starts), segments_in_block):
+            segments = self.resampled_signal[starts[first:first + segments_in_block, None] +
+                                             np.arange(self.segment_length)]
+            segments = (segments - segments.mean(axis=1, keepdims=True)) * window
+            periodogram += (np.abs(np.fft.rfft(segments, n=self.n_fft, axis=1))**2).sum(axis=0)
+        periodogram /= len(starts) * self.resampling_rate * np.sum(window**2)
+        # the negative frequencies are folded onto the positive ones - all but 0 and the Nyquist frequency
+        periodogram[1:(self.n_fft + 1) // 2] *= 2
+        return periodogram
 
-    @staticmethod
-    def build_fft_spectrum(signal, time_track, resampling_rate):
-        # fft method, uses resampling for fft calculations with resampling rate passed to the function
-        # ARGUMENTS
-        # signal - the signal after filtering, e.g. RR intervals time series after filtering
-        # time_track - the time track  after filtering, effectively cum summed filtered
-        #     RR intervals time series
-        # resampling rate - the rate (in Hz) at which the signal (and the time - track) is to be resampled
-        # RETURNS
-        # magnitude - magnitude of the fft
-        # phase - phase of the fft
-        # frequency axis - frequency axis (from minimum to maximum (in the middle, and back)
-
-        # now, since we want this to be a static method, we will call the resample function form the class
-        signal_resampled, time_track_resampled = FFTSpectrum.resample(signal, time_track, resampling_rate)
-        print(len(signal_resampled))
-        X = np.fft.fft(signal_resampled)
-        fundamental_frequency = 1 / time_track_resampled[-1]
-        frequency_axis = np.cumsum(np.arange(len(time_track_resampled))) * fundamental_frequency
-        magnitude = np.abs(X)
-        phase = np.angle(X)
-        return magnitude, phase, frequency_axis
+    def get_bands(self, cuts, df):
+        """
+        the power in the bands, as in LombScargleSpectrum.get_bands
+        :param cuts: the cuts of the bands in Hz, a band includes its lower cut, but not the upper one
+        :param df: the integration measure, self.resolution
+        """
+        LombScargleSpectrum.test_cuts(cuts)
+        if self.cumulative_periodogram_of is not self.periodogram:
+            self.cumulative_periodogram = np.concatenate(([0.0], np.cumsum(self.periodogram)))
+            self.cumulative_periodogram_of = self.periodogram
+        return LombScargleSpectrum.band_powers(self.cumulative_periodogram, self.frequency, cuts, df)
@@ -1,6 +1,8 @@
 import unittest
-from numpy import round
+from numpy import round, flatnonzero, concatenate, delete, array
 from signal_properties.RRclasses import Signal
+from signal_properties.Poincare import Poincare, PoincareAccumulator
+from signal_properties.my_exceptions import WrongDescriptor
 
 
 class TestPoincare(unittest.TestCase):
@@ -42,5 +44,102 @@ class TestPoincare(unittest.TestCase):
         self.assertTrue(round(self.signal_real1.poincare.SDNNa, 2) == 47.81)
         self.assertTrue(round(self.signal_real1.poincare.Ca, 2) == 0.52)
 
+
+class TestLazyPoincare(unittest.TestCase):
+
+    def setUp(self):
+        self.signal = Signal("../0001.rea", 1, 2, annotation_filter=(1, 2, 3))
+
+    def test_selected_descriptors(self):
+        self.signal.set_poincare(["SDNN", "SD1", "SD2"])
+        calculated = vars(self.signal.poincare)
+        self.assertTrue(all(name in calculated for name in ["SDNN", "SD1", "SD2"]))
+        # the asymmetry groups have not been calculated
+        self.assertFalse(any(name in calculated for name in ["short_term", "long_term", "total", "SD1d", "Ca"]))
+
+    def test_lazy_descriptors(self):
+        self.signal.set_poincare()
+        lazy = self.signal.poincare
+        self.signal.set_poincare(lazy.descriptors)
+        for name in lazy.descriptors:
+            self.assertEqual(getattr(lazy, name), getattr(self.signal.poincare, name))
+        self.assertTrue("long_term" in vars(lazy))
+
+    def test_filtered_pairs(self):
+        # the pairs left by the mask are the ones left by removing the bad beats and the beats before them
+        bad_beats = flatnonzero(self.signal.annotation == 16)
+        self.assertTrue(len(bad_beats) > 0)
+        self.signal.set_poincare()
+        all_bad_beats = concatenate((bad_beats, bad_beats - 1))
+        self.assertTrue((self.signal.poincare.xi == delete(self.signal.signal[:-1], all_bad_beats)).all())
+        self.assertTrue((self.signal.poincare.xii == delete(self.signal.signal[1:], all_bad_beats)).all())
+
+    def test_integer_signal(self):
+        # the integer signals give the same descriptors as the float ones - no casting errors, no overflow of the
+        # squared increments (here up to 600**2) in int16
+        rr = [800, 1200, 600, 1100, 700, 1300, 1250]
+        reference = Signal([[float(value) for value in rr], [0] * len(rr)])
+        reference.set_poincare(Poincare.descriptors)
+        for signal in [Signal([rr, [0] * len(rr)]), Signal.from_arrays(array(rr, dtype="int16"))]:
+            signal.set_poincare(Poincare.descriptors)
+            for name in Poincare.descriptors:
+                self.assertAlmostEqual(getattr(signal.poincare, name), getattr(reference.poincare, name))
+
+    def test_wrong_descriptor(self):
+        self.assertRaises(WrongDescriptor, self.signal.set_poincare, ["SD1", "RMSSD"])
+
+
+class TestPoincareAccumulator(unittest.TestCase):
+
+    def setUp(self):
+        self.signal = Signal("../0001.rea", 1, 2, annotation_filter=(1, 2, 3))
+        self.signal.set_poincare()
+
+    def assertSameDescriptors(self, descriptors):
+        for name, value in descriptors.items():
+            self.assertAlmostEqual(value, getattr(self.signal.poincare, name), places=8)
+
+    def test_chunks(self):
+        accumulator = PoincareAccumulator()
+        for start in range(0, len(self.signal.signal), 137):
+            accumulator.update(self.signal.signal[start:start + 137], self.signal.annotation[start:start + 137])
+        self.assertSameDescriptors(accumulator.descriptors())
+
+    def test_merge(self):
+        first = PoincareAccumulator().update(self.signal.signal[:1000], self.signal.annotation[:1000])
+        second = PoincareAccumulator().update(self.signal.signal[1000:], self.signal.annotation[1000:])
+        self.assertSameDescriptors(first.merge(second, contiguous=True).descriptors())
+        # without the pair on the border of the parts the result is different
+        self.assertNotAlmostEqual(first.merge(second).descriptors()["SD1"], self.signal.poincare.SD1, places=8)
+
+    def test_empty(self):
+        self.assertTrue(PoincareAccumulator().update([800.0]).descriptors()["SD1"] is None)
+
+
+class TestWindowedPoincare(unittest.TestCase):
+
+    def setUp(self):
+        self.signal = Signal("../0001.rea", 1, 2, 1, annotation_filter=(1, 2, 3))
+
+    def assertSameAsWindows(self, windowed):
+        for window, (start, end) in enumerate(zip(windowed.window_starts, windowed.window_ends)):
+            window_signal = Signal([self.signal.signal[start:end].copy(), self.signal.annotation[start:end].copy()])
+            window_signal.set_poincare()
+            for name, values in windowed.descriptors.items():
+                self.assertAlmostEqual(values[window], getattr(window_signal.poincare, name), places=8)
+
+    def test_windows_in_beats(self):
+        self.signal.set_windowed_poincare(300, step=50)
+        self.assertEqual(len(self.signal.windowed_poincare.SD1), (len(self.signal.signal) - 300) // 50 + 1)
+        self.assertSameAsWindows(self.signal.windowed_poincare)
+
+    def test_windows_in_time(self):
+        # 5-minute windows every minute, the timetrack is in ms
+        self.signal.set_windowed_poincare(5 * 60000, step=60000, in_time=True)
+        windowed = self.signal.windowed_poincare
+        self.assertTrue((self.signal.timetrack[windowed.window_ends - 1] - self.signal.timetrack[windowed.window_starts]
+                         < 5 * 60000).all())
+        self.assertSameAsWindows(windowed)
+
 if __name__ == '__main__':
     unittest.main()
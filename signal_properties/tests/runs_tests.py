@@ -1,6 +1,7 @@
 import unittest
 from signal_properties.RRclasses import Signal
-from signal_properties.my_exceptions import WrongSignal
+from signal_properties.my_exceptions import WrongSignal, WrongBoundary
+from signal_properties.runs import Runs, RunsAccumulator, WindowedRuns
 
 # I learned something - each test calls setup
 
@@ -68,5 +69,64 @@ class TestRuns(unittest.TestCase):
         self.assertTrue(self.signal6.runs.acc_runs == [0, 0, 2])
         self.assertTrue(self.signal6.runs.neutral_runs == [0, 1])
 
+    def test_run_table(self):
+        # signal6 - the first clean segment is 10, 9, 8, 7, the second one is 6, 6, 6, 5, 4, 3, 4, 5 (the last sample
+        # has been removed by the filter) - the first sample of each segment is only the reference
+        starts, lengths, directions = Runs.run_table(self.signal6.signal, self.signal6.annotation)
+        self.assertTrue(starts.tolist() == [1, 6, 8, 11])
+        self.assertTrue(lengths.tolist() == [3, 2, 3, 2])
+        self.assertTrue(directions.tolist() == [-1, 0, -1, 1])
+
+    def test_isolated_sample_exception(self):
+        # a clean segment made of one sample only cannot be split into runs
+        signal = Signal([[1, 2, 3, 4, 3, 2, 1], [0, 0, 1, 0, 1, 0, 0]])
+        self.assertRaises(WrongSignal, signal.set_runs)
+
+    def test_accumulator(self):
+        # the result must not depend on where the signal has been cut into chunks
+        for signal in [self.signal2, self.signal3, self.signal4, self.signal6]:
+            for chunk_size in range(1, len(signal.signal) + 1):
+                accumulator = RunsAccumulator()
+                for start in range(0, len(signal.signal), chunk_size):
+                    accumulator.update(signal.signal[start:start + chunk_size],
+                                       signal.annotation[start:start + chunk_size])
+                self.assertEqual(accumulator.finish(), signal.runs.runs)
+
+    def test_accumulator_isolated_sample_exception(self):
+        accumulator = RunsAccumulator()
+        accumulator.update([1, 2, 3], [0, 0, 1])
+        # the sample 4 is isolated, which is known as soon as its successor has been seen
+        self.assertRaises(WrongSignal, accumulator.update, [4, 3], [0, 1])
+        accumulator = RunsAccumulator()
+        accumulator.update([1, 2, 3], [0, 0, 1])
+        accumulator.update([4], [0])
+        self.assertRaises(WrongSignal, accumulator.finish)
+
+    def test_windowed_runs(self):
+        # signal6 - the runs are: acc [1, 3], no change [6, 7], acc [8, 10], dec [11, 12] (first and last sample)
+        self.signal6.set_windowed_runs(segments=[[0, 7], [7, 14]])
+        self.assertTrue(self.signal6.windowed_runs.acc_runs.tolist() == [[0, 0, 1], [0, 0, 1]])
+        self.assertTrue(self.signal6.windowed_runs.neutral_runs.tolist() == [[0, 1], [0, 0]])
+        self.signal6.set_windowed_runs(segments=[[0, 7], [7, 14]], boundary="end")
+        self.assertTrue(self.signal6.windowed_runs.neutral_runs.tolist() == [[0, 0], [0, 1]])
+        self.signal6.set_windowed_runs(segments=[[0, 7], [7, 14]], boundary="drop")
+        self.assertTrue(self.signal6.windowed_runs.neutral_runs.tolist() == [[0, 0], [0, 0]])
+        self.assertTrue(self.signal6.windowed_runs.dec_runs.tolist() == [[0, 0], [0, 1]])
+
+    def test_windowed_runs_add_up(self):
+        # non overlapping windows covering the whole signal hold all the runs
+        signal = Signal("../0001.rea", 1, 2, annotation_filter=(1, 2, 3))
+        signal.set_runs()
+        for boundary in ["start", "end"]:
+            signal.set_windowed_runs(100, boundary=boundary)
+            windowed = WindowedRuns(signal, segments=list(zip(signal.windowed_runs.window_starts,
+                                                              signal.windowed_runs.window_ends)) + [
+                [signal.windowed_runs.window_ends[-1], len(signal.signal)]], boundary=boundary)
+            for histograms, runs in zip(windowed.runs, signal.runs.runs):
+                self.assertTrue(histograms.sum(axis=0).tolist() == runs)
+
+    def test_wrong_boundary(self):
+        self.assertRaises(WrongBoundary, self.signal6.set_windowed_runs, 5, boundary="middle")
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,10 @@
 import unittest
-from signal_properties.RRclasses import Signal
-from scipy import array
+import os
+import tempfile
+import numpy
+from signal_properties.RRclasses import Signal, StreamingSignal
+from numpy import array
+from signal_properties.my_exceptions import WrongColumn
 
 
 class TestPoincareFiltering(unittest.TestCase):
@@ -24,7 +28,12 @@ class TestPoincareFiltering(unittest.TestCase):
         self.signal6 = Signal([[751, 802, 753, 804, 755, 806, 757, 808, 7059, 8010], [0, 0, 0, 1, 0, 0, 0, 0, 0, 0]],
                   square_filter = (300, 2000), annotation_filter = (1,)) # testing square filter in the middle
         self.signal6.set_poincare()
-
+        self.signal7 = Signal([[751, 802, 753, 1204, 755, 806, 757, 808, 759, 810], [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]],
+                              quotient_filter=0.2) # testing quotient filter in the middle
+        self.signal7.set_poincare()
+        self.signal8 = Signal([[400, 802, 753, 804, 755, 806, 757, 808, 759, 1810], [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]],
+                              quotient_filter=0.2) # testing quotient filter at the ends
+        self.signal8.set_poincare()
 
     def test_the_middle(self):
         self.assertTrue((self.signal1.poincare.xi == array([1, 2, 5, 6, 7, 8, 9])).all()) ## test for xi
@@ -50,5 +59,105 @@ class TestPoincareFiltering(unittest.TestCase):
         self.assertTrue((self.signal6.poincare.xi == array([751, 802, 755, 806, 757])).all())
         self.assertTrue((self.signal6.poincare.xii == array([802, 753, 806, 757, 808])).all())
 
+    def test_quotient_middle(self):
+        self.assertTrue((self.signal7.annotation == array([0, 0, 0, 16, 0, 0, 0, 0, 0, 0])).all())
+        self.assertTrue((self.signal7.poincare.xi == array([751, 802, 755, 806, 757, 808, 759])).all())
+        self.assertTrue((self.signal7.poincare.xii == array([802, 753, 806, 757, 808, 759, 810])).all())
+
+    def test_quotient_ends(self):
+        # the first and the last beats have only one neighbour
+        self.assertTrue((self.signal8.signal == array([802, 753, 804, 755, 806, 757, 808, 759])).all())
+
+    def test_no_good_beats(self):
+        signal = Signal([[1, 2, 3], [1, 1, 1]], annotation_filter=(1,))
+        self.assertEqual(len(signal.signal), 0)
+        self.assertEqual(len(signal.annotation), 0)
+
+
+class TestReadData(unittest.TestCase):
+
+    def test_columns_by_name(self):
+        by_number = Signal.read_data("../0001.rea", 1, 2, 1)
+        by_name = Signal.read_data("../0001.rea", "rri[ms]", "rr-flags[]", "rri[ms]")
+        for from_numbers, from_names in zip(by_number, by_name):
+            self.assertTrue((from_numbers == from_names).all())
+        self.assertTrue(len(by_name[0]) == 2256)
+        self.assertTrue(by_name[0][0] == 750.625)
+
+    def test_wrong_column_name(self):
+        self.assertRaises(WrongColumn, Signal.read_data, "../0001.rea", "rri", "rr-flags[]", 0)
+
+
+class TestFromArrays(unittest.TestCase):
+
+    def setUp(self):
+        signal = Signal("../0001.rea", 1, 2, 1)
+        self.rr = numpy.ascontiguousarray(signal.signal)
+        self.annotation = numpy.zeros(len(self.rr), dtype=int)
+        self.annotation[[10, 500]] = 1
+
+    def test_no_copy(self):
+        signal = Signal.from_arrays(self.rr, self.annotation, annotation_filter=(1,))
+        self.assertTrue(numpy.shares_memory(signal.signal, self.rr))
+        # the annotation is copied, so the filters do not change the data of the caller
+        self.assertFalse(numpy.shares_memory(signal.annotation, self.annotation))
+        self.assertEqual(self.annotation[10], 1)
+        signal = Signal.from_arrays(memoryview(self.rr), self.annotation, copy_annotation=False, annotation_filter=(1,))
+        self.assertTrue(numpy.shares_memory(signal.signal, self.rr))
+        self.assertTrue(numpy.shares_memory(signal.annotation, self.annotation))
+        self.assertEqual(self.annotation[10], 16)
+
+    def test_same_results(self):
+        signal = Signal([self.rr, self.annotation], annotation_filter=(1,))
+        signal.set_poincare()
+        compact_signal = Signal.from_arrays(self.rr, self.annotation, signal_dtype="float32", annotation_dtype="int8",
+                                            annotation_filter=(1,))
+        compact_signal.set_poincare()
+        self.assertEqual(compact_signal.signal.dtype, numpy.float32)
+        self.assertEqual(compact_signal.annotation.dtype, numpy.int8)
+        self.assertEqual(compact_signal.timetrack.dtype, numpy.float64)
+        self.assertTrue(numpy.allclose(compact_signal.timetrack, signal.timetrack))
+        self.assertAlmostEqual(compact_signal.poincare.SD1, signal.poincare.SD1, places=3)
+        self.assertAlmostEqual(compact_signal.poincare.SD2, signal.poincare.SD2, places=3)
+
+
+class TestStreamingSignal(unittest.TestCase):
+
+    def assertSameResults(self, path_to_file, **filters):
+        signal = Signal(path_to_file, 1, 2, 1, **filters)
+        signal.set_poincare()
+        signal.set_runs()
+        for chunk_size in [1, 7, 100, 100000]:
+            streaming_signal = StreamingSignal(path_to_file, 1, 2, 1, chunk_size=chunk_size, **filters)
+            streaming_signal.analyse()
+            for name, value in vars(streaming_signal.poincare).items():
+                self.assertAlmostEqual(value, getattr(signal.poincare, name), places=8)
+            self.assertEqual(streaming_signal.runs.runs, signal.runs.runs)
+            chunks = list(streaming_signal.filtered_chunks())
+            self.assertEqual(sum(len(chunk[0]) for chunk in chunks), len(signal.signal))
+            self.assertAlmostEqual(chunks[-1][2][-1], signal.timetrack[-1])
+
+    def test_real_recording(self):
+        self.assertSameResults("../0001.rea", annotation_filter=(1, 2, 3))
+
+    def test_quotient_filter(self):
+        # the quotient filter looks at the neighbouring beats, which may be in the neighbouring chunks
+        self.assertSameResults("../0001.rea", annotation_filter=(1, 2, 3), quotient_filter=0.2)
+
+    def test_bad_beats_at_the_ends(self):
+        # the bad beats at the beginning and at the end of the recording are removed, as in the Signal class
+        rr = [900, 800, 810, 820, 815, 3000, 805, 790, 800, 812, 799, 830, 790, 805, 5000, 4000]
+        annotations = [1, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0]
+        handle, path_to_file = tempfile.mkstemp(suffix=".rea")
+        with os.fdopen(handle, 'w') as test_file:
+            test_file.write("time\trr\tflags\n")
+            for rr_interval, annotation in zip(rr, annotations):
+                test_file.write("0\t" + str(rr_interval) + "\t" + str(annotation) + "\n")
+        try:
+            self.assertSameResults(path_to_file, annotation_filter=(1,), square_filter=(300, 2000))
+        finally:
+            os.remove(path_to_file)
+
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
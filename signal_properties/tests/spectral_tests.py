@@ -1,7 +1,9 @@
 import unittest
-import scipy
+import scipy.fft
+from numpy import ones, zeros, cumsum, sin, pi, var, argsort, allclose, arange, linspace, absolute, array, diff
 from signal_properties.RRclasses import Signal
 from signal_properties.my_exceptions import WrongCuts
+from signal_properties.spectral import FFTSpectrum
 
 # I learned something - each test calls setup
 
@@ -29,13 +31,13 @@ class TestLombSpectrum(unittest.TestCase):
         A = 8.
         omega = 1.
         nin = 1000
-        x = scipy.linspace(0.01, 2*scipy.pi, nin)
-        y = A * scipy.sin(omega*(x + 0.5 * scipy.pi))
-        self.signal4 = Signal([y, scipy.absolute(y*0), x]) # this is for the constructor that takes 3 elements
+        x = linspace(0.01, 2*pi, nin)
+        y = A * sin(omega*(x + 0.5 * pi))
+        self.signal4 = Signal([y, absolute(y*0), x]) # this is for the constructor that takes 3 elements
         self.signal4.set_LS_spectrum()
         # below is the integral over all the frequencies
         total_power = sum(self.signal4.LS_spectrum.periodogram) * (self.signal4.LS_spectrum.frequency[1] -  self.signal4.LS_spectrum.frequency[0])
-        variance = scipy.var(self.signal4.signal)
+        variance = var(self.signal4.signal)
         self.assertAlmostEqual(total_power, variance, places=-1)  # these should be VERY roughly equal
         # the variance of this signal should be \frac{1}{2\pi}\int_{-\pi}^{\pi} 8^2*sin^2(x) = 32
         # we can compare this result to both total power and total variance calculated from the data
@@ -44,33 +46,34 @@ class TestLombSpectrum(unittest.TestCase):
         A1 = 8.
         omega1 = 1
         nin = 11
-        x = scipy.linspace(0.01, 2*scipy.pi, nin)
-        y1 = A1 * scipy.sin(omega1*(x))
-        self.signal3 = Signal([y1, scipy.absolute(y1*0), x])
+        x = linspace(0.01, 2*pi, nin)
+        y1 = A1 * sin(omega1*(x))
+        self.signal3 = Signal([y1, absolute(y1*0), x])
         self.signal3.set_LS_spectrum()
         # this signal will NOT be used - this is just to start somewhere
-        self.signal3.LS_spectrum.periodogram = scipy.linspace(0.0, 1.0, nin) * 0 + 1.0/(nin-1) # this is just to test
+        self.signal3.LS_spectrum.periodogram = linspace(0.0, 1.0, nin) * 0 + 1.0/(nin-1) # this is just to test
         # if the segments add up to 0.5, as they should
         # so, the periodogram is [ 0.1  0.1  0.1  0.1  0.1  0.1  0.1  0.1  0.1  0.1  0.1]
-        self.signal3.LS_spectrum.frequency = scipy.linspace(0.0, 1.0, nin)
+        self.signal3.LS_spectrum.frequency = linspace(0.0, 1.0, nin)
         # and the frequencies are [ 0.   0.1  0.2  0.3  0.4  0.5  0.6  0.7  0.8  0.9  1. ]
         cuts = [0.0, 0.5, 1]
-        self.assertTrue((self.signal3.LS_spectrum.get_bands(cuts, 1) == scipy.array([0.5, 0.5])).all())
+        # the bands are integrated from the cumulative sum of the periodogram, so they are equal up to the rounding
+        self.assertTrue(allclose(self.signal3.LS_spectrum.get_bands(cuts, 1), array([0.5, 0.5])))
 
     def test_test_cuts(self):
         cuts = [0.0, 0.5, 0.5, 1]
         A1 = 8.
         omega1 = 1
         nin = 11
-        x = scipy.linspace(0.01, 2*scipy.pi, nin)
-        y1 = A1 * scipy.sin(omega1*(x))
-        self.signal3 = Signal([y1, scipy.absolute(y1*0), x])
+        x = linspace(0.01, 2*pi, nin)
+        y1 = A1 * sin(omega1*(x))
+        self.signal3 = Signal([y1, absolute(y1*0), x])
         self.signal3.set_LS_spectrum()
         # this signal will NOT be used - this is just to start somewhere
-        self.signal3.LS_spectrum.periodogram = scipy.linspace(0.0, 1.0, nin) * 0 + 1.0/(nin-1) # this is just to test
+        self.signal3.LS_spectrum.periodogram = linspace(0.0, 1.0, nin) * 0 + 1.0/(nin-1) # this is just to test
         # if the segments add up to 0.5, as they should
         # so, the periodogram is [ 0.1  0.1  0.1  0.1  0.1  0.1  0.1  0.1  0.1  0.1  0.1]
-        self.signal3.LS_spectrum.frequency = scipy.linspace(0.0, 1.0, nin)
+        self.signal3.LS_spectrum.frequency = linspace(0.0, 1.0, nin)
         # and the frequencies are [ 0.   0.1  0.2  0.3  0.4  0.5  0.6  0.7  0.8  0.9  1. ]
         self.assertRaises(WrongCuts, self.signal3.LS_spectrum.get_bands, [0.5, 0.5], df=1)
 
@@ -80,19 +83,19 @@ class TestLombSpectrum(unittest.TestCase):
         omega1 = 1
         omega2 = 2
         nin = 1000
-        x = scipy.linspace(0.01, 2*scipy.pi, nin)
-        y1 = A1 * scipy.sin(omega1*(x))
-        y2 = A2 * scipy.sin(omega2*(x))
+        x = linspace(0.01, 2*pi, nin)
+        y1 = A1 * sin(omega1*(x))
+        y2 = A2 * sin(omega2*(x))
         y = y1+y2
-        self.signal5 = Signal([y, scipy.absolute(y*0), x])
+        self.signal5 = Signal([y, absolute(y*0), x])
         self.signal5.set_LS_spectrum()
-        self.signal51 = Signal([y1, scipy.absolute(y*0), x])
+        self.signal51 = Signal([y1, absolute(y*0), x])
         self.signal51.set_LS_spectrum()
-        self.signal52 = Signal([y2, scipy.absolute(y*0), x])
+        self.signal52 = Signal([y2, absolute(y*0), x])
         self.signal52.set_LS_spectrum()
-        variance = scipy.var(y)
-        variance1 = scipy.var(y1)
-        variance2 = scipy.var(y2)
+        variance = var(y)
+        variance1 = var(y1)
+        variance2 = var(y2)
         df = (self.signal5.LS_spectrum.frequency[1] -  self.signal5.LS_spectrum.frequency[0])
         print(df)
         spectral_content = self.signal5.LS_spectrum.get_bands(cuts=[0.2, 2.0], df=df)
@@ -103,5 +106,124 @@ class TestLombSpectrum(unittest.TestCase):
         self.assertAlmostEqual(spectral_content1[0], variance1, places = -1)
         self.assertAlmostEqual(spectral_content2[0], variance2, places = -1)
 
+    def test_fast_engine(self):
+        # the fast engine should give the same periodogram as the reference engine - here a "RR intervals" like signal
+        nin = 2000
+        beats = arange(nin)
+        y = 800 + 50 * sin(0.3 * beats) + 20 * sin(0.05 * beats)
+        x = cumsum(y)
+        self.signal6 = Signal([y, absolute(y*0), x])
+        self.signal6.set_LS_spectrum()
+        self.signal7 = Signal([y, absolute(y*0), x])
+        self.signal7.set_LS_spectrum(engine="fast")
+        self.assertTrue((self.signal6.LS_spectrum.frequency == self.signal7.LS_spectrum.frequency).all())
+        for first, second in [(0, 10), (10, 100), (100, 500), (500, nin)]:
+            power = sum(self.signal6.LS_spectrum.periodogram[first:second])
+            fast_power = sum(self.signal7.LS_spectrum.periodogram[first:second])
+            self.assertTrue(abs(fast_power - power) / power < 1e-4)
+
+    def test_band_limited_spectrum(self):
+        # the spectrum calculated only up to the highest cut should give the same bands as the full spectrum
+        nin = 1000
+        beats = arange(nin)
+        y = 800 + 50 * sin(0.3 * beats) + 20 * sin(0.05 * beats)
+        x = cumsum(y)
+        cuts = [0, 0.003, 0.04, 0.15, 0.4]
+        self.signal8 = Signal([y, absolute(y*0), x])
+        self.signal8.set_LS_spectrum()
+        self.signal9 = Signal([y, absolute(y*0), x])
+        self.signal9.set_LS_spectrum(max_frequency=max(cuts))
+        self.assertTrue(self.signal9.LS_spectrum.frequency[-1] < max(cuts))
+        self.assertTrue(len(self.signal9.LS_spectrum.frequency) < len(self.signal8.LS_spectrum.frequency))
+        bands = self.signal8.LS_spectrum.get_bands(cuts, df=self.signal8.LS_spectrum.resolution)
+        limited_bands = self.signal9.LS_spectrum.get_bands(cuts, df=self.signal9.LS_spectrum.resolution)
+        self.assertTrue(allclose(bands, limited_bands))
+        # the resolution sets the spacing of the frequencies
+        self.signal10 = Signal([y, absolute(y*0), x])
+        self.signal10.set_LS_spectrum(max_frequency=max(cuts), resolution=0.001)
+        self.assertTrue(allclose(diff(self.signal10.LS_spectrum.frequency), 0.001))
+
+    def test_spectrogram(self):
+        # each window of the spectrogram should have the same periodogram as the LS spectrum of the window alone
+        signal = Signal("../0001.rea", 1, 2, 1, annotation_filter=(1, 2, 3))
+        signal.set_LS_spectrogram(300000, step=150000)
+        spectrogram = signal.LS_spectrogram
+        # the default grid - the resolution of the 5-minute window up to the highest cut, 0.4 Hz
+        self.assertAlmostEqual(spectrogram.resolution, 1 / 300)
+        self.assertEqual(len(spectrogram.frequency), 119)
+        self.assertEqual(spectrogram.power.shape, (len(spectrogram.window_starts), len(spectrogram.frequency)))
+        for window in [0, len(spectrogram.window_starts) - 1]:
+            start, end = spectrogram.window_starts[window], spectrogram.window_ends[window]
+            time_track = spectrogram.filtered_time_track[start:end]
+            window_values = spectrogram.filtered_signal[start:end]
+            window_signal = Signal([window_values - window_values.mean(), zeros(end - start),
+                                    time_track - time_track[0]])
+            window_signal.set_LS_spectrum()
+            periodogram, frequency = window_signal.LS_spectrum.build_spectrum(spectrogram.angular_frequency)
+            self.assertTrue(allclose(spectrogram.power[window], periodogram))
+        self.assertTrue(allclose(spectrogram.TP, spectrogram.VLF + spectrogram.LF + spectrogram.HF))
+
+    def test_spectrogram_bands(self):
+        # the cuts are in Hz - a respiratory oscillation at 0.25 Hz is in the HF band of every window, also with the
+        # beats unevenly spaced by the oscillation itself
+        y = 800 + 20 * sin(2*pi * 0.25 * 0.8 * arange(3000))
+        signal = Signal([y, zeros(len(y)), cumsum(y)])
+        signal.set_LS_spectrogram(300000, step=150000)
+        spectrogram = signal.LS_spectrogram
+        self.assertTrue(allclose(spectrogram.HF, 20**2 / 2, rtol=0.01))
+        self.assertTrue((spectrogram.HF > 10 * (spectrogram.VLF + spectrogram.LF)).all())
+        peaks = spectrogram.frequency[spectrogram.power.argmax(axis=1)]
+        self.assertTrue(allclose(peaks, 0.25, atol=spectrogram.resolution))
+        # the default grid is bounded for long windows
+        signal.set_LS_spectrogram(3600000)
+        self.assertEqual(len(signal.LS_spectrogram.frequency), 1023)
+
+class TestFFTSpectrum(unittest.TestCase):
+    def setUp(self):
+        # RR intervals (in ms) modulated at 0.1 Hz and 0.25 Hz, about 40 minutes of recording
+        beats = 3000
+        self.time_track = cumsum(ones(beats) * 800)
+        components = [50 * sin(2*pi * 0.1 * self.time_track / 1000), 20 * sin(2*pi * 0.25 * self.time_track / 1000)]
+        self.y = 800 + components[0] + components[1]
+        # the LF and HF bands hold the variances of the components - as resampled, the linear interpolation damps them
+        self.bands = [0] + [var(FFTSpectrum.resample(component, self.time_track, 250)) for component in components]
+
+    def test_spectrum(self):
+        signal = Signal([self.y, zeros(len(self.y)), self.time_track])
+        signal.set_FFT_spectrum()
+        spectrum = signal.FFT_spectrum
+        self.assertEqual(len(spectrum.frequency), len(spectrum.periodogram))
+        self.assertAlmostEqual(spectrum.frequency[1] - spectrum.frequency[0], spectrum.resolution)
+        self.assertEqual(spectrum.n_fft, scipy.fft.next_fast_len(len(spectrum.resampled_signal), real=True))
+        # the highest peaks are at the frequencies of the modulation
+        peaks = spectrum.frequency[argsort(spectrum.periodogram)[-2:]]
+        self.assertTrue(allclose(sorted(peaks), [0.1, 0.25], atol=2 * spectrum.resolution))
+        # the sum of the periodogram is the variance of the resampled signal
+        total_power = spectrum.get_bands([0, spectrum.resampling_rate], df=spectrum.resolution)[0]
+        self.assertAlmostEqual(total_power / var(spectrum.resampled_signal), 1, places=6)
+        # ... and the bands hold the variances of the components
+        bands = spectrum.get_bands([0, 0.04, 0.15, 0.4], df=spectrum.resolution)
+        self.assertTrue(allclose(bands, self.bands, rtol=0.01, atol=0.5))
+        self.assertRaises(WrongCuts, spectrum.get_bands, [0.4, 0.15], df=spectrum.resolution)
+
+    def test_welch(self):
+        signal = Signal([self.y, zeros(len(self.y)), self.time_track])
+        signal.set_FFT_spectrum(segment=256, overlap=0.5)
+        spectrum = signal.FFT_spectrum
+        self.assertEqual(spectrum.segment_length, 1024)
+        self.assertEqual(len(spectrum.periodogram), 513)
+        # the power of the components is spread by the window, but not lost
+        bands = spectrum.get_bands([0, 0.04, 0.15, 0.4], df=spectrum.resolution)
+        self.assertTrue(allclose(bands, self.bands, rtol=0.01, atol=0.5))
+        # the same spectrum, transformed one segment at a time
+        signal.FFT_spectrum = None
+        self.assertTrue(allclose(spectrum.build_spectrum(block_size=1024), spectrum.periodogram))
+
+    def test_short_signal(self):
+        signal = Signal([[800.], [0], [800.]])
+        signal.set_FFT_spectrum()
+        self.assertEqual(len(signal.FFT_spectrum.periodogram), 0)
+        self.assertTrue(allclose(signal.FFT_spectrum.get_bands([0, 0.15, 0.4], df=1), [0, 0]))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,92 @@
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+
+class StageTimer:
+    """
+    This class records the wall time, the number of beats and (optionally) the allocated memory of each stage of the
+    analysis (parsing, filtering, Poincare, runs, LS_spectrum) of each file. It is switched off by default - the
+    Signal and the Project objects time their stages only when they have been given a timer.
+    Every record is a dictionary {"file": , "stage": , "seconds": , "beats": , "beats_per_second": ,
+    "allocated_bytes": } - the stage callbacks are called with each record as soon as it is ready, the progress
+    callbacks are called by the Project with (file, number of the files done, number of all the files).
+    """
+    stages = ["parsing", "filtering", "Poincare", "runs", "LS_spectrum", "FFT_spectrum"]
+
+    def __init__(self, measure_memory=False, stage_callbacks=(), progress_callbacks=()):
+        """
+        :param measure_memory: measure the peak memory allocated in each stage (with tracemalloc, which slows the
+        analysis down)
+        :param stage_callbacks: functions called with each record
+        :param progress_callbacks: functions called with (file, done, total) after each file
+        """
+        self.measure_memory = measure_memory
+        self.stage_callbacks = list(stage_callbacks)
+        self.progress_callbacks = list(progress_callbacks)
+        self.records = []
+        self.file = None # the file whose stages are being timed
+
+    @staticmethod
+    def timed(timer, stage, beats=0):
+        """
+        :return: the context timing the stage if there is a timer, a context doing nothing otherwise - the context
+        gives the record, in which the number of beats may be set when it is known only at the end of the stage (a new,
+        unused dictionary if there is no timer, so the callers never share it)
+        """
+        return nullcontext({}) if timer is None else timer.stage(stage, beats)
+
+    @contextmanager
+    def stage(self, stage, beats=0):
+        record = {"file": self.file, "stage": stage, "beats": beats}
+        started_tracing = False
+        if self.measure_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            memory_at_start = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            record["allocated_bytes"] = None
+            if self.measure_memory:
+                record["allocated_bytes"] = tracemalloc.get_traced_memory()[1] - memory_at_start
+                if started_tracing:
+                    tracemalloc.stop()
+        self.add_records([record])
+
+    def add_records(self, records):
+        """
+        adds the records, e.g. the ones made in another process, and passes them to the stage callbacks
+        """
+        for record in records:
+            record["beats_per_second"] = record["beats"] / record["seconds"] if record["seconds"] > 0 else None
+            self.records.append(record)
+            for callback in self.stage_callbacks:
+                callback(record)
+
+    def progress(self, file, done, total):
+        for callback in self.progress_callbacks:
+            callback(file, done, total)
+
+    def summary(self):
+        """
+        the totals of each stage over all the files
+        :return: list of [stage, files, beats, seconds, beats per second, the largest allocation in bytes], in the order
+        of the stages
+        """
+        totals = {}
+        for record in self.records:
+            stage = totals.setdefault(record["stage"], [record["stage"], 0, 0, 0.0, None, None])
+            stage[1] += 1
+            stage[2] += record["beats"]
+            stage[3] += record["seconds"]
+            if record["allocated_bytes"] is not None:
+                stage[5] = max(stage[5] or 0, record["allocated_bytes"])
+        for stage in totals.values():
+            stage[4] = stage[2] / stage[3] if stage[3] > 0 else None
+        order = self.stages + sorted(set(totals) - set(self.stages))
+        return [totals[stage] for stage in order if stage in totals]
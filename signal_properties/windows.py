@@ -0,0 +1,28 @@
+"""
+the windows sliding along a recording, shared by the windowed analyses (Poincare plot, runs, Lomb-Scargle spectrogram)
+- each window is given by the index of its first beat and the index after its last beat
+"""
+from numpy import arange, searchsorted
+from signal_properties.my_exceptions import WrongTimetrack
+
+
+def beat_windows(n, window, step):
+    """
+    :param n: the number of the beats in the recording
+    :return: the index of the first beat and the index after the last beat of each full window
+    """
+    starts = arange(0, max(n - window + 1, 0), step)
+    return starts, starts + window
+
+
+def time_windows(timetrack, window, step):
+    """
+    the windows begin at the first beat and every step after it, a beat belongs to a window if its time is in
+    [beginning, beginning + window)
+    :return: the index of the first beat and the index after the last beat of each full window
+    """
+    if len(timetrack) == 0:
+        raise WrongTimetrack
+    windows = int((timetrack[-1] - timetrack[0] - window) // step) + 1 if timetrack[-1] - timetrack[0] >= window else 0
+    beginnings = timetrack[0] + step * arange(windows)
+    return searchsorted(timetrack, beginnings), searchsorted(timetrack, beginnings + window)